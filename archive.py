@@ -0,0 +1,158 @@
+import os
+import json
+from datetime import date as _date
+import numpy as np
+import pandas as pd
+import utils
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.expanduser("~"), ".biostat_master", "archive")
+
+# Kolumny archiwum: nazwa -> typ danych (każda kolumna to osobny plik binarny, tylko dopisywany)
+_COLUMNS = {
+    "diameter": np.float64,   # Srednica_mm
+    "strain": np.int32,       # kod szczepu (strains.json)
+    "group": np.int32,        # kod grupy (groups.json)
+    "batch": np.int32,        # kod partii/importu (batches.json)
+    "date": np.int32,         # dzień pomiaru (dni od 1970-01-01)
+}
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+class MeasurementArchive:
+    """
+    Archiwum pomiarów z wielu lat: kolumnowe pliki binarne czytane przez np.memmap + słowniki nazw (JSON).
+    Import nowego skoroszytu tylko dopisuje wiersze na końcu plików; liczba zatwierdzonych wierszy
+    jest w meta.json (zapisywanym atomowo), więc przerwany import nie psuje archiwum.
+    """
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._meta = self._read_json("meta.json", {"rows": 0})
+        self._strains = self._read_json("strains.json", [])
+        self._groups = self._read_json("groups.json", [])
+        self._batches = self._read_json("batches.json", [])
+
+    # ==================== PLIKI ====================
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _read_json(self, name, default):
+        try:
+            with open(self._path(name), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+
+    def _write_json(self, name, obj):
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, self._path(name))
+
+    def __len__(self):
+        return self._meta["rows"]
+
+    @property
+    def version(self):
+        """Identyfikator stanu archiwum (rośnie z każdym importem) - do kluczy cache."""
+        return ("archive", self.root, len(self))
+
+    def strains(self): return list(self._strains)
+    def groups(self): return list(self._groups)
+    def batches(self): return [b["name"] for b in self._batches]
+
+    def column(self, name):
+        """Kolumna jako tablica mapowana z dysku (tylko zatwierdzone wiersze)."""
+        n = len(self)
+        if n == 0:
+            return np.empty(0, dtype=_COLUMNS[name])
+        return np.memmap(self._path(f"{name}.bin"), dtype=_COLUMNS[name], mode="r", shape=(n,))
+
+    # ==================== IMPORT ====================
+    @staticmethod
+    def _encode(values, dictionary):
+        """Kody słownikowe dla wartości; nowe nazwy dopisywane na końcu słownika."""
+        lookup = {name: i for i, name in enumerate(dictionary)}
+        uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        codes = np.empty(len(uniques), dtype=np.int32)
+        for i, u in enumerate(uniques):
+            if u not in lookup:
+                lookup[u] = len(dictionary)
+                dictionary.append(u)
+            codes[i] = lookup[u]
+        return codes[inverse]
+
+    def import_dataframe(self, df, col_bact, batch_name, measured_on=None):
+        """
+        Dopisuje pomiary skoroszytu do archiwum jako nową partię. Zwraca liczbę dopisanych wierszy
+        (0, jeśli identyczne dane były już zaimportowane).
+        measured_on: data pomiaru (domyślnie dziś) lub nazwa kolumny z datą w df.
+        """
+        data = df.dropna(subset=['Srednica_mm'])
+        fingerprint = utils.dataset_fingerprint(data[[col_bact, 'Grupa', 'Srednica_mm']])
+        if any(b.get("fingerprint") == fingerprint for b in self._batches):
+            return 0
+        if data.empty:
+            return 0
+
+        if isinstance(measured_on, str) and measured_on in data.columns:
+            days = pd.to_datetime(data[measured_on]).values.astype('datetime64[D]')
+        else:
+            days = np.full(len(data), np.datetime64(measured_on or _date.today(), 'D'))
+
+        new_cols = {
+            "diameter": data['Srednica_mm'].values.astype(np.float64),
+            "strain": self._encode(data[col_bact].values, self._strains),
+            "group": self._encode(data['Grupa'].values, self._groups),
+            "batch": np.full(len(data), len(self._batches), dtype=np.int32),
+            "date": (days - _EPOCH).astype(np.int32),
+        }
+
+        n_old = len(self)
+        for name, values in new_cols.items():
+            path = self._path(f"{name}.bin")
+            with open(path, "ab") as f:
+                # Obcięcie ewentualnych niezatwierdzonych bajtów z przerwanego importu
+                f.truncate(n_old * np.dtype(_COLUMNS[name]).itemsize)
+                f.write(np.ascontiguousarray(values, dtype=_COLUMNS[name]).tobytes())
+
+        self._batches.append({"name": str(batch_name), "fingerprint": fingerprint, "rows": int(len(data))})
+        self._write_json("strains.json", self._strains)
+        self._write_json("groups.json", self._groups)
+        self._write_json("batches.json", self._batches)
+        self._meta["rows"] = n_old + len(data)
+        self._write_json("meta.json", self._meta)
+        return len(data)
+
+    # ==================== ODCZYT ====================
+    def query(self, strains=None, groups=None, batches=None, since=None, until=None, col_bact='Bakterie'):
+        """
+        Wycinek archiwum jako DataFrame (col_bact, Grupa, Srednica_mm, Partia, Data).
+        Filtrowanie działa na kodach z plików mapowanych; z dysku czytane są tylko pasujące średnice.
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        def code_filter(col, names, dictionary):
+            # Wszystkie kody o pasujących nazwach - kilka partii może mieć tę samą nazwę
+            wanted = set(names)
+            codes = [i for i, name in enumerate(dictionary) if name in wanted]
+            return np.isin(self.column(col), codes)
+
+        if strains is not None: mask &= code_filter("strain", strains, self._strains)
+        if groups is not None: mask &= code_filter("group", groups, self._groups)
+        if batches is not None: mask &= code_filter("batch", batches, self.batches())
+        if since is not None or until is not None:
+            day = self.column("date")
+            if since is not None: mask &= day >= (np.datetime64(since, 'D') - _EPOCH).astype(np.int32)
+            if until is not None: mask &= day <= (np.datetime64(until, 'D') - _EPOCH).astype(np.int32)
+
+        idx = np.flatnonzero(mask)
+        strain_names = np.asarray(self._strains, dtype=object)
+        group_names = np.asarray(self._groups, dtype=object)
+        batch_names = np.asarray(self.batches(), dtype=object)
+        return pd.DataFrame({
+            col_bact: strain_names[self.column("strain")[idx]] if len(idx) else [],
+            'Grupa': group_names[self.column("group")[idx]] if len(idx) else [],
+            'Srednica_mm': self.column("diameter")[idx],
+            'Partia': batch_names[self.column("batch")[idx]] if len(idx) else [],
+            'Data': _EPOCH + self.column("date")[idx].astype('timedelta64[D]'),
+        })
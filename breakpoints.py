@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pandas as pd
+import loader
+import utils
+
+# Kolory kategorii klinicznych (słupki, legenda)
+CATEGORY_COLORS = {"S": "#2e7d32", "I": "#f9a825", "R": "#c62828"}
+CATEGORY_LABELS = {"S": "S (wrażliwy)", "I": "I (wrażliwy przy zwiększonej ekspozycji)", "R": "R (oporny)"}
+WILDCARD = "*"  # organizm "*" = breakpoint substancji dla wszystkich szczepów bez własnego wpisu
+
+# Warianty nazw kolumn tabeli breakpointów (po loader._norm_name)
+COLUMN_ALIASES = {
+    "Bakterie": ["bakterie", "bakteria", "szczep", "organizm", "organism", "species", "gatunek"],
+    "Substancja": ["substancja", "antybiotyk", "antibiotic", "agent", "lek", "grupa"],
+    "S": ["s", "sge", "smm", "susceptible", "wrazliwy", "sbreakpoint"],
+    "R": ["r", "rlt", "rle", "rmm", "resistant", "oporny", "rbreakpoint"],
+    "Standard": ["standard", "norma", "zrodlo", "source"],
+}
+_ALIAS_LOOKUP = {alias: canon for canon, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+def _key(values):
+    return pd.Series(values, dtype=object).astype(str).str.strip().str.casefold().to_numpy(dtype=object)
+
+class BreakpointTable:
+    """
+    Breakpointy strefy zahamowania (mm) indeksowane parą (szczep, substancja). Dla każdej pary przedziały:
+    [S, ∞) -> S, [R, S) -> I, (-∞, R) -> R (EUCAST: S >= x, R < y). Wiersze CLSI (R <= y) mają domkniętą granicę R.
+    Wyszukiwanie wektorowe: MultiIndex.get_indexer dla unikalnych par, potem porównania na tablicach.
+    """
+    def __init__(self, table):
+        table = table.reset_index(drop=True)
+        self.table = table
+        self.index = pd.MultiIndex.from_arrays([_key(table["Bakterie"]), _key(table["Substancja"])])
+        self.s = table["S"].to_numpy(dtype=float)
+        self.r = table["R"].to_numpy(dtype=float)
+        standard = table["Standard"] if "Standard" in table else pd.Series("EUCAST", index=table.index)
+        self.r_inclusive = standard.astype(str).str.upper().str.startswith("CLSI").to_numpy()
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, strains, substances):
+        """Numer wiersza tabeli dla każdej pary (szczep, substancja); -1 gdy brak breakpointu."""
+        # Kody kolumn -> kod pary; normalizacja nazw i wyszukiwanie w indeksie tylko dla unikalnych par
+        s_codes, s_uni = pd.factorize(np.asarray(strains, dtype=object))
+        g_codes, g_uni = pd.factorize(np.asarray(substances, dtype=object))
+        valid = (s_codes >= 0) & (g_codes >= 0)
+        pair_codes, pairs = pd.factorize(np.where(valid, s_codes.astype(np.int64) * max(len(g_uni), 1) + g_codes, -1))
+        s_idx, g_idx = np.divmod(np.maximum(pairs, 0), max(len(g_uni), 1))
+        strain_keys, sub_keys = _key(s_uni), _key(g_uni)
+        found = self.index.get_indexer(pd.MultiIndex.from_arrays([strain_keys[s_idx], sub_keys[g_idx]])) if len(pairs) else np.empty(0, dtype=int)
+        # Brak wpisu dla szczepu -> wpis ogólny substancji (organizm "*")
+        missing = found < 0
+        if missing.any():
+            wild = pd.MultiIndex.from_arrays([np.full(missing.sum(), WILDCARD, dtype=object), sub_keys[g_idx[missing]]])
+            found[missing] = self.index.get_indexer(wild)
+        found[pairs < 0] = -1
+        return found[pair_codes]
+
+    def classify(self, strains, substances, diameters):
+        """Kategoria S / I / R dla każdego pomiaru (pusty tekst, gdy brak breakpointu lub średnicy)."""
+        row = self.lookup(strains, substances)
+        d = np.asarray(diameters, dtype=float)
+        known = (row >= 0) & np.isfinite(d)
+        s, r, incl = self.s[row], self.r[row], self.r_inclusive[row]
+        resistant = (d < r) | (incl & (d == r))
+        out = np.where(d >= s, "S", np.where(resistant, "R", "I")).astype(object)
+        out[~known] = ""
+        return out
+
+def normalize_columns(df):
+    mapping = {}
+    for col in df.columns:
+        canon = _ALIAS_LOOKUP.get(loader._norm_name(col))
+        if canon is not None and canon not in mapping.values():
+            mapping[col] = canon
+    return df.rename(columns=mapping)
+
+def load_breakpoints(path):
+    """
+    Wczytuje tabelę breakpointów (CSV / Excel, pierwszy arkusz) z kolumnami: Bakterie, Substancja, S, R
+    (opcjonalnie Standard: EUCAST / CLSI). Zwraca (BreakpointTable, error_msg).
+    """
+    try:
+        if os.path.splitext(path)[1].lower() in loader.EXCEL_EXTENSIONS:
+            raw = pd.read_excel(path)
+        else:
+            raw = pd.read_csv(path, sep=None, engine="python")
+    except Exception as e:
+        return None, f"Nie udało się wczytać tabeli breakpointów: {e}"
+    df = normalize_columns(raw)
+    missing = [c for c in ("Bakterie", "Substancja", "S", "R") if c not in df.columns]
+    if missing:
+        return None, f"Brak kolumn w tabeli breakpointów: {missing}"
+    for col in ("S", "R"):
+        df[col] = pd.to_numeric(df[col].astype(str).str.strip().str.replace(",", ".", regex=False), errors="coerce")
+    df = df.dropna(subset=["Bakterie", "Substancja", "S", "R"])
+    if df.empty:
+        return None, "Tabela breakpointów nie zawiera poprawnych wierszy."
+    bad = df[df["R"] > df["S"]]
+    if not bad.empty:
+        return None, f"Breakpoint R większy niż S dla: {', '.join(map(str, bad['Substancja'].head(5)))}"
+    return BreakpointTable(df), None
+
+def group_substances(groups):
+    """Substancja z nazwy grupy ("Gentamycyna (10 ug/ml)" -> "Gentamycyna"); bez stężenia - cała nazwa."""
+    groups = pd.Series(groups, dtype=object)
+    sub, _, _ = utils.parse_concentrations(groups)
+    return sub.fillna(groups)
+
+def classify_measurements(df, table, col_bact="Bakterie"):
+    """Kategoria S / I / R każdego pomiaru (Series wyrównana z df)."""
+    codes, groups = pd.factorize(df["Grupa"].to_numpy(dtype=object))
+    substances = np.append(group_substances(groups).to_numpy(dtype=object), None)[codes]  # kod -1 (brak grupy) -> None
+    cats = table.classify(df[col_bact].to_numpy(), substances, df["Srednica_mm"].to_numpy())
+    return pd.Series(cats, index=df.index, name="Kategoria")
+
+def classify_means(df, table, col_bact="Bakterie"):
+    """Średnie grup (szczep x grupa) z kategorią S / I / R: kolumny Bakterie, Grupa, mean, n, Kategoria."""
+    summary = df.groupby([col_bact, "Grupa"], sort=False)["Srednica_mm"].agg(mean="mean", n="count").reset_index()
+    summary["Kategoria"] = table.classify(summary[col_bact].to_numpy(), group_substances(summary["Grupa"].to_numpy()).to_numpy(),
+                                          summary["mean"].to_numpy())
+    return summary
@@ -0,0 +1,65 @@
+import numpy as np
+from scipy.cluster.hierarchy import linkage, leaves_list, cophenet
+from scipy.spatial.distance import pdist
+
+# Dostępne metryki odległości i metody łączenia (Ward wymaga metryki euklidesowej)
+METRICS = ["euclidean", "correlation", "cosine", "cityblock"]
+METHODS = ["average", "complete", "single", "ward"]
+
+def standardize_columns(matrix):
+    """Z-score kolumn (substancji), stałe kolumny bez skalowania - jak w PCA."""
+    X = np.asarray(matrix, dtype=float)
+    sd = X.std(axis=0)
+    sd[sd == 0] = 1.0
+    return (X - X.mean(axis=0)) / sd
+
+def condensed_distances(X, metric="euclidean"):
+    """
+    Skondensowana macierz odległości (wektor n*(n-1)/2) - bez budowania kwadratowej tabeli.
+    Dla metryk kątowych wiersze o zerowej zmienności dają NaN -> przyjmujemy odległość maksymalną (1.0).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        d = pdist(X, metric=metric)
+    if metric in ("correlation", "cosine"):
+        d = np.where(np.isfinite(d), d, 1.0)
+    return d
+
+def cluster_rows(d, method="average"):
+    """Linkage + kolejność liści + współczynnik korelacji kofenetycznej dla skondensowanych odległości."""
+    Z = linkage(d, method=method)
+    coph_corr, _ = cophenet(Z, d)
+    return Z, leaves_list(Z), coph_corr
+
+def cluster_profiles(df_pivot, metric="euclidean", method="average", row_distances=None):
+    """
+    Klastrowanie hierarchiczne profili wrażliwości (Wiersze=Bakterie, Kolumny=Substancje).
+    row_distances: opcjonalnie policzone wcześniej odległości wierszy (reużycie przy zmianie metody).
+    Zwraca (wynik, error). Wynik zawiera linkage szczepów, kolejność wierszy i kolumn oraz macierz do mapy ciepła.
+    """
+    if df_pivot is None or df_pivot.empty or len(df_pivot) < 3:
+        return None, "Za mało danych do klastrowania (wymagane min. 3 szczepy)."
+    if df_pivot.shape[1] < 2:
+        return None, "Za mało cech do klastrowania (wymagane min. 2 substancje)."
+    if method == "ward" and metric != "euclidean":
+        return None, "Metoda Ward wymaga metryki euklidesowej."
+
+    X = standardize_columns(df_pivot.values)
+    d_rows = row_distances if row_distances is not None else condensed_distances(X, metric)
+    Z_rows, row_order, coph_corr = cluster_rows(d_rows, method)
+
+    # Kolumny (substancje) porządkujemy tą samą metodą, ale zawsze metryką korelacyjną/euklidesową
+    col_metric = "euclidean" if method == "ward" else "correlation"
+    Z_cols, col_order, _ = cluster_rows(condensed_distances(X.T, col_metric), method)
+
+    return {
+        "linkage": Z_rows,
+        "col_linkage": Z_cols,
+        "row_order": row_order,
+        "col_order": col_order,
+        "strains": df_pivot.index.values,
+        "substances": df_pivot.columns.values,
+        "values": df_pivot.values,
+        "metric": metric,
+        "method": method,
+        "cophenetic": coph_corr,
+    }, None
@@ -1,4 +1,10 @@
 import customtkinter as ctk
+import threading
+import queue
+import power
+import effectsize
+
+POWER_POLL_MS = 100  # odczyt wyniku symulacji mocy w wątku Tk
 
 # ======================================================
 # OKNO DIALOGOWE - OUTLIERY (DIXON)
@@ -90,6 +96,8 @@ class HelpDialog(ctk.CTkToplevel):
         
         self.add_entry("Krok 3: Wybór Testu Głównego", 
                        "• ANOVA: Wybierana, gdy dane są normalne i mają równą wariancję (największa moc).\n"
+                       "• Welch ANOVA: Dane normalne, ale Levene wykazał różne wariancje. Post-hoc: test Games-Howella "
+                       "(osobne stopnie swobody Welcha-Satterthwaite'a dla każdej pary).\n"
                        "• Kruskal-Wallis: Wybierany, gdy założenia ANOVA nie są spełnione (bezpieczniejszy dla danych mikrobiologicznych).")
 
         # --- SEKCJA 2: KOREKTY POST-HOC ---
@@ -123,7 +131,9 @@ class HelpDialog(ctk.CTkToplevel):
 
         self.add_entry("Wykres 'Lollipop' (Wielkość Efektu)", 
                        "Najważniejszy wykres do oceny 'siły' działania.\n"
-                       "• Oś pozioma (Cohen's d): Mówi, ile 'odchyleń standardowych' dzieli dwie grupy.\n"
+                       "• Oś pozioma: wielkość efektu dobrana do testu. Hedges' g (ANOVA) - ile 'odchyleń standardowych' dzieli "
+                       "dwie grupy, z poprawką na małe próby; Glass's Δ (Welch ANOVA, porównania z kontrolą) - różnica w jednostkach "
+                       "SD grupy odniesienia; Cliff's δ (Kruskal-Wallis) - od -1 do 1, przewaga wyników jednej grupy nad drugą.\n"
                        "• Kropka ZIELONA (W prawo): Grupa badana jest lepsza/silniejsza.\n"
                        "• Kropka CZERWONA (W lewo): Grupa badana jest gorsza/słabsza.\n"
                        "UWAGA: Wykres prezentuje wyłącznie pary różniące się istotnie statystycznie (p < 0.05), "
@@ -141,8 +151,10 @@ class HelpDialog(ctk.CTkToplevel):
                        "• r (korelacja): Mówi, jak mocno stężenie wpływa na wynik (blisko 1.0 = idealna zależność).")
 
         self.add_entry("Szacowanie MIC (Minimalne Stężenie Hamujące)", 
-                       "Program wyznacza teoretyczne MIC na podstawie punktu przecięcia linii trendu z osią średnicy krążka (6 mm). "
-                       "Jest to model matematyczny logarytmiczno-liniowy. Wynik jest szacunkowy i służy do porównania siły substancji.")
+                       "Program wyznacza teoretyczne MIC na podstawie punktu przecięcia linii trendu z osią średnicy krążka (domyślnie 6 mm). "
+                       "Domyślnie jest to model matematyczny logarytmiczno-liniowy. Wynik jest szacunkowy i służy do porównania siły substancji.\n"
+                       "• Model 4PL (Hill): Krzywa sigmoidalna uwzględniająca nasycenie strefy przy wysokich stężeniach (wymaga min. 4 stężeń). "
+                       "Podaje stężenie dla wybranej średnicy docelowej wraz z 95% CI; średnica docelowa musi leżeć między asymptotami krzywej.")
 
         self.add_entry("Porównanie Międzygatunkowe", 
                        "Zestawienie działania wybranych substancji na wszystkie badane szczepy bakterii jednocześnie. "
@@ -154,6 +166,12 @@ class HelpDialog(ctk.CTkToplevel):
                        "• Punkty daleko od siebie: Szczepy reagujące odmiennie.\n"
                        "• Osie PC1 i PC2: Reprezentują główne kierunki zmienności w danych. Procent w nawiasie mówi, jak dużo informacji o różnicach widać na wykresie.")
 
+        self.add_entry("Klastrowanie Hierarchiczne", 
+                       "Grupuje szczepy o podobnych profilach wrażliwości i przedstawia je jako dendrogram z mapą ciepła.\n"
+                       "• Gałęzie łączące się nisko: Szczepy reagujące bardzo podobnie.\n"
+                       "• Metryka (np. korelacja) i metoda łączenia (np. average, ward) do wyboru w Opcjach Wykresu.\n"
+                       "• r kofenetyczne bliskie 1.0: Dendrogram wiernie oddaje odległości między szczepami.")
+
         # --- SEKCJA 4: AUTOMATYCZNY OPIS METOD ---
         self.add_section("4. AUTOMATYCZNY OPIS (Materials and Methods)")
         
@@ -163,6 +181,7 @@ class HelpDialog(ctk.CTkToplevel):
             test_info = parent.export_stats_main[0]
             used_test = test_info.get("Test", "")
             used_correction_raw = parent.combo_method.get()
+            effect_desc = effectsize.describe([d["Effect Measure"] for d in parent.posthoc_detailed_results]) or effectsize.DESCRIPTIONS[effectsize.HEDGES_G]
             
             corr_map = {
                 "holm": "Holm-Bonferroni correction",
@@ -172,12 +191,21 @@ class HelpDialog(ctk.CTkToplevel):
             }
             correction_desc = corr_map.get(used_correction_raw, used_correction_raw)
 
-            if "ANOVA" in used_test:
+            if used_test == "Welch ANOVA":
+                generated_text = (
+                    f"\"Statistical analysis was performed using Python (scipy, statsmodels). "
+                    f"Normality was confirmed using the Shapiro-Wilk test; because Levene's test indicated unequal variances, "
+                    f"differences between groups were analyzed using Welch's one-way ANOVA, followed by the Games-Howell post-hoc test "
+                    f"with Welch-Satterthwaite degrees of freedom. "
+                    f"Effect sizes were calculated as {effect_desc}. "
+                    f"A p-value < 0.05 was considered statistically significant.\""
+                )
+            elif "ANOVA" in used_test:
                 generated_text = (
                     f"\"Statistical analysis was performed using Python (scipy, statsmodels). "
                     f"Normality was confirmed using the Shapiro-Wilk test. "
                     f"Differences between groups were analyzed using one-way ANOVA, followed by Tukey's HSD post-hoc test for multiple comparisons. "
-                    f"Effect sizes were calculated using Cohen’s d estimator. "
+                    f"Effect sizes were calculated as {effect_desc}. "
                     f"A p-value < 0.05 was considered statistically significant.\""
                 )
             elif "Kruskal" in used_test:
@@ -186,7 +214,7 @@ class HelpDialog(ctk.CTkToplevel):
                     f"Due to the non-normal distribution of data (Shapiro-Wilk test, p < 0.05), "
                     f"differences between groups were analyzed using the Kruskal-Wallis test. "
                     f"Pairwise comparisons were performed using Dunn's post-hoc test with {correction_desc}. "
-                    f"Effect sizes were estimated using Cohen’s d. "
+                    f"Effect sizes were calculated as {effect_desc}. "
                     f"A p-value < 0.05 was considered statistically significant.\""
                 )
             else:
@@ -199,7 +227,7 @@ class HelpDialog(ctk.CTkToplevel):
                 "Differences between groups were analyzed using one-way ANOVA (for normal data) "
                 "or Kruskal-Wallis test (for non-normal data), followed by post-hoc analysis "
                 "with appropriate correction for multiple comparisons. "
-                "Effect sizes were calculated using Cohen’s d estimator.\""
+                "Effect sizes were calculated as Hedges' g (parametric tests) or Cliff's delta (non-parametric tests).\""
             )
             info_label = "To jest ogólny szablon. Uruchom analizę, aby uzyskać tekst dopasowany do Twoich danych."
 
@@ -235,6 +263,35 @@ class HelpDialog(ctk.CTkToplevel):
                        "Program automatycznie usuwa zbędne spacje z nazw w Excelu (np. zamienia 'E. coli ' na 'E. coli'). "
                        "Dzięki temu błędy typu 'spacja na końcu' nie są traktowane jako osobne grupy.")
 
+        self.add_entry("Wiele plików i arkuszy", 
+                       "Można wczytać kilka plików naraz lub cały folder (przycisk 📁). Czytane są wszystkie arkusze z kolumnami "
+                       "szczepu, grupy i średnicy (rozpoznawane też warianty nazw, np. 'Szczep', 'Średnica (mm)'). "
+                       "Każdy wiersz dostaje kolumny Plik, Arkusz i Plytka.")
+
+        self.add_entry("Obserwacja folderu", 
+                       "Przełącznik 'Obserwuj folder' wczytuje wskazany folder i sprawdza go co kilka sekund. Po zapisaniu zmian "
+                       "(seria zapisów = jedno odświeżenie) ponownie czytane są tylko zmienione pliki, a analiza jest powtarzana "
+                       "tylko, jeśli zmieniły się pomiary aktualnego szczepu (z wcześniejszymi decyzjami o outlierach). "
+                       "Bez okna: python watcher.py FOLDER --out WYNIKI.")
+
+        self.add_entry("Sesje", 
+                       "'💼 Zapisz sesję' zapisuje w jednym pliku .biostat oczyszczone dane, decyzje o outlierach, ustawienia, "
+                       "wyniki statystyk (także PCA, klastrowanie i krzywe MIC), log i podglądy wykresów. '📂 Otwórz' przywraca je "
+                       "bez ponownego liczenia - wykresy do eksportu są odtwarzane z zapisanych wyników (eksport do Excela/PDF "
+                       "działa od razu). Plik zawiera tylko dane (JSON i PNG), bez kodu.")
+
+        self.add_entry("Korekta w całym badaniu", 
+                       "Korekta post-hoc działa w obrębie jednego szczepu. Przy wielu szczepach i substancjach łączna liczba porównań "
+                       "jest ogromna, dlatego program zbiera niekorygowane p-value (P-raw) wszystkich par grup wszystkich szczepów "
+                       "i koryguje je razem. Domyślnie wyłączona - włącz w ustawieniach wykresu (zalecany Benjamini-Hochberg; "
+                       "do wyboru BY, q-value Storeya, Holm, Bonferroni; w trybie wsadowym opcja --study-correction). "
+                       "Wynik: kolumna 'P-adj (study)' i arkusz 'Post-hoc (Badanie)' w eksporcie Excel.")
+        self.add_entry("Planer mocy", 
+                       "Szacuje, ile powtórzeń potrzeba. Dla podanych średnich, SD i liczebności program generuje tysiące "
+                       "sztucznych zbiorów danych i przepuszcza każdy przez pełną ścieżkę analizy (Shapiro -> Levene -> ANOVA+Tukey, "
+                       "Welch ANOVA+Games-Howell lub Kruskal+Dunn). Moc = odsetek symulacji z istotną różnicą względem grupy odniesienia; błąd I rodzaju "
+                       "liczony jest przy równych średnich. 'Krzywa liczby powtórzeń' podaje najmniejsze n osiągające docelową moc.")
+
         # Przycisk zamknięcia
         ctk.CTkButton(self.scroll, text="Zamknij Pomoc", fg_color="#333333", hover_color="#555555", command=self.destroy).pack(pady=30)
 
@@ -261,6 +318,140 @@ class HelpDialog(ctk.CTkToplevel):
         ctk.CTkLabel(content_frame, text=description, font=ctk.CTkFont(size=12), wraplength=650, justify="left", anchor="w", text_color=("gray30", "gray80")).pack(fill="x")
 
 
+# ======================================================
+# OKNO DIALOGOWE - PLANER MOCY (SYMULACJA MONTE CARLO)
+# ======================================================
+class PowerDialog(ctk.CTkToplevel):
+    def __init__(self, parent, group_table, ref_group, method="holm"):
+        """group_table: lista (grupa, średnia, SD, n) - wstępnie z bieżącego szczepu, do edycji."""
+        super().__init__(parent)
+        self.title("Planer mocy i liczby powtórzeń")
+        self.geometry("620x680")
+        self.attributes("-topmost", True)
+
+        ctk.CTkLabel(self, text="Grupa; średnia [mm]; SD [mm]; n  (pierwsza kolumna = nazwa grupy, jedna grupa w wierszu)",
+                     font=ctk.CTkFont(size=12, weight="bold"), wraplength=580).pack(pady=(10, 5))
+        self.input_box = ctk.CTkTextbox(self, height=160, font=("Consolas", 12))
+        self.input_box.pack(fill="x", padx=10)
+        self.input_box.insert("0.0", "\n".join(f"{g}; {m:.2f}; {s:.2f}; {n}" for g, m, s, n in group_table))
+
+        opts = ctk.CTkFrame(self, fg_color="transparent")
+        opts.pack(fill="x", padx=10, pady=10)
+        ctk.CTkLabel(opts, text="Odniesienie:").grid(row=0, column=0, sticky="w")
+        self.entry_ref = ctk.CTkEntry(opts, width=140)
+        self.entry_ref.insert(0, ref_group or "")
+        self.entry_ref.grid(row=0, column=1, padx=5, pady=2)
+        ctk.CTkLabel(opts, text="Korekta Dunna:").grid(row=0, column=2, sticky="w")
+        self.combo_method = ctk.CTkOptionMenu(opts, values=["holm", "fdr_bh", "bonferroni"], width=110)
+        self.combo_method.set(method if method in ("holm", "fdr_bh", "bonferroni") else "holm")
+        self.combo_method.grid(row=0, column=3, padx=5, pady=2)
+        ctk.CTkLabel(opts, text="Symulacje:").grid(row=1, column=0, sticky="w")
+        self.entry_sims = ctk.CTkEntry(opts, width=140)
+        self.entry_sims.insert(0, "5000")
+        self.entry_sims.grid(row=1, column=1, padx=5, pady=2)
+        ctk.CTkLabel(opts, text="Docelowa moc:").grid(row=1, column=2, sticky="w")
+        self.entry_target = ctk.CTkEntry(opts, width=110)
+        self.entry_target.insert(0, "0.8")
+        self.entry_target.grid(row=1, column=3, padx=5, pady=2)
+        ctk.CTkLabel(opts, text="Krzywa n (od-do):").grid(row=2, column=0, sticky="w")
+        self.entry_range = ctk.CTkEntry(opts, width=140)
+        self.entry_range.insert(0, "3-10")
+        self.entry_range.grid(row=2, column=1, padx=5, pady=2)
+        self.switch_round = ctk.CTkSwitch(opts, text="Zaokrąglaj do 0.1 mm")
+        self.switch_round.select()
+        self.switch_round.grid(row=2, column=2, columnspan=2, sticky="w", padx=5)
+
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.pack(fill="x", padx=10)
+        self.btn_power = ctk.CTkButton(btn_frame, text="Oblicz moc", fg_color="green", command=lambda: self.start("power"))
+        self.btn_power.pack(side="left", padx=(0, 10))
+        self.btn_curve = ctk.CTkButton(btn_frame, text="Krzywa liczby powtórzeń", command=lambda: self.start("curve"))
+        self.btn_curve.pack(side="left")
+
+        self.output = ctk.CTkTextbox(self, font=("Consolas", 11))
+        self.output.pack(fill="both", expand=True, padx=10, pady=10)
+        self.results = queue.Queue()  # tekst wyniku z wątku symulacji
+
+    def parse_inputs(self):
+        groups, means, sds, ns = [], [], [], []
+        for line in self.input_box.get("0.0", "end").splitlines():
+            if not line.strip(): continue
+            parts = [p.strip() for p in line.split(";")]
+            if len(parts) != 4:
+                raise ValueError(f"Niepoprawny wiersz: '{line}' (oczekiwano: grupa; średnia; SD; n)")
+            groups.append(parts[0])
+            means.append(float(parts[1].replace(",", ".")))
+            sds.append(float(parts[2].replace(",", ".")))
+            ns.append(int(parts[3]))
+        ref = self.entry_ref.get().strip()
+        if ref not in groups:
+            raise ValueError(f"Grupa odniesienia '{ref}' nie występuje w tabeli.")
+        return groups, means, sds, ns, ref
+
+    def start(self, mode):
+        try:
+            groups, means, sds, ns, ref = self.parse_inputs()
+            opts = {"n_sim": int(self.entry_sims.get()), "method": self.combo_method.get(),
+                    "resolution": 0.1 if self.switch_round.get() else None}
+            target = float(self.entry_target.get().replace(",", "."))
+            lo, hi = (int(v) for v in self.entry_range.get().split("-"))
+        except ValueError as e:
+            self.show(f"Błąd danych wejściowych: {e}")
+            return
+        self.btn_power.configure(state="disabled")
+        self.btn_curve.configure(state="disabled")
+        self.show("Symulacja w toku...")
+        # Obliczenia poza wątkiem GUI; wynik wraca kolejką odczytywaną w wątku Tk (poll_result)
+        def work():
+            try:
+                if mode == "power":
+                    res, err = power.estimate_power(groups, means, sds, ns, ref, **opts)
+                    text = err or self.format_power(*res)
+                else:
+                    res, err = power.sample_size_curve(groups, means, sds, ref, range(lo, hi + 1), target, **opts)
+                    text = err or self.format_curve(*res, target)
+            except Exception as e:
+                text = f"Błąd symulacji: {e}"
+            self.results.put(text)
+        threading.Thread(target=work, daemon=True).start()
+        self.after(POWER_POLL_MS, self.poll_result)
+
+    def poll_result(self):
+        """Wątek Tk: czeka na wynik symulacji (bez wywołań Tk z wątku roboczego)."""
+        if not self.winfo_exists(): return
+        try:
+            text = self.results.get_nowait()
+        except queue.Empty:
+            self.after(POWER_POLL_MS, self.poll_result)
+            return
+        self.finish(text)
+
+    def finish(self, text):
+        if not self.winfo_exists(): return
+        self.btn_power.configure(state="normal")
+        self.btn_curve.configure(state="normal")
+        self.show(text)
+
+    def show(self, text):
+        self.output.delete("0.0", "end")
+        self.output.insert("0.0", text)
+
+    @staticmethod
+    def format_power(table, summary):
+        lines = [table.to_string(index=False, float_format=lambda v: f"{v:.3f}"), ""]
+        lines += [f"{k}: {v:.3f}" if isinstance(v, float) else f"{k}: {v}" for k, v in summary.items()]
+        lines.append("\nMoc = odsetek symulacji, w których pełna ścieżka analizy (Shapiro -> Levene -> ANOVA+Tukey / Welch+Games-Howell / Kruskal+Dunn)"
+                     " wykazała istotną różnicę względem grupy odniesienia.")
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_curve(curve, n_needed, target):
+        text = curve.to_string(index=False, float_format=lambda v: f"{v:.3f}")
+        if n_needed is None:
+            return text + f"\n\nMoc {target:.0%} nie została osiągnięta w badanym zakresie n."
+        return text + f"\n\nMinimalna liczba powtórzeń na grupę (moc >= {target:.0%} dla wszystkich porównań): n = {n_needed}"
+
+
 # ======================================================
 # OKNO O TWÓRCY (ABOUT)
 # ======================================================
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.optimize import least_squares
+import utils
+
+# ======================================================
+# MODEL 4PL (HILL): y = bottom + (top - bottom) / (1 + exp(hill * (ln EC50 - ln x)))
+# Parametry: theta = (bottom, top, ln EC50, hill)
+# ======================================================
+
+HILL_STARTS = np.array([0.5, 1.0, 2.0, 4.0])
+N_EC50_STARTS = 5
+
+def predict_4pl(theta, log_x):
+    b, t, c, h = theta
+    return b + (t - b) / (1 + np.exp(h * (c - log_x)))
+
+def jacobian_4pl(theta, log_x):
+    """Analityczny jakobian modelu 4PL względem (bottom, top, ln EC50, hill)."""
+    b, t, c, h = theta
+    e = np.exp(np.clip(h * (c - log_x), -700, 700))
+    f = 1 / (1 + e)
+    g = -(t - b) * f * f * e
+    return np.column_stack([1 - f, f, g * h, g * (c - log_x)])
+
+def _multistart_grid(curve_ids, log_x, y, n_curves):
+    """
+    Wektorowy multi-start: ocenia SSE siatki punktów startowych dla wszystkich krzywych naraz
+    i zwraca najlepszy start każdej krzywej (tablica n_curves x 4).
+    """
+    y_min = np.full(n_curves, np.inf); np.minimum.at(y_min, curve_ids, y)
+    y_max = np.full(n_curves, -np.inf); np.maximum.at(y_max, curve_ids, y)
+    x_min = np.full(n_curves, np.inf); np.minimum.at(x_min, curve_ids, log_x)
+    x_max = np.full(n_curves, -np.inf); np.maximum.at(x_max, curve_ids, log_x)
+
+    # Siatka: ln EC50 w zakresie badanych stężeń x nachylenie Hilla
+    frac = np.linspace(0.1, 0.9, N_EC50_STARTS)
+    c_grid = x_min[:, None] + frac[None, :] * (x_max - x_min)[:, None]             # (C, E)
+    starts = np.empty((n_curves, N_EC50_STARTS, len(HILL_STARTS), 4))
+    starts[..., 0] = y_min[:, None, None]
+    starts[..., 1] = y_max[:, None, None]
+    starts[..., 2] = c_grid[:, :, None]
+    starts[..., 3] = HILL_STARTS[None, None, :]
+    starts = starts.reshape(n_curves, -1, 4)                                       # (C, S, 4)
+
+    p = starts[curve_ids]                                                           # (N, S, 4)
+    with np.errstate(over='ignore'):
+        pred = p[..., 0] + (p[..., 1] - p[..., 0]) / (1 + np.exp(p[..., 3] * (p[..., 2] - log_x[:, None])))
+    sq = (y[:, None] - pred) ** 2
+    sse = np.zeros((n_curves, starts.shape[1]))
+    np.add.at(sse, curve_ids, sq)
+    return starts[np.arange(n_curves), sse.argmin(axis=1)]
+
+def _fit_one(log_x, y, theta0):
+    span = max(y.max() - y.min(), 1e-6)
+    lower = [y.min() - span, y.min(), log_x.min() - 5, 0.05]
+    upper = [y.max(), y.max() + 2 * span, log_x.max() + 5, 20.0]
+    theta0 = np.clip(theta0, np.array(lower) + 1e-9, np.array(upper) - 1e-9)
+    res = least_squares(lambda th: predict_4pl(th, log_x) - y, theta0,
+                        jac=lambda th: jacobian_4pl(th, log_x), bounds=(lower, upper), method='trf')
+    return res
+
+def concentration_at(theta, target):
+    """ln stężenia, przy którym krzywa osiąga średnicę target (NaN poza zakresem bottom..top)."""
+    b, t, c, h = theta
+    if not (min(b, t) < target < max(b, t)):
+        return np.nan
+    return c - np.log((t - b) / (target - b) - 1) / h
+
+def _log_conc_gradient(theta, target, eps=1e-6):
+    grad = np.empty(4)
+    for i in range(4):
+        step = np.zeros(4); step[i] = eps * max(1.0, abs(theta[i]))
+        grad[i] = (concentration_at(theta + step, target) - concentration_at(theta - step, target)) / (2 * step[i])
+    return grad
+
+def fit_dose_response(df, target_diameter=6.0, col_bact=None, level=0.95, min_concentrations=4):
+    """
+    Dopasowuje krzywe 4PL dla każdej substancji (oraz szczepu, jeśli podano col_bact).
+    Zwraca tabelę: [Bakteria], Substancja, Unit, Bottom, Top, EC50, Hill, Conc@Target, CI Low, CI High, R2, N, N Conc, Converged
+    oraz słownik parametrów {klucz: theta} do rysowania krzywych.
+    Stężenie dla target_diameter jest wyznaczane tylko, gdy target leży między asymptotami krzywej.
+    """
+    sub, conc, unit = utils.parse_concentrations(df['Grupa'])
+    valid = sub.notna() & (conc > 0) & df['Srednica_mm'].notna()
+    keys = ['Bakteria', 'Substancja'] if col_bact else ['Substancja']
+    d = pd.DataFrame({'Substancja': sub[valid].values, 'Unit': unit[valid].values,
+                      'log_x': np.log(conc[valid].values), 'y': df.loc[valid, 'Srednica_mm'].values.astype(float)})
+    if col_bact: d.insert(0, 'Bakteria', df.loc[valid, col_bact].values)
+
+    # Krzywe z min. 4 stężeniami (4 parametry modelu)
+    n_conc = d.groupby(keys, sort=False)['log_x'].transform('nunique')
+    d = d[n_conc >= min_concentrations]
+    if d.empty:
+        return pd.DataFrame(columns=keys + ['Unit', 'Bottom', 'Top', 'EC50', 'Hill', 'Conc@Target', 'CI Low', 'CI High', 'R2', 'N', 'N Conc', 'Converged']), {}
+
+    d = d.sort_values(keys, kind='stable')
+    curve_ids, curve_keys = pd.factorize(pd.MultiIndex.from_frame(d[keys]) if col_bact else d['Substancja'], sort=False)
+    log_x, y = d['log_x'].values, d['y'].values
+    starts = _multistart_grid(curve_ids, log_x, y, len(curve_keys))
+
+    bounds = np.flatnonzero(np.r_[True, np.diff(curve_ids) != 0, True])
+    rows, params = [], {}
+    for k, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        lx_k, y_k = log_x[lo:hi], y[lo:hi]
+        res = _fit_one(lx_k, y_k, starts[k])
+        theta = res.x
+        n = len(y_k)
+        sse = float(np.sum(res.fun ** 2))
+        sst = float(np.sum((y_k - y_k.mean()) ** 2))
+
+        # Przedział ufności (metoda delta, kowariancja z J^T J)
+        ln_target = concentration_at(theta, target_diameter)
+        ci_lo = ci_hi = np.nan
+        if np.isfinite(ln_target) and n > 4:
+            try:
+                cov = np.linalg.pinv(res.jac.T @ res.jac) * sse / (n - 4)
+                grad = _log_conc_gradient(theta, target_diameter)
+                se = np.sqrt(max(grad @ cov @ grad, 0.0))
+                t_crit = stats.t.ppf(0.5 + level / 2, n - 4)
+                with np.errstate(over='ignore'):
+                    ci_lo, ci_hi = np.exp(ln_target - t_crit * se), np.exp(ln_target + t_crit * se)
+            except (np.linalg.LinAlgError, ValueError):
+                pass
+
+        key = curve_keys[k]
+        row = dict(zip(keys, key if col_bact else (key,)))
+        row.update({
+            'Unit': d['Unit'].iloc[lo], 'Bottom': theta[0], 'Top': theta[1], 'EC50': np.exp(theta[2]), 'Hill': theta[3],
+            'Conc@Target': np.exp(ln_target), 'CI Low': ci_lo, 'CI High': ci_hi,
+            'R2': 1 - sse / sst if sst > 0 else np.nan, 'N': n, 'N Conc': len(np.unique(lx_k)), 'Converged': bool(res.success),
+        })
+        rows.append(row)
+        params[key] = theta
+
+    return pd.DataFrame(rows), params
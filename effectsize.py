@@ -0,0 +1,111 @@
+import numpy as np
+from scipy.special import gammaln
+
+# Miara wielkości efektu dopasowana do ścieżki testu z StatsEngine.run_statistics
+HEDGES_G = "Hedges' g"
+GLASS_DELTA = "Glass's Δ"
+CLIFFS_DELTA = "Cliff's δ"
+# Opisy do generatora opisów rycin / metod (EN)
+DESCRIPTIONS = {
+    HEDGES_G: "Hedges' g (standardized mean difference with small-sample bias correction)",
+    GLASS_DELTA: "Glass's Δ (mean difference standardized by the SD of the reference group)",
+    CLIFFS_DELTA: "Cliff's delta (non-parametric dominance statistic)",
+}
+
+def measure_for_test(test_used, has_reference):
+    """
+    ANOVA -> Hedges' g; Welch ANOVA -> Glass's Δ dla porównań z grupą odniesienia (SD kontroli,
+    bez założenia równych wariancji), Hedges' g dla pozostałych par; Kruskal-Wallis -> Cliff's δ.
+    """
+    if test_used == "Kruskal-Wallis":
+        return CLIFFS_DELTA
+    if test_used == "Welch ANOVA" and has_reference:
+        return GLASS_DELTA
+    return HEDGES_G
+
+def hedges_correction(df):
+    """Dokładny czynnik korekty małych prób J(df) = Γ(df/2) / (sqrt(df/2) Γ((df-1)/2))."""
+    df = np.asarray(df, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.exp(gammaln(df / 2) - gammaln((df - 1) / 2)) / np.sqrt(df / 2)
+
+def hedges_g(mean1, mean2, var1, var2, n1, n2):
+    """Hedges' g (grupa 1 - grupa 2) dla tablic par; NaN gdy połączone SD = 0 lub n < 2."""
+    mean1, mean2, var1, var2, n1, n2 = (np.asarray(a, dtype=float) for a in (mean1, mean2, var1, var2, n1, n2))
+    df = n1 + n2 - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s_pooled = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / df)
+        g = (mean1 - mean2) / s_pooled * hedges_correction(df)
+    return np.where((s_pooled > 0) & (n1 >= 2) & (n2 >= 2), g, np.nan)
+
+def glass_delta(mean1, mean2, var_ref, n_ref):
+    """
+    Glass's Δ: różnica średnich (grupa 1 - grupa 2) w jednostkach SD grupy odniesienia,
+    z korektą małych prób J(n_ref - 1). NaN gdy SD odniesienia = 0.
+    """
+    mean1, mean2, var_ref, n_ref = (np.asarray(a, dtype=float) for a in (mean1, mean2, var_ref, n_ref))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sd = np.sqrt(var_ref)
+        delta = (mean1 - mean2) / sd * hedges_correction(n_ref - 1)
+    return np.where((sd > 0) & (n_ref >= 2), delta, np.nan)
+
+def cliffs_delta(sorted_groups, i, j):
+    """
+    Cliff's δ = P(X > Y) - P(X < Y) dla par grup (i[k], j[k]), wektorowo: wszystkie grupy trafiają do jednej
+    posortowanej tablicy (każda przesunięta o własny offset), a liczności mniejszych/większych wartości
+    dla wszystkich pomiarów wszystkich par daje jedno searchsorted - O(n log n) zamiast O(n1 * n2).
+    sorted_groups: lista posortowanych tablic pomiarów.
+    """
+    i, j = np.asarray(i, dtype=int), np.asarray(j, dtype=int)
+    if len(i) == 0:
+        return np.empty(0)
+    sizes = np.array([len(g) for g in sorted_groups])
+    lo = min(g[0] for g in sorted_groups if len(g))
+    hi = max(g[-1] for g in sorted_groups if len(g))
+    span = (hi - lo) + 1.0
+    offsets = np.r_[0, np.cumsum(sizes)]
+    # Blok grupy g zajmuje przedział [g * span, (g + 1) * span) - posortowane bloki tworzą posortowaną całość
+    packed = np.concatenate([np.asarray(g, dtype=float) - lo + k * span for k, g in enumerate(sorted_groups)])
+
+    queries = np.concatenate([np.asarray(sorted_groups[a], dtype=float) - lo + b * span for a, b in zip(i, j)])
+    target = np.repeat(j, sizes[i])
+    below = np.searchsorted(packed, queries, side='left') - offsets[target]        # #(Y < x)
+    above = offsets[target + 1] - np.searchsorted(packed, queries, side='right')   # #(Y > x)
+    starts = np.r_[0, np.cumsum(sizes[i])[:-1]]
+    nonempty = sizes[i] > 0
+    dominance = np.zeros(len(i))
+    dominance[nonempty] = np.add.reduceat(above - below, starts[nonempty])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Grupa 1 > grupa 2 -> wartość dodatnia (jak w pozostałych miarach)
+        return -dominance / (sizes[i] * sizes[j])
+
+def pairwise_effects(summaries, i, j, test_used, ref_index=None):
+    """
+    Wielkości efektu dla par (i, j) ze statystyk grup StatsEngine (n, mean, var, sorted).
+    Zwraca (wartości, lista nazw miar) - miara wybierana per para wg measure_for_test.
+    """
+    i, j = np.asarray(i, dtype=int), np.asarray(j, dtype=int)
+    ns = np.array([gs["n"] for gs in summaries], dtype=float)
+    means = np.array([gs["mean"] for gs in summaries], dtype=float)
+    variances = np.array([gs["var"] for gs in summaries], dtype=float)
+    with_ref = (i == ref_index) | (j == ref_index) if ref_index is not None else np.zeros(len(i), dtype=bool)
+    measures = [measure_for_test(test_used, r) for r in with_ref]
+
+    if test_used == "Kruskal-Wallis":
+        return cliffs_delta([gs["sorted"] for gs in summaries], i, j), measures
+
+    values = hedges_g(means[i], means[j], variances[i], variances[j], ns[i], ns[j])
+    glass = np.array([m == GLASS_DELTA for m in measures], dtype=bool)
+    if glass.any():
+        ref = np.full(len(i), ref_index if ref_index is not None else 0)
+        values[glass] = glass_delta(means[i[glass]], means[j[glass]], variances[ref[glass]], ns[ref[glass]])
+    return values, measures
+
+def describe(measures):
+    """Opis użytych miar do tekstu metod, np. "Hedges' g (...) and Glass's Δ (...)"."""
+    used = [m for m in (HEDGES_G, GLASS_DELTA, CLIFFS_DELTA) if m in set(measures)]
+    return " and ".join(DESCRIPTIONS[m] for m in used)
+
+def interpretation_thresholds(measure):
+    """Progi (mały, średni, duży): Cohen (1988) dla g/Δ, Romano i wsp. (2006) dla Cliff's δ."""
+    return (0.147, 0.33, 0.474) if measure == CLIFFS_DELTA else (0.2, 0.5, 0.8)
@@ -1,17 +1,36 @@
 import customtkinter as ctk
 import tkinter as tk
+import io
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 from tkinter import filedialog, messagebox
 import pandas as pd
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
 from datetime import datetime
 
 # Impornty modułów
 import utils
-from dialogs import OutlierDialog, HelpDialog, AboutDialog
+from dialogs import OutlierDialog, HelpDialog, AboutDialog, PowerDialog
 import reports
+import loader
+import session
+from watcher import FolderWatcher, WorkbookSet
+import clustering
+import multitest
+import effectsize
+import rendercache
+import breakpoints
+import plates
+from store import ResultsStore
+from archive import MeasurementArchive
 from logic import StatsEngine
-from plotting import Plotter
+from plotting import Plotter, DEFAULT_CONFIG, PREVIEW_DPI
+
+RENDER_POLL_MS = 50   # odczyt kolejki gotowych renderów w wątku Tk
+RENDER_WAIT_S = 120   # maks. czas oczekiwania eksportu na pojedynczy render
+WATCH_POLL_MS = 250   # odczyt kolejki zmian z obserwatora folderu w wątku Tk
+from widgets import GroupSelector, ResultsTable
 
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
@@ -26,8 +45,6 @@ class App(ctk.CTk):
         # --- ZMIENNE DANYCH ---
         self.df = None           
         self.col_bact_name = None
-        self.checkboxes = []     
-        self.sample_vars = {}    
         
         # --- ZMIENNE EXPORTU ---
         self.export_data_raw = None
@@ -36,31 +53,76 @@ class App(ctk.CTk):
         self.export_stats_posthoc = None
         self.posthoc_detailed_results = [] 
         self.stats_summary = None 
+        self.export_mic_table = None
+        self.stored_mic_key = None  # (dane, grupy, model, cel) ostatniej tabeli MIC zapisanej w historii
+        self.export_study_pairwise = None
+        self.figure_data = {}  # wyniki użyte przez wykresy (PCA, klastrowanie, MIC, kategorie) - zapisywane w sesji
         
         # --- FIGURY ---
         self.figures = {
             'bar': None, 'heat': None, 'pvalue': None,
-            'trend': None, 'effect': None, 'cross': None, 'pca': None
+            'trend': None, 'effect': None, 'cross': None, 'pca': None, 'cluster': None, 'mic': None
         }
+        # Pełne rendery w tle (jeden wątek - kolejne wersje wykresu rysowane po kolejności, bez konkurencji o CPU
+        # z interfejsem). Szkice powstają równolegle w wątku Tk: każda figura to osobny plt.Figure z własnym
+        # płótnem Agg (bez pyplot / Gcf), a każdy render dostaje migawkę konfiguracji (Plotter.snapshot);
+        # token per wykres - nowsze żądanie unieważnia starsze, nieaktualne wyniki są odrzucane.
+        # Wyniki wracają kolejką odczytywaną w wątku Tk (poll_renders); render_pending: wykres -> oczekiwany token
+        self.render_pool = ThreadPoolExecutor(max_workers=1)
+        self.render_tokens = dict.fromkeys(self.figures, 0)
+        self.render_results = queue.Queue()
+        self.render_pending = {}
         
         # --- KONFIGURACJA ---
-        self.plot_config = {
-            "font_labels": 10, "font_title": 12, "axis_max": 0, "star_offset": 0.03, "bar_width": 0.8,
-            "show_disk_line": True, "palette": "viridis", "transparent_background": True,
-            "plot_type": "Barplot (Słupkowy)", "error_bar": "SD (Odchylenie Std.)", "show_points": False
-        }
+        self.plot_config = dict(DEFAULT_CONFIG)
         
         self.available_palettes = ["viridis", "magma", "plasma", "inferno", "Blues", "Reds", "Greens", "Spectral", "coolwarm", "gray", "tab10"]
         self.available_plot_types = ["Barplot (Słupkowy)", "Boxplot (Pudełkowy)", "Violinplot (Skrzypcowy)"]
         self.available_error_bars = ["SD (Odchylenie Std.)", "SEM (Błąd Std.)", "95% CI (Przedział Ufności)"]
+        self.available_ci_methods = ["Analityczny (t)", "Bootstrap (1000x, stałe ziarno)"]
+        self.available_pca_views = ["Punkty (PC1 vs PC2)", "Biplot", "Scree (wariancja)"]
+        self.available_cluster_metrics = clustering.METRICS
+        self.available_cluster_methods = clustering.METHODS
+        self.available_mic_models = ["Log-liniowy", "4PL (Hill)"]
+        self.available_study_corrections = ["Brak"] + multitest.METHODS
+        self.available_pvalue_orders = ["Alfabetycznie", "Substancja", "Klastrowanie"]
 
         # --- MODUŁY ---
         self.stats_engine = StatsEngine()
         self.plotter = Plotter(self.plot_config)
+        try:
+            self.results_store = ResultsStore()
+        except Exception as e:
+            print(f"Warning: Historia wyników niedostępna: {e}")
+            self.results_store = None
+        try:
+            self.archive = MeasurementArchive()
+        except Exception as e:
+            print(f"Warning: Archiwum pomiarów niedostępne: {e}")
+            self.archive = None
+        self.dataset_hash = None
+        self.file_name = None
+        self.folder_watcher = None
+        self.watch_set = None
+        self.watch_changes = queue.Queue()  # (zestaw, wynik WorkbookSet.update) z wątku obserwatora
+        self.removed_outliers = []
+        self.breakpoints = None  # tabela breakpointów S/I/R (breakpoints.BreakpointTable)
 
         # --- LAYOUT ---
         self._setup_layout()
         self.log("Witaj w wersji 3.0 (Modularnej)! Wczytaj plik Excel.")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(RENDER_POLL_MS, self.poll_renders)
+        self.after(WATCH_POLL_MS, self.poll_watch)
+
+    def on_close(self):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        if self.results_store is not None:
+            self.results_store.flush()
+            self.results_store.close()
+        self.render_pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
 
     def _setup_layout(self):
         self.grid_columnconfigure(1, weight=1) 
@@ -75,8 +137,14 @@ class App(ctk.CTk):
         self.logo = ctk.CTkLabel(self.sidebar, text="Panel Sterowania", font=ctk.CTkFont(size=18, weight="bold"))
         self.logo.grid(row=0, column=0, padx=20, pady=(20, 10))
 
-        self.btn_load = ctk.CTkButton(self.sidebar, text="1. Wczytaj Excel", command=self.load_file)
-        self.btn_load.grid(row=1, column=0, padx=20, pady=10)
+        self.load_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
+        self.load_frame.grid(row=1, column=0, padx=20, pady=10)
+        self.btn_load = ctk.CTkButton(self.load_frame, text="1. Wczytaj Excel", width=100, command=self.load_file)
+        self.btn_load.pack(side="left")
+        self.btn_load_folder = ctk.CTkButton(self.load_frame, text="📁", width=36, command=self.load_folder)
+        self.btn_load_folder.pack(side="left", padx=(4, 0))
+        self.btn_load_plates = ctk.CTkButton(self.load_frame, text="📷", width=36, command=self.load_plate_photos)
+        self.btn_load_plates.pack(side="left", padx=(4, 0))
         self.lbl_file = ctk.CTkLabel(self.sidebar, text="Brak pliku", text_color="gray", font=("Arial", 10))
         self.lbl_file.grid(row=2, column=0, padx=20, pady=(0, 10))
 
@@ -139,26 +207,54 @@ class App(ctk.CTk):
         self.tab_heatmap = self.main_view.add("Mapa Ciepła")
         self.tab_pvalue = self.main_view.add("Mapa P-value")
         self.tab_trend = self.main_view.add("Trend (Dawka)")
+        self.tab_mic = self.main_view.add("Mapa MIC")
         self.tab_effect = self.main_view.add("Wielkość Efektu")
         self.tab_cross = self.main_view.add("Porównanie Szczepów") 
         self.tab_pca = self.main_view.add("Analiza PCA")
+        self.tab_cluster = self.main_view.add("Klastrowanie")
+        self.tab_table = self.main_view.add("Tabela Wyników")
         self.tab_log = self.main_view.add("Raport Statystyczny")
+        self.figure_tabs = {
+            'bar': self.tab_plot, 'heat': self.tab_heatmap, 'pvalue': self.tab_pvalue, 'trend': self.tab_trend,
+            'mic': self.tab_mic, 'effect': self.tab_effect, 'cross': self.tab_cross, 'pca': self.tab_pca, 'cluster': self.tab_cluster
+        }
         
         self.textbox = ctk.CTkTextbox(self.tab_log, font=("Consolas", 12))
         self.textbox.pack(expand=True, fill="both", padx=5, pady=5)
+        self.results_table = ResultsTable(self.tab_table, fg_color="transparent")
+        self.results_table.pack(expand=True, fill="both", padx=5, pady=5)
 
         # Prawy Panel
         self.right_frame = ctk.CTkFrame(self, width=200, corner_radius=0)
         self.right_frame.grid(row=0, column=2, sticky="nsew")
         self.right_frame.grid_rowconfigure(1, weight=1)
         ctk.CTkLabel(self.right_frame, text="Wybór próbek:", font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, padx=10, pady=(10, 5))
-        self.scroll_samples = ctk.CTkScrollableFrame(self.right_frame, label_text="Dostępne grupy", height=600)
-        self.scroll_samples.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        # Lista wirtualizowana: widżety tylko dla widocznych wierszy, zaznaczenie w tablicy (setki grup)
+        self.group_selector = GroupSelector(self.right_frame, rows=20)
+        self.group_selector.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
         self.btn_select_all = ctk.CTkButton(self.right_frame, text="Zaznacz wszystko", width=100, command=self.select_all)
         self.btn_select_all.grid(row=2, column=0, padx=10, pady=5)
         self.btn_deselect_all = ctk.CTkButton(self.right_frame, text="Odznacz wszystko", width=100, fg_color="gray", command=self.deselect_all)
         self.btn_deselect_all.grid(row=3, column=0, padx=10, pady=(5, 20))
 
+        # Archiwum pomiarów (porównania wieloletnie)
+        self.btn_archive = ctk.CTkButton(self.right_frame, text="🗄 Dodaj do archiwum", width=100, fg_color="#555555", hover_color="#333333", command=self.import_to_archive)
+        self.btn_archive.grid(row=4, column=0, padx=10, pady=5)
+        self.switch_archive = ctk.CTkSwitch(self.right_frame, text="Porównania z archiwum")
+        self.switch_archive.grid(row=5, column=0, padx=10, pady=(5, 5))
+        self.switch_watch = ctk.CTkSwitch(self.right_frame, text="Obserwuj folder", command=self.toggle_watch)
+        self.switch_watch.grid(row=6, column=0, padx=10, pady=(5, 20))
+
+        self.session_frame = ctk.CTkFrame(self.right_frame, fg_color="transparent")
+        self.session_frame.grid(row=7, column=0, padx=10, pady=(0, 20))
+        ctk.CTkButton(self.session_frame, text="💼 Zapisz sesję", width=90, command=self.save_session).pack(side="left", padx=(0, 4))
+        ctk.CTkButton(self.session_frame, text="📂 Otwórz", width=70, command=self.restore_session).pack(side="left")
+
+        self.btn_power = ctk.CTkButton(self.right_frame, text="📈 Planer mocy", width=100, fg_color="#555555", hover_color="#333333", command=self.open_power_planner)
+        self.btn_power.grid(row=8, column=0, padx=10, pady=(0, 20))
+        self.btn_breakpoints = ctk.CTkButton(self.right_frame, text="🧫 Breakpointy S/I/R", width=100, fg_color="#555555", hover_color="#333333", command=self.load_breakpoints)
+        self.btn_breakpoints.grid(row=9, column=0, padx=10, pady=(0, 20))
+
     # ==================== LOGIKA POMOCNICZA ====================
     def log(self, text):
         self.textbox.insert("end", text + "\n")
@@ -166,55 +262,170 @@ class App(ctk.CTk):
     def clear_log(self): self.textbox.delete("1.0", "end")
 
     def load_file(self):
-        path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx *.xls")])
-        if path:
-            try:
-                self.df = pd.read_excel(path)
-                self.df.columns = self.df.columns.str.strip()
-                for col in self.df.select_dtypes(['object']).columns:
-                    self.df[col] = self.df[col].str.strip()
-                
-                self.lbl_file.configure(text=path.split("/")[-1], text_color="white")
-                col = next((c for c in self.df.columns if 'Bakteri' in c), None)
-                if col:
-                    self.col_bact_name = col
-                    bacts = list(self.df[col].unique())
-                    self.combo_bact.configure(values=bacts)
-                    self.combo_bact.set(bacts[0])
-                    self.on_bacteria_change(bacts[0])
-                    self.log(f"Wczytano plik. Znaleziono szczepy: {bacts}")
-                else: messagebox.showerror("Błąd", "Brak kolumny 'Bakterie'.")
-            except Exception as e: messagebox.showerror("Błąd", f"Nie udało się wczytać: {e}")
+        paths = filedialog.askopenfilenames(filetypes=[("Excel files", "*.xlsx *.xls")])
+        if paths: self.load_sources(list(paths))
+
+    def load_folder(self):
+        path = filedialog.askdirectory()
+        if path: self.load_sources([path])
+
+    def load_plate_photos(self):
+        """Pomiar średnic stref ze zdjęć płytek (opcjonalnie z opisem płytek: Plik, Krążek, Grupa) jako nowy zbiór danych."""
+        paths = filedialog.askopenfilenames(filetypes=[("Zdjęcia płytek", "*.png *.jpg *.jpeg *.tif *.tiff")])
+        if not paths: return
+        manifest = None
+        if messagebox.askyesno("Opis płytek", "Wczytać opis płytek (Plik, Krążek, Grupa[, Bakterie])?\n"
+                               "Bez opisu każde zdjęcie jest osobnym szczepem, a każdy krążek osobną grupą z jednym pomiarem - "
+                               "bez powtórzeń analiza statystyczna nie jest możliwa."):
+            man_path = filedialog.askopenfilename(filetypes=[("Opis płytek", "*.csv *.xlsx *.xls *.txt")])
+            if man_path:
+                manifest, err = plates.load_manifest(man_path)
+                if err:
+                    messagebox.showerror("Błąd", err)
+                    return
+        try:
+            df, messages = plates.measure_plates(list(paths), manifest)
+            for msg in messages: self.log(f"Pomiar: {msg}")
+            if df is None:
+                messagebox.showerror("Błąd", "Nie zmierzono stref:\n" + "\n".join(messages[:10]))
+                return
+            self.set_dataframe(df)
+            self.log(f"Zmierzono {df['Srednica_mm'].notna().sum()} stref na {df['Plik'].nunique()} zdjęciach "
+                     f"(kalibracja z krążków {plates.DISK_MM:g} mm). Sprawdź pomiary przed analizą.")
+            if manifest is None:
+                self.log("Uwaga: bez opisu płytek każde zdjęcie to osobny szczep z jednym pomiarem na krążek - "
+                         "do analizy wczytaj opis płytek łączący zdjęcia powtórzeń (te same Bakterie / Grupa).")
+        except Exception as e: messagebox.showerror("Błąd", f"Nie udało się zmierzyć płytek: {e}")
+
+    def load_sources(self, paths):
+        """Wczytuje pliki/foldery (wszystkie arkusze, równolegle) i podmienia bieżący zbiór danych."""
+        try:
+            df, messages = loader.load_workbooks(paths)
+            for msg in messages: self.log(f"Pominięto: {msg}")
+            if df is None:
+                messagebox.showerror("Błąd", "Nie udało się wczytać danych:\n" + "\n".join(messages[:10]))
+                return
+            self.set_dataframe(df)
+        except Exception as e: messagebox.showerror("Błąd", f"Nie udało się wczytać: {e}")
+
+    def set_dataframe(self, df, keep_selection=False):
+        """Podmienia bieżący zbiór danych. keep_selection: zachowuje wybrany szczep i zaznaczenia grup (odświeżanie)."""
+        prev_bact = self.combo_bact.get()
+        prev_selection = self.group_selector.selection_map() if keep_selection else {}
+        self.df = df
+        # Odświeżenie (obserwacja folderu): statystyki niezmienionych grup zostają w cache
+        if keep_selection: self.stats_engine.invalidate_data()
+        else: self.stats_engine.reset_cache()
+        self.dataset_hash = utils.dataset_fingerprint(self.df)
+
+        n_files, n_sheets = self.df['Plik'].nunique(), self.df[['Plik', 'Arkusz']].drop_duplicates().shape[0]
+        self.file_name = self.df['Plik'].iloc[0] if n_files == 1 else f"{n_files} plików ({n_sheets} arkuszy)"
+        self.lbl_file.configure(text=self.file_name, text_color="white")
+        self.col_bact_name = 'Bakterie'
+        bacts = list(self.df['Bakterie'].unique())
+        self.combo_bact.configure(values=bacts)
+        bact = prev_bact if keep_selection and prev_bact in bacts else bacts[0]
+        self.combo_bact.set(bact)
+        self.on_bacteria_change(bact)
+        if prev_selection: self.group_selector.restore_selection(prev_selection)
+        self.log(f"Wczytano {n_files} plik(ów), {n_sheets} arkusz(y), {self.df['Plytka'].nunique()} płytek. Znaleziono szczepy: {bacts}")
+
+    # ==================== OBSERWACJA FOLDERU ====================
+    def toggle_watch(self):
+        if not self.switch_watch.get():
+            if self.folder_watcher is not None: self.folder_watcher.stop()
+            self.folder_watcher = None
+            self.log("Obserwacja folderu wyłączona.")
+            return
+        folder = filedialog.askdirectory()
+        if not folder:
+            self.switch_watch.deselect()
+            return
+        watch_set = self.watch_set = WorkbookSet()
+        # Wczytanie (I/O) w wątku obserwatora, aktualizacja UI w wątku Tk (kolejka watch_changes, poll_watch)
+        self.folder_watcher = FolderWatcher(folder, lambda ch, rm: self.watch_changes.put((watch_set, watch_set.update(ch, rm))))
+        df, _, messages = self.watch_set.update(self.folder_watcher.start())
+        for msg in messages: self.log(f"Pominięto: {msg}")
+        if df is None:
+            messagebox.showerror("Błąd", "W folderze nie ma skoroszytów z kolumnami Bakterie, Grupa, Srednica_mm.")
+            self.switch_watch.deselect()
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+            return
+        self.set_dataframe(df)
+        self.log(f"Obserwuję folder: {folder}")
+
+    def poll_watch(self):
+        """Wątek Tk: odbiera zmiany z obserwatora folderu (bez wywołań Tk z wątku obserwatora)."""
+        try:
+            while True:
+                watch_set, change = self.watch_changes.get_nowait()
+                # Wyniki wyłączonej / zastąpionej obserwacji są odrzucane
+                if watch_set is self.watch_set: self._apply_watch_change(*change)
+        except queue.Empty:
+            pass
+        self.after(WATCH_POLL_MS, self.poll_watch)
+
+    def _apply_watch_change(self, df, changed_strains, messages):
+        if self.folder_watcher is None: return
+        for msg in messages: self.log(f"Pominięto: {msg}")
+        if df is None or not changed_strains: return
+        analyzed = self.export_data_raw is not None
+        self.set_dataframe(df, keep_selection=True)
+        self.log(f"[{datetime.now():%H:%M:%S}] Zmienione szczepy: {', '.join(map(str, changed_strains))}")
+        # Przeliczenie tylko, gdy zmienił się aktualnie analizowany szczep
+        if analyzed and self.combo_bact.get() in changed_strains:
+            self.run_analysis(auto=True)
 
     def on_bacteria_change(self, selected_bact):
         if self.df is None: return
         try:
             all_groups = sorted(self.df['Grupa'].unique(), key=utils.smart_sort_key)
-            
-            for cb in self.checkboxes: cb.destroy()
-            self.checkboxes = []
-            self.sample_vars = {}
-            for g in all_groups:
-                var = ctk.IntVar(value=1)
-                self.sample_vars[g] = var
-                cb = ctk.CTkCheckBox(self.scroll_samples, text=g, variable=var)
-                cb.pack(anchor="w", padx=5, pady=2)
-                self.checkboxes.append(cb)
+            self.group_selector.set_groups(all_groups)
             
             df_temp = self.df[self.df[self.col_bact_name] == selected_bact]
             grupy_bact = sorted(df_temp['Grupa'].unique(), key=utils.smart_sort_key)
             self.combo_ref.configure(values=grupy_bact)
-            woda = next((g for g in grupy_bact if "woda" in g.lower() or "kontrol" in g.lower()), None)
-            if woda: self.combo_ref.set(woda)
-            elif grupy_bact: self.combo_ref.set(grupy_bact[0])
+            ref = utils.default_reference_group(grupy_bact)
+            if ref: self.combo_ref.set(ref)
         except Exception as e: self.log(f"Błąd zmiany bakterii: {e}")
 
+    def import_to_archive(self):
+        if self.df is None or self.archive is None: return
+        try:
+            n = self.archive.import_dataframe(self.df, self.col_bact_name, self.file_name)
+            if n:
+                self.log(f"Dodano {n} pomiarów do archiwum (partia: {self.file_name}, łącznie {len(self.archive)}).")
+            else:
+                self.log("Te dane są już w archiwum - pominięto.")
+        except Exception as e: messagebox.showerror("Błąd", f"Nie udało się zapisać do archiwum: {e}")
+
+    def get_comparison_source(self, groups):
+        """Dane do porównań między szczepami (Porównanie, PCA, Klastrowanie): wczytany plik lub wycinek archiwum."""
+        if self.archive is not None and self.switch_archive.get() and len(self.archive):
+            df_arch = self.archive.query(groups=groups, col_bact=self.col_bact_name)
+            if not df_arch.empty:
+                self.log(f"Porównania z archiwum: {len(df_arch)} pomiarów, {df_arch['Partia'].nunique()} partii.")
+                return df_arch, self.archive.version
+            self.log("Archiwum nie zawiera wybranych grup - porównania z bieżącego pliku.")
+        return self.df, None
+
+    def load_breakpoints(self):
+        file_path = filedialog.askopenfilename(filetypes=[("Tabela breakpointów", "*.csv *.xlsx *.xls *.txt")])
+        if not file_path: return
+        table, err = breakpoints.load_breakpoints(file_path)
+        if err:
+            messagebox.showerror("Błąd", err)
+            return
+        self.breakpoints = table
+        self.log(f"Wczytano breakpointy: {len(table)} par (organizm, substancja) z {file_path.split('/')[-1]}. Kategorie S/I/R pojawią się po uruchomieniu analizy.")
+
     def select_all(self):
-        for var in self.sample_vars.values(): var.set(1)
+        self.group_selector.select_all()
     def deselect_all(self):
-        for var in self.sample_vars.values(): var.set(0)
+        self.group_selector.deselect_all()
     def get_selected_groups(self):
-        return [g for g, var in self.sample_vars.items() if var.get() == 1]
+        return self.group_selector.get_selected()
     
     def update_orientation(self, value):
         self.plot_config["orientation"] = value
@@ -232,6 +443,20 @@ class App(ctk.CTk):
             self.about_window.lift()
         else: self.about_window = AboutDialog(self)
 
+    def open_power_planner(self):
+        if hasattr(self, 'power_window') and self.power_window is not None and self.power_window.winfo_exists():
+            self.power_window.lift()
+            return
+        # Wstępne wartości z bieżącego szczepu (średnia, SD, n grup) - do edycji w oknie
+        rows = []
+        if self.df is not None:
+            df_b = self.df[self.df[self.col_bact_name] == self.combo_bact.get()]
+            for g, vals in df_b.groupby('Grupa')['Srednica_mm']:
+                if len(vals) >= 2: rows.append((g, vals.mean(), vals.std(), len(vals)))
+            rows.sort(key=lambda r: utils.smart_sort_key(r[0]))
+        ref = self.combo_ref.get() if self.combo_ref.get() != "..." else (rows[0][0] if rows else "")
+        self.power_window = PowerDialog(self, rows, ref, self.combo_method.get())
+
     def open_caption_window(self):
         win = ctk.CTkToplevel(self)
         win.title("Generator Opisów do Publikacji")
@@ -248,17 +473,33 @@ class App(ctk.CTk):
         elif post_hoc == "fdr_bh": post_hoc = "Benjamini-Hochberg (FDR) correction"
         elif post_hoc == "holm": post_hoc = "Holm-Bonferroni correction"
         else: post_hoc = "Bonferroni correction"
+        if self.export_stats_main and self.export_stats_main[0].get("Test", "") == "ANOVA":
+            post_hoc = "Tukey's HSD test"  # Tukey kontroluje FWER sam, bez dodatkowej korekty
+        elif self.export_stats_main and self.export_stats_main[0].get("Test", "") == "Welch ANOVA":
+            post_hoc = "the Games-Howell test"
+
+        study_method = self.plot_config["study_correction"]
+        study_names = {"fdr_bh": "Benjamini-Hochberg false discovery rate", "fdr_by": "Benjamini-Yekutieli false discovery rate",
+                       "storey": "Storey q-value", "holm": "Holm-Bonferroni", "bonferroni": "Bonferroni"}
+        study_desc = "" if study_method == "Brak" else (
+            f"\nAdditionally, unadjusted pairwise p-values from all strains and comparisons in the study were pooled and adjusted "
+            f"using the {study_names[study_method]} procedure (study-wide correction).")
 
         test_name = "Statistical test" 
         if self.export_stats_main:
             used_test = self.export_stats_main[0].get("Test", "")
-            if "ANOVA" in used_test: test_name = "One-way ANOVA"
+            if used_test == "Welch ANOVA": test_name = "Welch's one-way ANOVA"
+            elif "ANOVA" in used_test: test_name = "One-way ANOVA"
             elif "Kruskal" in used_test: test_name = "Kruskal-Wallis test"
 
         err_conf = self.plot_config["error_bar"]
         if "SD" in err_conf: err_desc = "standard deviation (SD)"
         elif "SEM" in err_conf: err_desc = "standard error of the mean (SEM)"
-        else: err_desc = "95% confidence interval (95% CI)"
+        elif "Bootstrap" in self.plot_config["ci_method"]: err_desc = "95% confidence interval (95% CI, percentile bootstrap, 1000 resamples)"
+        else: err_desc = "95% confidence interval (95% CI, t-distribution)"
+
+        measures = [d["Effect Measure"] for d in self.posthoc_detailed_results] or [effectsize.HEDGES_G]
+        effect_desc = effectsize.describe(measures)
 
         plot_type = self.plot_config["plot_type"]
         if "Barplot" in plot_type: 
@@ -273,7 +514,7 @@ Możesz skopiować poniższe opisy bezpośrednio do manuskryptu (Word/LaTeX).
 Figure 1. Antibacterial activity of tested samples against {bact}.
 {viz_desc}. Error bars indicate the {err_desc} of independent replicates.
 Statistical significance was determined using {test_name} followed by {post_hoc} for multiple comparisons.
-Asterisks (*) indicate a statistically significant difference (p < 0.05) compared to the negative control ({ref_group}).
+Asterisks (*) indicate a statistically significant difference (p < 0.05) compared to the negative control ({ref_group}).{study_desc}
 Red dashed line represents the diameter of the disk (6 mm).
 
 === Rycina 2: Mapa Ciepła ===
@@ -281,7 +522,7 @@ Figure 2. Heatmap visualizing the magnitude of growth inhibition zones (mm) for
 Color intensity corresponds to the mean diameter of the inhibition zone. Warmer colors indicate higher antibacterial activity.
 
 === Rycina 3: Mapa Wielkości Efektu (Effect Size) ===
-Figure 3. Lollipop chart displaying the standardized effect size (Cohen's d) for statistically significant pairwise comparisons.
+Figure 3. Lollipop chart displaying the effect size ({effect_desc}) for statistically significant pairwise comparisons.
 Dots represent the magnitude of the difference between groups. Green dots indicate a positive difference (Group 1 > Group 2), while red dots indicate a negative difference.
 
 === Rycina 4: Mapa Istotności (P-value Matrix) ===
@@ -298,71 +539,127 @@ Shaded areas indicate the confidence interval. Spearman correlation coefficients
 Figure 6. Cross-species comparison of antibacterial activity.
 Bar chart summarizing the mean inhibition zone diameters for selected substances across different bacterial strains.
 Error bars represent standard deviation. This overview highlights the differential susceptibility of tested pathogens to the antimicrobial agents.
+
+=== Rycina 7: Klastrowanie Szczepów ===
+Figure 7. Hierarchical clustering of bacterial strains based on their susceptibility profiles.
+Mean inhibition zone diameters were standardized per substance; strains were clustered using {self.plot_config["cluster_method"]} linkage on {self.plot_config["cluster_metric"]} distances.
+The heatmap shows mean zone diameters (mm) with rows and columns reordered according to the dendrogram.
 """
         text_area.insert("0.0", captions)
 
     def open_plot_settings(self):
         self.settings_win = ctk.CTkToplevel(self)
         self.settings_win.title("Ustawienia Wykresu")
-        self.settings_win.geometry("400x800")
+        self.settings_win.geometry("420x700")
         self.settings_win.attributes("-topmost", True) 
-        
-        ctk.CTkLabel(self.settings_win, text="Typ wykresu:").pack(pady=(10,5))
-        self.option_plot_type = ctk.CTkOptionMenu(self.settings_win, values=self.available_plot_types)
+
+        # Przycisk zawsze widoczny, opcje w przewijanym panelu (okno mieści się na ekranach 1080p i mniejszych)
+        ctk.CTkButton(self.settings_win, text="Odśwież Wykres", fg_color="green", command=self.apply_settings).pack(side="bottom", pady=15)
+        body = ctk.CTkScrollableFrame(self.settings_win)
+        body.pack(fill="both", expand=True, padx=5, pady=(5, 0))
+
+        ctk.CTkLabel(body, text="Typ wykresu:").pack(pady=(10,5))
+        self.option_plot_type = ctk.CTkOptionMenu(body, values=self.available_plot_types)
         self.option_plot_type.set(self.plot_config["plot_type"])
         self.option_plot_type.pack(pady=5)
 
-        ctk.CTkLabel(self.settings_win, text="Rodzaj słupka błędu:").pack(pady=(10,5))
-        self.option_error = ctk.CTkOptionMenu(self.settings_win, values=self.available_error_bars)
+        ctk.CTkLabel(body, text="Rodzaj słupka błędu:").pack(pady=(10,5))
+        self.option_error = ctk.CTkOptionMenu(body, values=self.available_error_bars)
         self.option_error.set(self.plot_config["error_bar"])
         self.option_error.pack(pady=5)
 
-        ctk.CTkLabel(self.settings_win, text="Styl kolorystyczny:").pack(pady=(10,5))
-        self.option_palette = ctk.CTkOptionMenu(self.settings_win, values=self.available_palettes)
+        ctk.CTkLabel(body, text="Metoda 95% CI (słupki i pasma):").pack(pady=(10,5))
+        self.option_ci = ctk.CTkOptionMenu(body, values=self.available_ci_methods)
+        self.option_ci.set(self.plot_config["ci_method"])
+        self.option_ci.pack(pady=5)
+
+        ctk.CTkLabel(body, text="Styl kolorystyczny:").pack(pady=(10,5))
+        self.option_palette = ctk.CTkOptionMenu(body, values=self.available_palettes)
         self.option_palette.set(self.plot_config["palette"])
         self.option_palette.pack(pady=5)
 
-        self.switch_points = ctk.CTkSwitch(self.settings_win, text="Pokaż punkty pomiarowe")
+        ctk.CTkLabel(body, text="Widok PCA:").pack(pady=(10,5))
+        self.option_pca_view = ctk.CTkOptionMenu(body, values=self.available_pca_views)
+        self.option_pca_view.set(self.plot_config["pca_view"])
+        self.option_pca_view.pack(pady=5)
+
+        ctk.CTkLabel(body, text="Model MIC / średnica docelowa (mm):").pack(pady=(10,5))
+        self.option_mic_model = ctk.CTkOptionMenu(body, values=self.available_mic_models)
+        self.option_mic_model.set(self.plot_config["mic_model"])
+        self.option_mic_model.pack(pady=5)
+        self.entry_mic_target = ctk.CTkEntry(body)
+        self.entry_mic_target.insert(0, str(self.plot_config["mic_target"]))
+        self.entry_mic_target.pack(pady=5)
+
+        ctk.CTkLabel(body, text="Korekta p-value w całym badaniu:").pack(pady=(10,5))
+        self.option_study_correction = ctk.CTkOptionMenu(body, values=self.available_study_corrections)
+        self.option_study_correction.set(self.plot_config["study_correction"])
+        self.option_study_correction.pack(pady=5)
+
+        ctk.CTkLabel(body, text="Kolejność grup na mapie p-value:").pack(pady=(10,5))
+        self.option_pvalue_order = ctk.CTkOptionMenu(body, values=self.available_pvalue_orders)
+        self.option_pvalue_order.set(self.plot_config["pvalue_order"])
+        self.option_pvalue_order.pack(pady=5)
+
+        ctk.CTkLabel(body, text="Klastrowanie (metryka / metoda):").pack(pady=(10,5))
+        self.option_cluster_metric = ctk.CTkOptionMenu(body, values=self.available_cluster_metrics)
+        self.option_cluster_metric.set(self.plot_config["cluster_metric"])
+        self.option_cluster_metric.pack(pady=5)
+        self.option_cluster_method = ctk.CTkOptionMenu(body, values=self.available_cluster_methods)
+        self.option_cluster_method.set(self.plot_config["cluster_method"])
+        self.option_cluster_method.pack(pady=5)
+
+        self.switch_points = ctk.CTkSwitch(body, text="Pokaż punkty pomiarowe")
         if self.plot_config["show_points"]: self.switch_points.select()
         else: self.switch_points.deselect()
         self.switch_points.pack(pady=10)
 
-        self.switch_line = ctk.CTkSwitch(self.settings_win, text="Pokaż linię krążka (6mm)")
+        self.switch_line = ctk.CTkSwitch(body, text="Pokaż linię krążka (6mm)")
         if self.plot_config["show_disk_line"]: self.switch_line.select()
         else: self.switch_line.deselect()
         self.switch_line.pack(pady=10)
 
-        self.switch_trans = ctk.CTkSwitch(self.settings_win, text="Zapisz z przezroczystym tłem")
+        self.switch_trans = ctk.CTkSwitch(body, text="Zapisz z przezroczystym tłem")
         if self.plot_config["transparent_background"]: self.switch_trans.select()
         else: self.switch_trans.deselect()
         self.switch_trans.pack(pady=10)
 
-        ctk.CTkLabel(self.settings_win, text="Wielkość etykiet osi:").pack(pady=(5,5))
-        self.slider_font_labels = ctk.CTkSlider(self.settings_win, from_=6, to=20, number_of_steps=14)
+        ctk.CTkLabel(body, text="Wielkość etykiet osi:").pack(pady=(5,5))
+        self.slider_font_labels = ctk.CTkSlider(body, from_=6, to=20, number_of_steps=14)
         self.slider_font_labels.set(self.plot_config["font_labels"])
         self.slider_font_labels.pack(pady=5)
 
-        ctk.CTkLabel(self.settings_win, text="Wielkość tytułów:").pack(pady=(5,5))
-        self.slider_font_title = ctk.CTkSlider(self.settings_win, from_=8, to=24, number_of_steps=16)
+        ctk.CTkLabel(body, text="Wielkość tytułów:").pack(pady=(5,5))
+        self.slider_font_title = ctk.CTkSlider(body, from_=8, to=24, number_of_steps=16)
         self.slider_font_title.set(self.plot_config["font_title"])
         self.slider_font_title.pack(pady=5)
 
-        ctk.CTkLabel(self.settings_win, text="Maks zakres osi (0=auto):").pack(pady=(5,5))
-        self.entry_axis_max = ctk.CTkEntry(self.settings_win)
+        ctk.CTkLabel(body, text="Maks zakres osi (0=auto):").pack(pady=(5,5))
+        self.entry_axis_max = ctk.CTkEntry(body)
         self.entry_axis_max.insert(0, str(self.plot_config["axis_max"]))
         self.entry_axis_max.pack(pady=5)
 
-        ctk.CTkLabel(self.settings_win, text="Odległość gwiazdki:").pack(pady=(5,5))
-        self.slider_star_offset = ctk.CTkSlider(self.settings_win, from_=0.01, to=0.2)
+        ctk.CTkLabel(body, text="Odległość gwiazdki:").pack(pady=(5,5))
+        self.slider_star_offset = ctk.CTkSlider(body, from_=0.01, to=0.2)
         self.slider_star_offset.set(self.plot_config["star_offset"])
         self.slider_star_offset.pack(pady=5)
 
-        ctk.CTkButton(self.settings_win, text="Odśwież Wykres", fg_color="green", command=self.apply_settings).pack(pady=30)
-
     def apply_settings(self):
         self.plot_config["plot_type"] = self.option_plot_type.get()
         self.plot_config["error_bar"] = self.option_error.get() 
+        self.plot_config["ci_method"] = self.option_ci.get()
         self.plot_config["palette"] = self.option_palette.get()
+        self.plot_config["pca_view"] = self.option_pca_view.get()
+        self.plot_config["cluster_metric"] = self.option_cluster_metric.get()
+        self.plot_config["cluster_method"] = self.option_cluster_method.get()
+        self.plot_config["mic_model"] = self.option_mic_model.get()
+        self.plot_config["study_correction"] = self.option_study_correction.get()
+        self.plot_config["pvalue_order"] = self.option_pvalue_order.get()
+        try:
+            self.plot_config["mic_target"] = float(self.entry_mic_target.get().replace(',', '.'))
+        except ValueError:
+            self.plot_config["mic_target"] = 6.0
+            messagebox.showwarning("Ustawienia", "Nieprawidłowa średnica docelowa MIC (musi być liczbą). Przyjęto 6 mm.")
         self.plot_config["show_disk_line"] = bool(self.switch_line.get())
         self.plot_config["show_points"] = bool(self.switch_points.get()) 
         self.plot_config["transparent_background"] = bool(self.switch_trans.get()) 
@@ -384,7 +681,8 @@ Error bars represent standard deviation. This overview highlights the differenti
         if self.df is not None: self.run_analysis()
 
     # ==================== GŁÓWNA ANALIZA (REFACTORED) ====================
-    def run_analysis(self):
+    def run_analysis(self, auto=False):
+        """auto=True: odświeżenie z obserwacji folderu - bez okna outlierów, z ponownym użyciem poprzednich decyzji."""
         if self.df is None: return
         bact = self.combo_bact.get()
         method = self.combo_method.get()
@@ -405,11 +703,20 @@ Error bars represent standard deviation. This overview highlights the differenti
         if df_run.empty: return
 
         # 2. Outliery (UI Logic)
-        outliers_data = utils.find_outliers_dixon(df_run)
+        if auto:
+            for item in self.removed_outliers:
+                mask = (df_run['Grupa'] == item['Group']) & (df_run['Srednica_mm'] == item['Srednica_mm'])
+                idx = df_run[mask].first_valid_index()
+                if idx is not None: df_run = df_run.drop(idx)
+            outliers_data = None
+        else:
+            self.removed_outliers = []
+            outliers_data = utils.find_outliers_dixon(df_run)
         if outliers_data:
             dialog = OutlierDialog(self, outliers_data)
             self.wait_window(dialog) 
             if dialog.result:
+                self.removed_outliers = dialog.result
                 for item in dialog.result:
                     mask = (df_run['Grupa'] == item['Group']) & (df_run['Srednica_mm'] == item['Srednica_mm'])
                     idx = df_run[mask].first_valid_index()
@@ -447,82 +754,337 @@ Error bars represent standard deviation. This overview highlights the differenti
         # 4. POST HOC DETALE (Delegacja)
         detailed, sig_set = self.stats_engine.process_detailed_results(posthoc_df, df_run, ref_group, summary_res['test_used'])
         self.posthoc_detailed_results = detailed
+
+        # Korekta w skali całego badania: wszystkie szczepy i porównania w jednej rodzinie testów
+        self.export_study_pairwise = None
+        study_method = self.plot_config["study_correction"]
+        if study_method != "Brak":
+            others = self.df[(self.df[self.col_bact_name] != bact) & (self.df['Grupa'].isin(wybrane))]
+            study = self.stats_engine.study_pairwise(pd.concat([others, df_run]), self.col_bact_name, None, study_method)
+            self.stats_engine.attach_study_pvalues(detailed, study, bact)
+            self.export_study_pairwise = study
+            n_sig = int(study['Significant (study)'].sum())
+            n_sig_bact = int(study.loc[study['Bakteria'] == bact, 'Significant (study)'].sum())
+            self.log(f"Korekta w całym badaniu ({study_method}): {n_sig} z {len(study)} porównań istotnych, w tym {n_sig_bact} dla {bact}.")
         
+        # Pełne wyniki par w tabeli (sortowanie / filtry / TSV); w logu tylko podsumowanie
+        self.results_table.set_results(detailed, ref_group)
         if detailed:
-            self.log("\n[3] WYNIKI SZCZEGÓŁOWE (Effect Size):")
-            for d in detailed:
-                if d['Significant']:
-                    metrics_d = d["Cohen's d"]
-                    self.log(f"{d['Group 1']} vs {d['Group 2']} | p={d['P-adj']:.4f} | d={metrics_d:.2f}")
-
-        # 5. RYSOWANIE (Delegacja)
-        self.display_plot(lambda: self.plotter.draw_bar_plot(df_run, bact, ref_group, sig_set), self.tab_plot, 'bar')
-        self.display_plot(lambda: self.plotter.draw_heatmap(df_run, bact), self.tab_heatmap, 'heat')
-        self.display_plot(lambda: self.plotter.draw_pvalue_heatmap(self.export_stats_posthoc, bact), self.tab_pvalue, 'pvalue')
+            n_sig = sum(bool(d['Significant']) for d in detailed)
+            self.log(f"\n[3] WYNIKI SZCZEGÓŁOWE (Effect Size): {n_sig} z {len(detailed)} porównań istotnych - pełna lista w zakładce 'Tabela Wyników'.")
+
+        # Kategorie kliniczne S/I/R (średnie grup wobec breakpointów)
+        bar_categories = None
+        if self.breakpoints is not None:
+            means_cat = breakpoints.classify_means(df_run, self.breakpoints, self.col_bact_name)
+            bar_categories = dict(zip(means_cat['Grupa'], means_cat['Kategoria']))
+            counts = means_cat['Kategoria'].replace("", "brak breakpointu").value_counts()
+            self.log("\n[S/I/R] Kategorie średnich grup: " + ", ".join(f"{k}: {v}" for k, v in counts.items()))
+
+        # 5. RYSOWANIE (Delegacja); wejścia wykresów zapamiętane do sesji (odtworzenie figur bez przeliczania)
+        self.figure_data = {'sig_set': sorted(sig_set), 'bar_categories': bar_categories}
+        self.display_plot(lambda p: p.draw_bar_plot(df_run, bact, ref_group, sig_set, bar_categories), self.tab_plot, 'bar')
+        self.display_plot(lambda p: p.draw_heatmap(df_run, bact), self.tab_heatmap, 'heat')
+        self.display_plot(lambda p: p.draw_pvalue_heatmap(self.export_stats_posthoc, bact), self.tab_pvalue, 'pvalue')
         
-        # MIC ESTIMATION
-        mic_results = self.stats_engine.estimate_mic(df_run, wybrane)
-        
-        unique_subs = set()
-        for g in wybrane:
-            s, _, _ = utils.parse_concentration(g)
-            if s: unique_subs.add(s)
-            
-        mic_results = self.stats_engine.estimate_mic(df_run, list(unique_subs))
+        # MIC ESTIMATION (bieżący szczep)
+        mic_target = self.plot_config["mic_target"]
+        mic_model = self.plot_config["mic_model"]
+        mic_results, curve_fits = self.strain_mic(df_run, wybrane)
+        self.figure_data.update(mic_results=mic_results, curve_fits=curve_fits)
         
         if mic_results:
-            self.log("\n[4] Oszacowane MIC (Theoretical):")
+            self.log(f"\n[4] Oszacowane MIC (Theoretical, {mic_model}, D={mic_target:g} mm):")
             for sub, res in mic_results.items():
-                if res['MIC']:
+                if res['MIC'] and "CI Low" in res:
+                    self.log(f"{sub}: {res['MIC']:.3f} {res['Unit']} (95% CI {res['CI Low']:.3f}-{res['CI High']:.3f}, R2={res['R2']:.2f})")
+                elif res['MIC']:
                     self.log(f"{sub}: {res['MIC']:.3f} {res['Unit']} (R2={res['R2']:.2f})")
+                elif curve_fits:
+                    self.log(f"{sub}: Nie można wyznaczyć (średnica docelowa poza zakresem krzywej)")
                 else:
                     self.log(f"{sub}: Nie można wyznaczyć (<0 slope)")
 
         # Pass mic_results to draw_trend
-        fig_trend, err = self.plotter.draw_trend(df_run, bact, mic_data=mic_results)
+        fig_trend, err = self.plotter.draw_trend(df_run, bact, mic_data=mic_results, curve_fits=curve_fits)
         if fig_trend: 
              self.display_figure(fig_trend, self.tab_trend, 'trend')
         elif err:
              self._show_plot_error(self.tab_trend, err)
 
-        self.display_plot(lambda: self.plotter.draw_cross_species(self.df, self.col_bact_name, wybrane), self.tab_cross, 'cross')
-        self.display_plot(lambda: self.plotter.draw_effect_plot(self.posthoc_detailed_results), self.tab_effect, 'effect')
+        # MIC dla wszystkich szczepów i substancji naraz (jedno przejście)
+        self.export_mic_table = self.stats_engine.estimate_mic_table(self.df[self.df['Grupa'].isin(wybrane)], self.col_bact_name, mic_target, mic_model)
+        if not self.export_mic_table.empty:
+             self.display_plot(lambda p: p.draw_mic_heatmap(self.export_mic_table), self.tab_mic, 'mic')
+        else:
+             self._show_plot_error(self.tab_mic, "Brak substancji z wystarczającą liczbą stężeń w nazwach grup (log-liniowy: 3, 4PL: 4).")
+
+        df_cmp, cmp_key = self.get_comparison_source(wybrane)
+        cross_categories = self.cross_categories(df_cmp, wybrane)
+        # Wycinek archiwum zapamiętany, bo archiwum może się zmienić przed odtworzeniem sesji
+        self.figure_data.update(cross_categories=cross_categories, comparison_df=df_cmp if cmp_key is not None else None)
+        self.display_plot(lambda p: p.draw_cross_species(df_cmp, self.col_bact_name, wybrane, cross_categories), self.tab_cross, 'cross')
+        self.display_plot(lambda p: p.draw_effect_plot(self.posthoc_detailed_results), self.tab_effect, 'effect')
 
-        pca_res, pca_err = self.stats_engine.run_pca(self.df, self.col_bact_name, wybrane)
+        pca_res, pca_err = self.stats_engine.run_pca(df_cmp, self.col_bact_name, wybrane, data_key=cmp_key)
+        self.figure_data['pca_res'] = pca_res
         if pca_res:
-             self.display_plot(lambda: self.plotter.draw_pca(pca_res), self.tab_pca, 'pca')
+             self.display_plot(lambda p: p.draw_pca(pca_res), self.tab_pca, 'pca')
         elif pca_err:
              self._show_plot_error(self.tab_pca, pca_err)
 
+        # Zapis do historii (w tle, w transakcji)
+        if self.results_store is not None:
+            settings = {'ref': ref_group, 'method': self.combo_method.get(), 'groups': wybrane,
+                        'outliers_removed': self.removed_outliers, 'plot_config': self.plot_config}
+            self.results_store.save_run(self.dataset_hash, bact, settings, summary_res, detailed, mic_results, mic_model, mic_target)
+            # Tabela MIC całego badania - raz na zbiór danych / wybór grup / model (nie przy każdym przełączeniu szczepu)
+            mic_key = (self.dataset_hash, tuple(wybrane), mic_model, mic_target)
+            if mic_key != self.stored_mic_key and not self.export_mic_table.empty:
+                self.results_store.save_mic_table(self.export_mic_table, self.dataset_hash, mic_model, mic_target)
+                self.stored_mic_key = mic_key
+
+        cluster_res, cluster_err = self.stats_engine.run_clustering(
+            df_cmp, self.col_bact_name, wybrane, self.plot_config["cluster_metric"], self.plot_config["cluster_method"], data_key=cmp_key)
+        self.figure_data['cluster_res'] = cluster_res
+        if cluster_res:
+             self.display_plot(lambda p: p.draw_cluster_heatmap(cluster_res), self.tab_cluster, 'cluster')
+        elif cluster_err:
+             self._show_plot_error(self.tab_cluster, cluster_err)
+
+    def strain_mic(self, df_run, groups):
+        """MIC bieżącego szczepu (model z ustawień): (wyniki per substancja, dopasowane krzywe 4PL lub None)."""
+        unique_subs = set()
+        for g in groups:
+            s, _, _ = utils.parse_concentration(g)
+            if s: unique_subs.add(s)
+        if "4PL" in self.plot_config["mic_model"]:
+            return self.stats_engine.estimate_mic_4pl(df_run, list(unique_subs), self.plot_config["mic_target"])
+        return self.stats_engine.estimate_mic(df_run, list(unique_subs), self.plot_config["mic_target"]), None
+
+    def cross_categories(self, df_cmp, groups):
+        """Kategorie S/I/R średnich (szczep, grupa) dla porównania szczepów; None bez tabeli breakpointów."""
+        if self.breakpoints is None: return None
+        cross_cat = breakpoints.classify_means(df_cmp[df_cmp['Grupa'].isin(groups)], self.breakpoints, self.col_bact_name)
+        return dict(zip(zip(cross_cat[self.col_bact_name], cross_cat['Grupa']), cross_cat['Kategoria']))
+
+    # ==================== SESJA ====================
+    SESSION_EXPORTS = ['export_data_raw', 'export_stats_normality', 'export_stats_main', 'export_stats_posthoc',
+                       'posthoc_detailed_results', 'stats_summary', 'export_mic_table', 'export_study_pairwise', 'removed_outliers',
+                       'figure_data']
+
+    def save_session(self):
+        if self.df is None:
+            messagebox.showwarning("Uwaga", "Brak danych do zapisania.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=session.SESSION_EXTENSION,
+                                                 filetypes=[("Sesja BioStat", "*" + session.SESSION_EXTENSION)])
+        if not file_path: return
+        self.wait_for_renders()
+        state = {
+            'df': self.df, 'col_bact_name': self.col_bact_name, 'file_name': self.file_name, 'dataset_hash': self.dataset_hash,
+            'plot_config': self.plot_config, 'bact': self.combo_bact.get(), 'method': self.combo_method.get(),
+            'ref': self.combo_ref.get(), 'selected_groups': self.get_selected_groups(),
+            'log': self.textbox.get("1.0", "end-1c"),
+        }
+        state.update({name: getattr(self, name) for name in self.SESSION_EXPORTS})
+        success, msg = session.save_session(file_path, state, self.figures)
+        if success: self.log(msg)
+        else: messagebox.showerror("Błąd", msg)
+
+    def restore_session(self):
+        file_path = filedialog.askopenfilename(filetypes=[("Sesja BioStat", "*" + session.SESSION_EXTENSION)])
+        if not file_path: return
+        data, err = session.load_session(file_path)
+        if err:
+            messagebox.showerror("Błąd", err)
+            return
+        st = data['state']
+        if self.folder_watcher is not None:
+            self.switch_watch.deselect()
+            self.toggle_watch()
+
+        # Dane i wybór (bez przeliczania)
+        self.plot_config.update(st['plot_config'])
+        self.plotter.update_config(self.plot_config)
+        self.seg_orient.set(self.plot_config.get("orientation", "Pozioma"))
+        self.df = st['df']
+        self.stats_engine.reset_cache()
+        self.col_bact_name, self.file_name, self.dataset_hash = st['col_bact_name'], st['file_name'], st['dataset_hash']
+        self.lbl_file.configure(text=f"{self.file_name} (sesja)", text_color="white")
+        self.combo_bact.configure(values=list(self.df[self.col_bact_name].unique()))
+        self.combo_bact.set(st['bact'])
+        self.on_bacteria_change(st['bact'])
+        self.group_selector.set_selected(st['selected_groups'])
+        self.combo_ref.set(st['ref'])
+        self.combo_method.set(st['method'])
+        for name in self.SESSION_EXPORTS: setattr(self, name, st[name])
+        self.results_table.set_results(self.posthoc_detailed_results or [], st['ref'])
+
+        # Wykresy: gotowe podglądy PNG od razu, obiekty Figure do eksportu odtwarzane w tle funkcjami rysującymi
+        for key in self.figures:
+            self.figures[key] = None
+            self.render_tokens[key] += 1  # porzuć trwające rendery
+        self.render_pending.clear()
+        for tab in self.figure_tabs.values():
+            for w in tab.winfo_children(): w.destroy()
+        self.update_idletasks()
+        for key, png in data['previews'].items():
+            self.display_preview(png, self.figure_tabs[key])
+        self.rebuild_figures(st['bact'], st['ref'], st['selected_groups'], list(data['previews']))
+
+        self.clear_log()
+        self.log(st['log'])
+        self.log(f"\n>> Przywrócono sesję z {data['meta']['created']} ({file_path.split('/')[-1]}).")
+
+    def rebuild_figures(self, bact, ref_group, groups, keys):
+        """
+        Odtwarza figury sesji (do eksportu PNG/PDF) tymi samymi funkcjami rysującymi co analiza - z zapisanych wyników
+        (statystyki, figure_data: PCA, klastrowanie, MIC i krzywe, kategorie S/I/R), bez ponownego liczenia.
+        Rysowanie w wątku renderów; podgląd z sesji widoczny do podmiany.
+        """
+        df_run, detailed, fd = self.export_data_raw, self.posthoc_detailed_results or [], self.figure_data
+        if df_run is None: return
+        sig_set = set(fd.get('sig_set', []))
+        bar_categories, cross_categories = fd.get('bar_categories'), fd.get('cross_categories')
+        mic_results, curve_fits = fd.get('mic_results'), fd.get('curve_fits')
+        pca_res, cluster_res = fd.get('pca_res'), fd.get('cluster_res')
+        df_cmp = fd.get('comparison_df')
+        if df_cmp is None: df_cmp = self.df
+        builds = {
+            'bar': lambda p: p.draw_bar_plot(df_run, bact, ref_group, sig_set, bar_categories),
+            'heat': lambda p: p.draw_heatmap(df_run, bact),
+            'pvalue': lambda p: p.draw_pvalue_heatmap(self.export_stats_posthoc, bact),
+            'trend': lambda p: p.draw_trend(df_run, bact, mic_data=mic_results, curve_fits=curve_fits)[0],
+            'mic': lambda p: p.draw_mic_heatmap(self.export_mic_table),
+            'cross': lambda p: p.draw_cross_species(df_cmp, self.col_bact_name, groups, cross_categories),
+            'effect': lambda p: p.draw_effect_plot(detailed),
+        }
+        if pca_res: builds['pca'] = lambda p: p.draw_pca(pca_res)
+        if cluster_res: builds['cluster'] = lambda p: p.draw_cluster_heatmap(cluster_res)
+        plotter = self.plotter.snapshot()
+        for key in keys:
+            if key in builds:
+                token = self._new_render_token(key)
+                self.render_pool.submit(self._render_full, lambda build=builds[key]: build(plotter), key, token)
+
+    def display_preview(self, png_bytes, tab_widget):
+        """Wyświetla gotowy obraz PNG wykresu dopasowany do rozmiaru zakładki (bez renderowania figury); dopasowanie odświeżane przy zmianie rozmiaru."""
+        for w in tab_widget.winfo_children(): w.destroy()
+        img = Image.open(io.BytesIO(png_bytes))
+        ctk_img = ctk.CTkImage(light_image=img, dark_image=img, size=(img.width, img.height))
+        label = ctk.CTkLabel(tab_widget, image=ctk_img, text="")
+        label.pack(fill="both", expand=True)
+
+        def fit(width, height):
+            if width <= 1 or height <= 1:
+                # Zakładka jeszcze niewyświetlona - rozmiar całego widoku zakładek
+                width, height = self.main_view.winfo_width() - 20, self.main_view.winfo_height() - 60
+            if width <= 1 or height <= 1: return
+            scale = min(width / img.width, height / img.height)
+            ctk_img.configure(size=(max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+
+        fit(tab_widget.winfo_width(), tab_widget.winfo_height())
+        tab_widget.bind("<Configure>", lambda e: fit(e.width, e.height))
+
     # ==================== WSPARCIE UI DO RYSOWANIA ====================
     def display_plot(self, draw_func, tab_widget, fig_key):
-        """Helper to clear tab, run draw function, and pack canvas."""
+        """
+        Renderowanie progresywne: draw_func(plotter) wywołane najpierw ze szkicem (Plotter.draft) i wyświetlone
+        w niskiej rozdzielczości, potem pełna figura rysowana i rasteryzowana (Agg) w tle i podmieniana w zakładce.
+        """
+        token = self._new_render_token(fig_key)
+        plotter = self.plotter.snapshot()
         try:
-            fig = draw_func()
-            self.display_figure(fig, tab_widget, fig_key)
+            preview = draw_func(plotter.draft())
         except Exception as e:
             self._show_plot_error(tab_widget, str(e))
+            return
+        if preview is None:
+            self.render_pending.pop(fig_key, None)
+            self.figures[fig_key] = None
+            for w in tab_widget.winfo_children(): w.destroy()
+            return
+        self.display_preview(Plotter.render_png(preview, dpi=PREVIEW_DPI), tab_widget)
+        self.render_pool.submit(self._render_full, lambda: draw_func(plotter), fig_key, token)
 
     def display_figure(self, fig, tab_widget, fig_key):
-        # 1. Wyczyść tab
-        for w in tab_widget.winfo_children(): w.destroy()
-        
-        if fig is None: return
+        """Gotowa figura: rasteryzacja w tle, w zakładce pojawia się po zakończeniu."""
+        token = self._new_render_token(fig_key)
+        if fig is None:
+            self.render_pending.pop(fig_key, None)
+            self.figures[fig_key] = None
+            for w in tab_widget.winfo_children(): w.destroy()
+            return
+        self.render_pool.submit(self._render_full, lambda: fig, fig_key, token)
+
+    def _new_render_token(self, fig_key):
+        # Poprzednia figura zostaje w self.figures do podmiany; eksporty czekają na zaległe rendery (wait_for_renders)
+        self.render_tokens[fig_key] += 1
+        self.render_pending[fig_key] = self.render_tokens[fig_key]
+        return self.render_tokens[fig_key]
+
+    def _render_full(self, build, fig_key, token):
+        """Wątek roboczy: pomija nieaktualne żądania (szybkie zmiany ustawień); wynik trafia do kolejki wątku Tk."""
+        if token != self.render_tokens[fig_key]:
+            self.render_results.put((fig_key, token, None, None, None))
+            return
+        try:
+            fig = build()
+            png = Plotter.render_png(fig) if fig is not None else None
+        except Exception as e:
+            self.render_results.put((fig_key, token, None, None, str(e)))
+            return
+        self.render_results.put((fig_key, token, fig, png, None))
 
-        # 2. Zapisz ref
+    def poll_renders(self):
+        """Wątek Tk: odbiera gotowe rendery z kolejki (bez wywołań Tk z wątku roboczego)."""
+        try:
+            while True:
+                self._swap_render(*self.render_results.get_nowait())
+        except queue.Empty:
+            pass
+        self.after(RENDER_POLL_MS, self.poll_renders)
+
+    def _swap_render(self, fig_key, token, fig, png, error):
+        if token != self.render_tokens[fig_key]: return
+        self.render_pending.pop(fig_key, None)
+        tab_widget = self.figure_tabs[fig_key]
+        if error is not None:
+            self._show_plot_error(tab_widget, error)
+            return
         self.figures[fig_key] = fig
-        
-        # 3. Osadź
-        canvas = FigureCanvasTkAgg(fig, master=tab_widget)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+        if png is None:
+            for w in tab_widget.winfo_children(): w.destroy()
+        else:
+            self.display_preview(png, tab_widget)
+
+    def wait_for_renders(self):
+        """Eksporty: dokończenie zaległych renderów, żeby zapisane zostały figury zgodne z bieżącymi wynikami."""
+        if not self.render_pending: return
+        self.configure(cursor="watch")
+        self.update_idletasks()
+        try:
+            while self.render_pending:
+                self._swap_render(*self.render_results.get(timeout=RENDER_WAIT_S))
+        except queue.Empty:
+            self.log(f"Uwaga: nie dokończono renderowania: {', '.join(self.render_pending)}.")
+        finally:
+            self.configure(cursor="")
 
     def _show_plot_error(self, tab, msg):
+        # Błąd unieważnia figurę zakładki (eksport nie zapisze wykresu z poprzedniej analizy)
+        for key, fig_tab in self.figure_tabs.items():
+            if fig_tab is tab:
+                self.render_tokens[key] += 1
+                self.render_pending.pop(key, None)
+                self.figures[key] = None
         for w in tab.winfo_children(): w.destroy()
         ctk.CTkLabel(tab, text=f"Błąd wykresu: {msg}").pack(pady=20)
 
     # ==================== EXPORTY ====================
     def save_plot_image(self):
+        self.wait_for_renders()
         current_tab = self.main_view.get()
         fig_to_save = None
         
@@ -530,9 +1092,11 @@ Error bars represent standard deviation. This overview highlights the differenti
         elif current_tab == "Mapa Ciepła": fig_to_save = self.figures['heat']
         elif current_tab == "Mapa P-value": fig_to_save = self.figures['pvalue']
         elif current_tab == "Trend (Dawka)": fig_to_save = self.figures['trend']
+        elif current_tab == "Mapa MIC": fig_to_save = self.figures['mic']
         elif current_tab == "Porównanie Szczepów": fig_to_save = self.figures['cross'] 
         elif current_tab == "Wielkość Efektu": fig_to_save = self.figures['effect']
         elif current_tab == "Analiza PCA": fig_to_save = self.figures['pca']
+        elif current_tab == "Klastrowanie": fig_to_save = self.figures['cluster']
         
         if fig_to_save is None:
             messagebox.showwarning("Uwaga", "Brak wykresu do zapisania.")
@@ -543,7 +1107,9 @@ Error bars represent standard deviation. This overview highlights the differenti
         if not file_path: return
         try:
             is_transparent = self.plot_config["transparent_background"]
-            fig_to_save.savefig(file_path, dpi=300, bbox_inches='tight', transparent=is_transparent)
+            fmt = "pdf" if file_path.lower().endswith(".pdf") else "png"
+            data = rendercache.render(fig_to_save, fmt, 300, tight=True, transparent=is_transparent)
+            with open(file_path, "wb") as f: f.write(data)
             messagebox.showinfo("Sukces", "Wykres zapisany!")
         except Exception as e: messagebox.showerror("Błąd Zapisu", str(e))
 
@@ -555,10 +1121,18 @@ Error bars represent standard deviation. This overview highlights the differenti
         if not file_path: return
         try:
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                self.export_data_raw.to_excel(writer, sheet_name="Dane Surowe", index=False)
+                raw = self.export_data_raw
+                if self.breakpoints is not None:
+                    raw = raw.assign(**{"Kategoria (S/I/R)": breakpoints.classify_measurements(raw, self.breakpoints, self.col_bact_name)})
+                raw.to_excel(writer, sheet_name="Dane Surowe", index=False)
+                if self.breakpoints is not None:
+                    means_cat = breakpoints.classify_means(raw, self.breakpoints, self.col_bact_name)
+                    means_cat.rename(columns={'mean': 'Średnia (mm)', 'Kategoria': 'Kategoria (S/I/R)'}).to_excel(writer, sheet_name="Kategorie S-I-R", index=False)
                 if self.export_stats_normality: pd.DataFrame(self.export_stats_normality).to_excel(writer, sheet_name="Normalnosc", index=False)
                 if self.export_stats_main: pd.DataFrame(self.export_stats_main).to_excel(writer, sheet_name="Test Glowny", index=False)
                 if self.posthoc_detailed_results: pd.DataFrame(self.posthoc_detailed_results).to_excel(writer, sheet_name="Post-hoc (Details)", index=False)
+                if self.export_mic_table is not None and not self.export_mic_table.empty: self.export_mic_table.to_excel(writer, sheet_name="MIC (Wszystkie szczepy)", index=False)
+                if self.export_study_pairwise is not None: self.export_study_pairwise.to_excel(writer, sheet_name="Post-hoc (Badanie)", index=False)
             messagebox.showinfo("Sukces", f"Zapisano wyniki w:\n{file_path}")
         except Exception as e: messagebox.showerror("Błąd Zapisu", str(e))
 
@@ -569,6 +1143,7 @@ Error bars represent standard deviation. This overview highlights the differenti
         
         file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Document", "*.pdf")])
         if not file_path: return
+        self.wait_for_renders()
 
         meta = {
             'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
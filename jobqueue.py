@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import utils
+import reports
+import session
+from logic import StatsEngine
+from store import ResultsStore
+from plotting import Plotter, DEFAULT_CONFIG
+
+# Zmiana sposobu liczenia artefaktów -> nowa wersja -> wszystkie zadania liczone od nowa
+TASK_VERSION = 3
+STRAIN_TASKS = ["stats", "ci", "fig:bar", "fig:heat", "fig:pvalue", "fig:effect", "fig:trend", "report"]
+# "pairwise" (korekta w całym badaniu) tylko na życzenie - jak w GUI (DEFAULT_CONFIG["study_correction"] = "Brak")
+STUDY_TASKS = ["mic", "fig:cross", "fig:pca", "fig:cluster"]
+# Zadania szczepu korzystające z wyniku (checkpointu) zadania "stats" tego szczepu zamiast ponownego liczenia testów
+STATS_DEPENDENT = ("fig:bar", "fig:pvalue", "fig:effect", "report")
+
+# Parametry, od których zależy wynik danego rodzaju zadania (tylko one wchodzą do skrótu wejścia):
+# np. zmiana korekty w całym badaniu przelicza tylko zadanie "pairwise", a nie wykresy i statystyki szczepów
+_STATS = ("col_bact", "method", "ref")
+TASK_PARAMS = {
+    "stats": _STATS, "ci": ("col_bact",),
+    "fig:bar": _STATS + ("plot_config",), "fig:heat": ("col_bact", "plot_config"),
+    "fig:pvalue": _STATS + ("plot_config",), "fig:effect": _STATS + ("plot_config",),
+    "fig:trend": ("col_bact", "plot_config"), "report": _STATS + ("plot_config",),
+    "mic": ("col_bact", "groups", "plot_config"), "pairwise": ("col_bact", "groups", "study_correction"),
+    "fig:cross": ("col_bact", "groups", "plot_config"), "fig:pca": ("col_bact", "groups", "plot_config"),
+    "fig:cluster": ("col_bact", "groups", "plot_config"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    strain TEXT,
+    params TEXT,
+    input_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outputs TEXT,
+    result TEXT,
+    error TEXT,
+    duration REAL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+"""
+
+def _safe_name(name):
+    return re.sub(r'[^\w.-]+', '_', str(name)).strip('_') or "szczep"
+
+# ======================================================
+# WYKONANIE ZADANIA (proces roboczy)
+# ======================================================
+_engine = None
+
+def _get_engine():
+    global _engine
+    if _engine is None:
+        _engine = StatsEngine()
+    return _engine
+
+def _strain_analysis(engine, df_run, params):
+    groups = sorted(df_run['Grupa'].unique(), key=utils.smart_sort_key)
+    ref = params.get("ref") if params.get("ref") in groups else utils.default_reference_group(groups)
+    summary, posthoc_df, error = engine.run_statistics(df_run, params.get("method"), ref)
+    if error:
+        raise ValueError(error)
+    detailed, sig_set = engine.process_detailed_results(posthoc_df, df_run, ref, summary['test_used'])
+    return ref, summary, posthoc_df, detailed, sig_set
+
+def _from_stats_checkpoint(stats):
+    """Wynik zadania "stats" (checkpoint JSON) -> (ref, tabela post-hoc, detale, zbiór grup istotnych)."""
+    if stats is None:
+        raise ValueError("Brak wyników statystyk szczepu (zadanie \"stats\" nieudane).")
+    posthoc_df = session._table_from_json(stats["posthoc"]) if stats.get("posthoc") else None
+    return stats["ref"], posthoc_df, stats["detailed"], set(stats["sig_set"])
+
+def _strain_figure(plotter, kind, df_run, bact, ref, posthoc_df, detailed, sig_set):
+    if kind == "bar": return plotter.draw_bar_plot(df_run, bact, ref, sig_set)
+    if kind == "heat": return plotter.draw_heatmap(df_run, bact)
+    if kind == "pvalue": return plotter.draw_pvalue_heatmap(posthoc_df, bact)
+    if kind == "effect": return plotter.draw_effect_plot(detailed)
+    return plotter.draw_trend(df_run, bact)[0]
+
+def run_task(kind, strain, params, df, out_dir, stats=None):
+    """
+    Wylicza jeden artefakt i zapisuje go w out_dir. Zwraca (lista plików wynikowych, mały wynik do checkpointu).
+    df: pomiary szczepu (zadania szczepu) lub całego badania (zadania zbiorcze).
+    stats: checkpoint zadania "stats" szczepu - dla zadań STATS_DEPENDENT (wykresy i raport bez ponownych testów).
+    """
+    engine = _get_engine()
+    plotter = Plotter(dict(DEFAULT_CONFIG, **params.get("plot_config", {})))
+    col_bact = params.get("col_bact", "Bakterie")
+    target_dir = os.path.join(out_dir, _safe_name(strain)) if strain is not None else os.path.join(out_dir, "_badanie")
+    os.makedirs(target_dir, exist_ok=True)
+
+    if strain is None:
+        groups = params.get("groups") or list(df['Grupa'].unique())
+        if kind == "mic":
+            table = engine.estimate_mic_table(df[df['Grupa'].isin(groups)], col_bact, plotter.config["mic_target"], plotter.config["mic_model"])
+            path = os.path.join(target_dir, "mic.xlsx")
+            table.to_excel(path, sheet_name="MIC (Wszystkie szczepy)", index=False)
+            outputs = [path]
+            if not table.empty:
+                fig_path = os.path.join(target_dir, "mic.png")
+                plotter.draw_mic_heatmap(table).savefig(fig_path, dpi=300, bbox_inches='tight')
+                outputs.append(fig_path)
+            return outputs, {"rows": len(table), "table": table}
+        if kind == "pairwise":
+            table = engine.study_pairwise(df, col_bact, groups, params["study_correction"])
+            path = os.path.join(target_dir, "post-hoc_badanie.xlsx")
+            table.to_excel(path, sheet_name="Post-hoc (Badanie)", index=False)
+            return [path], {"comparisons": len(table), "significant": int(table["Significant (study)"].sum())}
+        if kind == "fig:cross":
+            fig = plotter.draw_cross_species(df, col_bact, groups)
+        elif kind == "fig:pca":
+            res, err = engine.run_pca(df, col_bact, groups)
+            if err: raise ValueError(err)
+            fig = plotter.draw_pca(res)
+        else:
+            res, err = engine.run_clustering(df, col_bact, groups, plotter.config["cluster_metric"], plotter.config["cluster_method"])
+            if err: raise ValueError(err)
+            fig = plotter.draw_cluster_heatmap(res)
+        path = os.path.join(target_dir, f"{kind.split(':')[1]}.png")
+        fig.savefig(path, dpi=300, bbox_inches='tight')
+        return [path], None
+
+    if kind == "ci":
+        summary = utils.add_error_bounds(utils.summarize_groups(df), "95% CI", "Bootstrap", df)
+        path = os.path.join(target_dir, "ci_bootstrap.csv")
+        summary[['n', 'mean', 'sd', 'err_lo', 'err_hi']].rename(columns={'err_lo': 'CI Low', 'err_hi': 'CI High'}).to_csv(path)
+        return [path], None
+
+    if kind == "stats":
+        ref, summary, posthoc_df, detailed, sig_set = _strain_analysis(engine, df, params)
+        path = os.path.join(target_dir, "wyniki.xlsx")
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name="Dane Surowe", index=False)
+            if summary['normality']: pd.DataFrame(summary['normality']).to_excel(writer, sheet_name="Normalnosc", index=False)
+            if summary['main_stats']: pd.DataFrame(summary['main_stats']).to_excel(writer, sheet_name="Test Glowny", index=False)
+            if detailed: pd.DataFrame(detailed).to_excel(writer, sheet_name="Post-hoc (Details)", index=False)
+        # Checkpoint zawiera wszystko, czego potrzebują wykresy i raport szczepu (STATS_DEPENDENT)
+        return [path], {"test_used": summary['test_used'], "main_stats": summary['main_stats'], "n_significant": sum(d['Significant'] for d in detailed),
+                        "ref": ref, "sig_set": sorted(sig_set), "detailed": detailed,
+                        "posthoc": session._table_to_json(posthoc_df) if posthoc_df is not None else None, "summary": summary}
+
+    # fig:heat / fig:trend nie zależą od testów
+    ref, posthoc_df, detailed, sig_set = _from_stats_checkpoint(stats) if kind in STATS_DEPENDENT else (None, None, [], set())
+    if kind == "report":
+        figures = {k: _strain_figure(plotter, k, df, strain, ref, posthoc_df, detailed, sig_set) for k in ("bar", "heat", "trend", "effect")}
+        path = os.path.join(target_dir, "raport.pdf")
+        meta = {'date': time.strftime('%Y-%m-%d %H:%M'), 'bact': strain, 'method': params.get("method"), 'ref': ref}
+        ok, msg = reports.generate_pdf(path, meta, None, figures, detailed)
+        if not ok: raise RuntimeError(msg)
+        return [path], None
+
+    fig = _strain_figure(plotter, kind.split(":")[1], df, strain, ref, posthoc_df, detailed, sig_set)
+    if fig is None:
+        return [], None  # np. brak post-hoc (test główny nieistotny) -> brak mapy p-value
+    path = os.path.join(target_dir, f"{kind.split(':')[1]}.png")
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    return [path], None
+
+# ======================================================
+# KOLEJKA
+# ======================================================
+class StudyQueue:
+    """
+    Trwała kolejka zadań badania (SQLite). Badanie = zadania per szczep x artefakt + zadania zbiorcze.
+    Zadanie z niezmienionym skrótem wejścia i istniejącymi plikami wynikowymi jest pomijane,
+    więc przerwane przeliczenie wznawia się od miejsca przerwania.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def input_hash(kind, params, df):
+        """Skrót wejścia zadania: wersja, rodzaj, parametry używane przez ten rodzaj (TASK_PARAMS) i pomiary (bez kolumn źródła Plik/Arkusz)."""
+        used = {k: params[k] for k in TASK_PARAMS.get(kind, sorted(params)) if k in params}
+        h = hashlib.sha1(json.dumps([TASK_VERSION, kind, used], sort_keys=True, default=str).encode("utf-8"))
+        h.update(utils.dataset_fingerprint(df[[params.get("col_bact", "Bakterie"), 'Grupa', 'Srednica_mm']]).encode())
+        return h.hexdigest()
+
+    def plan(self, df, params, strain_tasks=STRAIN_TASKS, study_tasks=None):
+        """
+        Rejestruje zadania badania. Zwraca słownik {id zadania: (kind, szczep, df)} do uruchomienia.
+        Zadania ukończone z tym samym skrótem wejścia (i istniejącymi plikami) nie są planowane ponownie.
+        study_tasks: domyślnie STUDY_TASKS + "pairwise", gdy params["study_correction"] podaje metodę korekty.
+        """
+        if study_tasks is None:
+            study_tasks = STUDY_TASKS + (["pairwise"] if params.get("study_correction") not in (None, "Brak") else [])
+        col_bact = params.get("col_bact", "Bakterie")
+        groups = params.get("groups")
+        data = df[df['Grupa'].isin(groups)] if groups else df
+        work = [(f"{bact}|{kind}", kind, bact, sub) for bact, sub in data.groupby(col_bact, sort=False) for kind in strain_tasks]
+        work += [(f"*|{kind}", kind, None, data) for kind in study_tasks]
+
+        todo = {}
+        with self._connect() as conn:
+            existing = {row[0]: row[1:] for row in conn.execute("SELECT id, input_hash, status, outputs FROM tasks")}
+            for task_id, kind, bact, sub in work:
+                h = self.input_hash(kind, params, sub)
+                old = existing.get(task_id)
+                if old and old[0] == h and old[1] == "done" and all(os.path.exists(p) for p in json.loads(old[2] or "[]")):
+                    continue
+                conn.execute("INSERT OR REPLACE INTO tasks (id, kind, strain, params, input_hash, status) VALUES (?,?,?,?,?, 'pending')",
+                             (task_id, kind, None if bact is None else str(bact), json.dumps(params, default=str), h))
+                todo[task_id] = (kind, bact, sub)
+            # Wykresy / raport do przeliczenia, a statystyki szczepu bez checkpointu -> "stats" też trafia do kolejki
+            for task_id, (kind, bact, sub) in list(todo.items()):
+                stats_id = f"{bact}|stats"
+                if kind in STATS_DEPENDENT and stats_id not in todo and self.stats_result(bact, conn) is None:
+                    conn.execute("INSERT OR REPLACE INTO tasks (id, kind, strain, params, input_hash, status) VALUES (?,?,?,?,?, 'pending')",
+                                 (stats_id, "stats", str(bact), json.dumps(params, default=str), self.input_hash("stats", params, sub)))
+                    todo[stats_id] = ("stats", bact, sub)
+        return todo
+
+    def stats_result(self, strain, conn=None):
+        """Checkpoint ukończonego zadania "stats" szczepu (słownik z JSON) albo None."""
+        query = "SELECT result FROM tasks WHERE id = ? AND status = 'done'"
+        if conn is None:
+            with self._connect() as conn:
+                row = conn.execute(query, (f"{strain}|stats",)).fetchone()
+        else:
+            row = conn.execute(query, (f"{strain}|stats",)).fetchone()
+        try:
+            return json.loads(row[0]) if row and row[0] else None
+        except (TypeError, ValueError):
+            return None  # zapis w starszym formacie
+
+    def _finish(self, task_id, status, outputs=None, result=None, error=None, duration=None):
+        with self._connect() as conn:
+            conn.execute("UPDATE tasks SET status=?, outputs=?, result=?, error=?, duration=?, finished_at=? WHERE id=?",
+                         (status, json.dumps(outputs or []),
+                          json.dumps(result, ensure_ascii=False, default=session._json_default) if result is not None else None,
+                          error, duration, time.strftime('%Y-%m-%dT%H:%M:%S'), task_id))
+
+    @staticmethod
+    def _store_result(store, kind, strain, params, result, dataset_hash):
+        """
+        Przekazuje wynik zadania do historii (store.ResultsStore - zapis w transakcji, w wątku zapisu):
+        "stats" -> przebieg szczepu z tabelą post-hoc, "mic" -> tabela MIC całego badania.
+        Zwraca wynik bez podsumowania i tabeli MIC (do checkpointu; detale post-hoc zostają dla STATS_DEPENDENT).
+        """
+        result = dict(result)
+        summary, table = result.pop("summary", None), result.pop("table", None)
+        detailed = result.get("detailed")
+        if store is not None:
+            if kind == "stats" and summary is not None:
+                settings = {'ref': result.get("ref"), 'method': params.get("method"), 'groups': params.get("groups"), 'source': "batch"}
+                store.save_run(dataset_hash, strain, settings, summary, detailed)
+            elif kind == "mic" and table is not None and not table.empty:
+                config = dict(DEFAULT_CONFIG, **params.get("plot_config", {}))
+                store.save_mic_table(table, dataset_hash, config["mic_model"], config["mic_target"])
+        return result
+
+    def run(self, todo, params, out_dir, workers=None, progress=None, store=None, dataset_hash=None):
+        """
+        Uruchamia zaplanowane zadania w puli procesów; każdy wynik jest od razu zapisywany (checkpoint).
+        store: opcjonalny ResultsStore - wyniki statystyk szczepów i tabela MIC trafiają też do historii analiz.
+        progress(done, total, throughput [zad./s], eta [s], task_id, status) - wywoływane po każdym zadaniu.
+        Zwraca (liczba ukończonych, liczba błędów).
+        """
+        total, done, failed = len(todo), 0, 0
+        if not todo:
+            return 0, 0
+        start = time.perf_counter()
+
+        def notify(task_id, status):
+            if progress:
+                elapsed = time.perf_counter() - start
+                rate = (done + failed) / elapsed if elapsed > 0 else 0.0
+                eta = (total - done - failed) / rate if rate > 0 else float('inf')
+                progress(done + failed, total, rate, eta, task_id, status)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running, waiting = {}, {}  # waiting: szczep -> zadania czekające na jego "stats"
+
+            def submit(task_id, stats=None):
+                kind, bact, sub = todo[task_id]
+                running[pool.submit(run_task, kind, bact, params, sub, out_dir, stats)] = (task_id, time.perf_counter())
+
+            for task_id, (kind, bact, _) in todo.items():
+                if kind not in STATS_DEPENDENT:
+                    submit(task_id)
+                elif f"{bact}|stats" in todo:
+                    waiting.setdefault(f"{bact}|stats", []).append(task_id)
+                else:
+                    submit(task_id, self.stats_result(bact))
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    task_id, t0 = running.pop(fut)
+                    kind, bact, _ = todo[task_id]
+                    result = None
+                    try:
+                        outputs, result = fut.result()
+                        if result is not None:
+                            result = self._store_result(store, kind, bact, params, result, dataset_hash)
+                        self._finish(task_id, "done", outputs, result, duration=time.perf_counter() - t0)
+                        status = "done"
+                        done += 1
+                    except Exception as e:
+                        self._finish(task_id, "failed", error=str(e), duration=time.perf_counter() - t0)
+                        status = "failed"
+                        failed += 1
+                    notify(task_id, status)
+                    # Statystyki szczepu gotowe -> wykresy i raport dostają ich checkpoint; nieudane -> zadania zależne też
+                    for dep_id in waiting.pop(task_id, []):
+                        if status == "done":
+                            submit(dep_id, result)
+                        else:
+                            self._finish(dep_id, "failed", error=f"Statystyki szczepu nieudane: {task_id}")
+                            failed += 1
+                            notify(dep_id, "failed")
+        return done, failed
+
+    def status(self):
+        """Podsumowanie kolejki: liczba zadań per status."""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def failures(self):
+        with self._connect() as conn:
+            return pd.read_sql_query("SELECT id, error FROM tasks WHERE status = 'failed' ORDER BY id", conn)
+
+def _print_progress(done, total, rate, eta, task_id, status):
+    eta_txt = f"{eta:.0f} s" if eta != float('inf') else "?"
+    print(f"[{done}/{total}] {rate:.2f} zad./s, ETA {eta_txt} | {task_id}: {status}")
+
+if __name__ == "__main__":
+    import matplotlib
+    matplotlib.use("Agg")
+    import loader
+
+    parser = argparse.ArgumentParser(description="BioStat Master - przeliczenie całego badania z kolejką zadań (wznawialne).")
+    parser.add_argument("sources", nargs="+", help="pliki Excel lub foldery")
+    parser.add_argument("--out", default="badanie", help="folder wyników (tu jest też kolejka queue.sqlite)")
+    parser.add_argument("--method", default="holm", help="korekta post-hoc: holm, fdr_bh, bonferroni, None")
+    parser.add_argument("--study-correction", default=None, help="korekta w całym badaniu (domyślnie brak): fdr_bh, fdr_by, storey, holm, bonferroni")
+    parser.add_argument("--workers", type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument("--no-history", action="store_true", help="nie zapisuj wyników do lokalnej historii analiz (SQLite)")
+    args = parser.parse_args()
+
+    df, messages = loader.load_workbooks(args.sources)
+    for msg in messages: print(f"Pominięto: {msg}")
+    if df is None:
+        raise SystemExit("Brak danych.")
+    params = {"method": None if args.method == "None" else args.method, "col_bact": "Bakterie", "study_correction": args.study_correction}
+    queue = StudyQueue(os.path.join(args.out, "queue.sqlite"))
+    todo = queue.plan(df, params)
+    print(f"Zadania do wykonania: {len(todo)} (pozostałe aktualne - pominięte)")
+    store = None
+    if not args.no_history:
+        try:
+            store = ResultsStore()
+        except Exception as e:
+            print(f"Warning: Historia wyników niedostępna: {e}")
+    ok, failed = queue.run(todo, params, args.out, args.workers, _print_progress, store, utils.dataset_fingerprint(df))
+    if store is not None:
+        store.flush()
+        store.close()
+    print(f"Gotowe: {ok}, błędy: {failed}. Stan kolejki: {queue.status()}")
+    if failed:
+        print(queue.failures().to_string(index=False))
@@ -0,0 +1,168 @@
+import os
+import re
+import zipfile
+import posixpath
+import unicodedata
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+REQUIRED_COLUMNS = ['Bakterie', 'Grupa', 'Srednica_mm']
+
+# Warianty nazw kolumn (po normalizacji: małe litery, bez polskich znaków, tylko litery i cyfry)
+COLUMN_ALIASES = {
+    'Bakterie': ["bakterie", "bakteria", "bakteriia", "szczep", "szczepy", "bacteria", "strain", "organizm"],
+    'Grupa': ["grupa", "grupy", "group", "substancja", "probka", "sample", "ekstrakt"],
+    'Srednica_mm': ["srednicamm", "srednica", "srednicastrefymm", "strefamm", "strefa", "diameter", "diametermm", "zonemm", "zone"],
+    'Plytka': ["plytka", "plytki", "plate", "plateid", "nrplytki"],
+}
+_ALIAS_LOOKUP = {alias: canon for canon, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+def _norm_name(name):
+    text = unicodedata.normalize("NFKD", str(name)).replace("ł", "l").replace("Ł", "L")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+def normalize_columns(df):
+    """Ujednolica nazwy kolumn (np. 'Szczep', 'Średnica (mm)', 'diameter') do nazw używanych w programie."""
+    mapping = {}
+    for col in df.columns:
+        key = _norm_name(col)
+        canon = _ALIAS_LOOKUP.get(key)
+        if canon is None and key.startswith("bakteri"): canon = 'Bakterie'
+        if canon is not None and canon not in mapping.values():
+            mapping[col] = canon
+    out = df.rename(columns=mapping)
+    out.columns = [str(c).strip() for c in out.columns]
+    return out
+
+def clean_sheet(df):
+    """Normalizacja jednego arkusza: nazwy kolumn, białe znaki w tekstach, średnice zapisane z przecinkiem."""
+    df = normalize_columns(df)
+    if 'Srednica_mm' in df.columns and not pd.api.types.is_numeric_dtype(df['Srednica_mm']):
+        df['Srednica_mm'] = pd.to_numeric(df['Srednica_mm'].astype(str).str.strip().str.replace(",", ".", regex=False), errors='coerce')
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].map(lambda v: v.strip() if isinstance(v, str) else v)
+    return df
+
+def read_workbook(path, sheets=None):
+    """
+    Czyta arkusze skoroszytu (jeden odczyt pliku; sheets=None - wszystkie) i zwraca (lista DataFrame, lista pominiętych arkuszy).
+    Każdy pasujący arkusz dostaje kolumny źródła: Plik, Arkusz, Plytka (jeśli brak własnej kolumny płytki).
+    """
+    file_name = os.path.basename(path)
+    stem = os.path.splitext(file_name)[0]
+    frames, skipped = [], []
+    for sheet, raw in pd.read_excel(path, sheet_name=None if sheets is None else list(sheets)).items():
+        df = clean_sheet(raw).dropna(how='all')
+        missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+        if missing or df.empty:
+            skipped.append(f"{file_name} / {sheet}: brak kolumn {missing}" if missing else f"{file_name} / {sheet}: pusty arkusz")
+            continue
+        df.insert(0, 'Arkusz', str(sheet))
+        df.insert(0, 'Plik', file_name)
+        if 'Plytka' not in df.columns:
+            df['Plytka'] = f"{stem}:{sheet}"
+        frames.append(df)
+    return frames, skipped
+
+def sheet_signatures(path):
+    """
+    Podpisy arkuszy skoroszytu .xlsx bez parsowania danych: {nazwa arkusza: (CRC arkusza, CRC współdzielonych tekstów)}
+    z katalogu archiwum ZIP. Zmiana podpisu = arkusz do ponownego odczytu. None dla .xls lub nietypowej struktury pliku.
+    """
+    if not path.lower().endswith(".xlsx"):
+        return None
+    try:
+        with zipfile.ZipFile(path) as zf:
+            crc = {info.filename: info.CRC for info in zf.infolist()}
+            rels = {rel.get("Id"): rel.get("Target") for rel in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")).iter(f"{_NS_PKG_REL}Relationship")}
+            sheets = ET.fromstring(zf.read("xl/workbook.xml")).iter(f"{_NS_MAIN}sheet")
+            shared = crc.get("xl/sharedStrings.xml")
+            signatures = {}
+            for sheet in sheets:
+                target = rels.get(sheet.get(f"{_NS_REL}id"), "")
+                member = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+                if member not in crc:
+                    return None
+                signatures[sheet.get("name")] = (crc[member], shared)
+            return signatures
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError):
+        return None
+
+def expand_paths(paths):
+    """Pliki Excela z listy plików i/lub folderów (bez plików blokady '~$' zapisywanych przez Excela)."""
+    found = []
+    for p in ([paths] if isinstance(paths, str) else paths):
+        if os.path.isdir(p):
+            found.extend(os.path.join(p, f) for f in sorted(os.listdir(p)))
+        else:
+            found.append(p)
+    return [f for f in found if f.lower().endswith(EXCEL_EXTENSIONS) and not os.path.basename(f).startswith("~$")]
+
+def _read_jobs(files):
+    """
+    Zadania odczytu (plik, arkusze): osobne zadanie dla każdego arkusza .xlsx (nazwy z sheet_signatures, bez parsowania
+    danych), cały skoroszyt dla .xls / nietypowej struktury / pojedynczego arkusza (arkusze=None).
+    """
+    jobs = []
+    for f in files:
+        names = list(sheet_signatures(f) or {})
+        jobs.extend([(f, (name,)) for name in names] if len(names) > 1 else [(f, None)])
+    return jobs
+
+def _job_label(job):
+    f, sheets = job
+    return os.path.basename(f) if sheets is None else f"{os.path.basename(f)} / {sheets[0]}"
+
+def load_workbooks(paths, max_workers=None):
+    """
+    Wczytuje skoroszyty równolegle (pula procesów - parsowanie xlsx blokuje GIL) i łączy arkusze w jedną tabelę.
+    Zadaniem puli jest pojedynczy arkusz (_read_jobs), więc arkusze jednego dużego skoroszytu też są czytane równolegle.
+    Zwraca (df, komunikaty). df = None, jeśli żaden arkusz nie miał wymaganych kolumn.
+    """
+    files = expand_paths(paths)
+    if not files:
+        return None, ["Nie znaleziono plików Excel."]
+
+    jobs = _read_jobs(files)
+    results, messages = {}, []
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(read_workbook, *job): job for job in jobs}
+                for fut in as_completed(futures):
+                    try:
+                        results[futures[fut]] = fut.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        messages.append(f"{_job_label(futures[fut])}: {e}")
+        except (BrokenProcessPool, OSError) as e:
+            # Środowiska bez obsługi procesów potomnych - odczyt sekwencyjny
+            print(f"Warning: Pula procesów niedostępna ({e}), odczyt sekwencyjny.")
+            results, messages = {}, []
+            workers = 1
+    if workers <= 1:
+        for job in jobs:
+            try:
+                results[job] = read_workbook(*job)
+            except Exception as e:
+                messages.append(f"{_job_label(job)}: {e}")
+
+    frames = []
+    for job in jobs:  # kolejność plików i arkuszy jak w skoroszytach, niezależnie od kolejności ukończenia
+        if job in results:
+            frames.extend(results[job][0])
+            messages.extend(results[job][1])
+    if not frames:
+        return None, messages or ["Żaden arkusz nie zawiera kolumn Bakterie, Grupa, Srednica_mm."]
+    return pd.concat(frames, ignore_index=True, sort=False), messages
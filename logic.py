@@ -1,109 +1,336 @@
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from scipy import stats
-import scikit_posthocs as sp
-from statsmodels.stats.multicomp import pairwise_tukeyhsd
+from statsmodels.stats.libqsturng import qsturng
 import utils
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
+import clustering
+import doseresponse
+import multitest
+import effectsize
+from sklearn.utils.extmath import randomized_svd
+
+# Maksymalna liczba zestawów pomiarów w cache statystyk grup (LRU) - ogranicza pamięć w długich sesjach / obserwacji folderu
+GROUP_CACHE_SIZE = 20000
 
 class StatsEngine:
     def __init__(self):
-        pass
+        # Cache statystyk dostatecznych grup: (grupa, posortowane pomiary) -> dict, LRU o rozmiarze GROUP_CACHE_SIZE.
+        # Dzięki temu przełączenie jednej grupy przelicza tylko jej statystyki.
+        self._group_cache = OrderedDict()
+        # Cache macierzy profili i PCA (zależą tylko od danych i wyboru substancji)
+        self.data_version = 0
+        self._pivot_cache = {}
+        self._pca_cache = {}
+        self._dist_cache = {}
+        self._cluster_cache = {}
+
+    def reset_cache(self):
+        """Czyści cache statystyk (wywoływane po wczytaniu nowego zbioru danych)."""
+        self._group_cache.clear()
+        self.invalidate_data()
+
+    def invalidate_data(self):
+        """
+        Zmiana danych w bieżącym zbiorze (odświeżenie obserwowanego folderu): nowa wersja danych i czyszczenie cache
+        zależnych od całego zbioru (macierz profili, PCA, odległości, klastrowanie). Cache statystyk grup jest kluczowany
+        pomiarami, więc zostaje - przeliczane są tylko grupy, których pomiary się zmieniły.
+        """
+        self._pivot_cache.clear()
+        self._pca_cache.clear()
+        self._dist_cache.clear()
+        self._cluster_cache.clear()
+        self.data_version += 1
+
+    # ==================== CACHE STATYSTYK GRUP ====================
+    def _group_stats(self, g, values):
+        """
+        Zwraca statystyki dostateczne grupy (n, suma, suma kwadratów, posortowane wartości,
+        wynik Shapiro, składniki Levene'a). Liczone tylko przy pierwszym użyciu danego zestawu pomiarów.
+        """
+        vals = np.sort(np.asarray(values, dtype=float))
+        key = (g, vals.tobytes())
+        gs = self._group_cache.get(key)
+        if gs is not None:
+            self._group_cache.move_to_end(key)
+            return gs
+
+        n = len(vals)
+        mean = vals.mean() if n else 0.0
+        var = vals.var(ddof=1) if n >= 2 else 0.0
+
+        p_shapiro = 0
+        is_norm = False
+        if n >= 3 and var > 0:
+            s, p_shapiro = stats.shapiro(vals)
+            if p_shapiro >= 0.05: is_norm = True
+
+        # Levene (center='median'): ANOVA na |x - mediana|
+        z = np.abs(vals - np.median(vals)) if n else vals
+        gs = {
+            "key": key, "n": n, "sum": vals.sum(), "sumsq": np.dot(vals, vals),
+            "mean": mean, "var": var, "sorted": vals,
+            "shapiro_p": p_shapiro, "is_normal": is_norm,
+            "z_mean": z.mean() if n else 0.0, "z_var": z.var(ddof=1) if n >= 2 else 0.0,
+        }
+        self._group_cache[key] = gs
+        while len(self._group_cache) > GROUP_CACHE_SIZE:
+            self._group_cache.popitem(last=False)
+        return gs
+
+    def _collect_group_stats(self, df_data):
+        """Statystyki wszystkich grup z df_data (jeden groupby zamiast filtrowania per grupa)."""
+        return {g: self._group_stats(g, vals) for g, vals in df_data.groupby('Grupa', sort=False)['Srednica_mm']}
+
+    @staticmethod
+    def _anova_from_summaries(ns, means, variances):
+        """Jednoczynnikowa ANOVA (F, p) policzona z liczebności, średnich i wariancji grup."""
+        ns, means, variances = (np.asarray(a, dtype=float) for a in (ns, means, variances))
+        k, n_total = len(ns), ns.sum()
+        grand = np.dot(ns, means) / n_total
+        ss_between = np.dot(ns, (means - grand) ** 2)
+        ss_within = np.dot(ns - 1, variances)
+        df_b, df_w = k - 1, n_total - k
+        if ss_within <= 0:
+            return (np.inf, 0.0) if ss_between > 0 else (np.nan, np.nan)
+        f = (ss_between / df_b) / (ss_within / df_w)
+        return f, stats.f.sf(f, df_b, df_w)
+
+    @staticmethod
+    def _welch_anova_from_summaries(ns, means, variances):
+        """ANOVA Welcha (F, p, df mianownika) z liczebności, średnich i wariancji grup (wariancje > 0)."""
+        ns, means, variances = (np.asarray(a, dtype=float) for a in (ns, means, variances))
+        k = len(ns)
+        w = ns / variances
+        mean_w = np.dot(w, means) / w.sum()
+        a = np.dot(w, (means - mean_w) ** 2) / (k - 1)
+        tmp = np.sum((1 - w / w.sum()) ** 2 / (ns - 1))
+        f = a / (1 + 2 * (k - 2) / (k ** 2 - 1) * tmp)
+        df2 = (k ** 2 - 1) / (3 * tmp)
+        return f, stats.f.sf(f, k - 1, df2), df2
+
+    @staticmethod
+    def _welch_pairs(summaries):
+        """
+        Statystyki Welcha wszystkich par (i < j): różnica średnich (j - i), błąd standardowy
+        i stopnie swobody Welcha-Satterthwaite'a - wektorowo ze statystyk grup.
+        """
+        ns = np.array([gs["n"] for gs in summaries], dtype=float)
+        means = np.array([gs["mean"] for gs in summaries])
+        v = np.array([gs["var"] for gs in summaries]) / ns
+        i, j = np.triu_indices(len(ns), 1)
+        se = np.sqrt(v[i] + v[j])
+        df = (v[i] + v[j]) ** 2 / (v[i] ** 2 / (ns[i] - 1) + v[j] ** 2 / (ns[j] - 1))
+        return i, j, means[j] - means[i], se, df
+
+    def _tukey_hsd(self, names, summaries, alpha=0.05):
+        """
+        Post-hoc Tukeya HSD ze statystyk grup (bez ponownego przeglądania pomiarów); ten sam rozkład rozstępu
+        studentyzowanego i format tabeli co statsmodels.pairwise_tukeyhsd.
+        """
+        order = sorted(range(len(names)), key=lambda g: str(names[g]))
+        names = [names[g] for g in order]
+        summaries = [summaries[g] for g in order]
+        ns = np.array([gs["n"] for gs in summaries], dtype=float)
+        means = np.array([gs["mean"] for gs in summaries])
+        k, df_w = len(ns), ns.sum() - len(ns)
+        mse = np.dot(ns - 1, [gs["var"] for gs in summaries]) / df_w
+        i, j = np.triu_indices(k, 1)
+        diff = means[j] - means[i]
+        se = np.sqrt(mse / 2 * (1 / ns[i] + 1 / ns[j]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p_adj = stats.studentized_range.sf(np.abs(diff) / se, k, df_w)
+        half = qsturng(1 - alpha, k, df_w) * se
+        return pd.DataFrame({
+            "group1": [names[a] for a in i], "group2": [names[b] for b in j],
+            "meandiff": np.round(diff, 4), "p-adj": np.round(p_adj, 4),
+            "lower": np.round(diff - half, 4), "upper": np.round(diff + half, 4), "reject": p_adj < alpha,
+        })
+
+    def _dunn(self, names, summaries, method):
+        """Post-hoc Dunna ze statystyk grup: macierz p-value (skorygowanych metodą method) jak scikit_posthocs.posthoc_dunn."""
+        i, j, p = self._pairwise_raw(summaries, "Kruskal-Wallis")
+        p = multitest.adjust(p, method)
+        matrix = np.ones((len(names), len(names)))
+        matrix[i, j] = matrix[j, i] = p
+        return pd.DataFrame(matrix, index=names, columns=names)
+
+    def _games_howell(self, names, summaries, alpha=0.05):
+        """Post-hoc Games-Howella w formacie tabeli Tukeya (group1, group2, meandiff, p-adj, lower, upper, reject)."""
+        order = sorted(range(len(names)), key=lambda g: str(names[g]))
+        names = [names[g] for g in order]
+        summaries = [summaries[g] for g in order]
+        i, j, diff, se, df = self._welch_pairs(summaries)
+        k = len(summaries)
+        q = np.abs(diff) / se * np.sqrt(2)
+        p_adj = stats.studentized_range.sf(q, k, df)
+        # p-value dokładnie (scipy), wartość krytyczna do przedziałów z tablic interpolowanych (qsturng, szybko)
+        half = qsturng(1 - alpha, k, df) / np.sqrt(2) * se
+        return pd.DataFrame({
+            "group1": [names[a] for a in i], "group2": [names[b] for b in j],
+            "meandiff": np.round(diff, 4), "p-adj": np.round(p_adj, 4),
+            "lower": np.round(diff - half, 4), "upper": np.round(diff + half, 4), "reject": p_adj < alpha,
+        })
+
+    def _choose_test(self, summaries):
+        """
+        (wszystkie grupy normalne?, p Levene'a, wybrany test) dla statystyk grup:
+        normalne + równe wariancje -> "ANOVA", normalne + różne wariancje -> "Welch ANOVA", pozostałe -> "Kruskal-Wallis".
+        """
+        all_normal = all(gs["is_normal"] for gs in summaries)
+        _, p_levene = self._anova_from_summaries([gs["n"] for gs in summaries],
+                                                 [gs["z_mean"] for gs in summaries],
+                                                 [gs["z_var"] for gs in summaries])
+        if not all_normal or np.isnan(p_levene):
+            return all_normal, p_levene, "Kruskal-Wallis"
+        return all_normal, p_levene, "ANOVA" if p_levene > 0.05 else "Welch ANOVA"
+
+    @staticmethod
+    def _pairwise_raw(summaries, test_used):
+        """
+        Niekorygowane p-value wszystkich par grup (i < j), wektorowo ze statystyk grup:
+        ANOVA - test t z połączoną wariancją ANOVA (LSD), Welch ANOVA - test t Welcha, Kruskal-Wallis - test Dunna.
+        """
+        ns = np.array([gs["n"] for gs in summaries], dtype=float)
+        i, j = np.triu_indices(len(ns), 1)
+        if test_used == "Welch ANOVA":
+            i, j, diff, se, df = StatsEngine._welch_pairs(summaries)
+            p = 2 * stats.t.sf(np.abs(diff) / se, df)
+        elif test_used == "ANOVA":
+            means = np.array([gs["mean"] for gs in summaries])
+            df_w = ns.sum() - len(ns)
+            mse = np.dot(ns - 1, [gs["var"] for gs in summaries]) / df_w
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (means[i] - means[j]) / np.sqrt(mse * (1 / ns[i] + 1 / ns[j]))
+            p = 2 * stats.t.sf(np.abs(t), df_w)
+        else:
+            values = np.concatenate([gs["sorted"] for gs in summaries])
+            n_total = len(values)
+            ranks = stats.rankdata(values)
+            starts = np.r_[0, np.cumsum(ns)[:-1]].astype(int)
+            mean_ranks = np.add.reduceat(ranks, starts) / ns
+            _, counts = np.unique(values, return_counts=True)
+            ties = (counts ** 3 - counts).sum()
+            sigma2 = n_total * (n_total + 1) / 12 - ties / (12 * (n_total - 1))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = np.abs(mean_ranks[i] - mean_ranks[j]) / np.sqrt(sigma2 * (1 / ns[i] + 1 / ns[j]))
+            p = 2 * stats.norm.sf(z)
+        return i, j, p
+
+    def study_pairwise(self, df, col_bact, selected_groups=None, method="fdr_bh"):
+        """
+        Korekta wielokrotnych porównań w całym badaniu: niekorygowane p-value wszystkich par grup
+        wszystkich szczepów trafiają do jednej tablicy i są korygowane razem (multitest.adjust).
+        Ścieżka testu (ANOVA / Welch / Dunn) jak w run_statistics dla danego szczepu.
+        Zwraca tabelę: Bakteria, Test, Group 1, Group 2, P-raw, P-adj (study), Significant (study).
+        """
+        data = df if selected_groups is None else df[df['Grupa'].isin(selected_groups)]
+        blocks = []
+        for bact, sub in data.groupby(col_bact, sort=False):
+            group_stats = [(g, gs) for g, gs in self._collect_group_stats(sub).items() if gs["n"] >= 2]
+            if len(group_stats) < 2: continue
+            names = np.array([g for g, _ in group_stats], dtype=object)
+            summaries = [gs for _, gs in group_stats]
+            test_used = self._choose_test(summaries)[2]
+            i, j, p = self._pairwise_raw(summaries, test_used)
+            blocks.append(pd.DataFrame({"Bakteria": bact, "Test": test_used,
+                                        "Group 1": names[i], "Group 2": names[j], "P-raw": p}))
+        if not blocks:
+            return pd.DataFrame(columns=["Bakteria", "Test", "Group 1", "Group 2", "P-raw", "P-adj (study)", "Significant (study)"])
+
+        table = pd.concat(blocks, ignore_index=True)
+        table["P-adj (study)"] = multitest.adjust(table["P-raw"].to_numpy(dtype=float), method)
+        table["Significant (study)"] = table["P-adj (study)"] < 0.05
+        return table
+
+    @staticmethod
+    def attach_study_pvalues(detailed_results, study_table, bact):
+        """Dopisuje do detali post-hoc szczepu kolumny 'P-raw' i 'P-adj (study)' z tabeli study_pairwise."""
+        sub = study_table[study_table['Bakteria'] == bact]
+        lookup = {frozenset((a, b)): (r, q) for a, b, r, q in
+                  zip(sub['Group 1'], sub['Group 2'], sub['P-raw'], sub['P-adj (study)'])}
+        for d in detailed_results:
+            d['P-raw'], d['P-adj (study)'] = lookup.get(frozenset((d['Group 1'], d['Group 2'])), (np.nan, np.nan))
 
     def run_statistics(self, df_run, method, ref_group):
         """
-        Calculates main statistics (ANOVA/Kruskal) and Post-hoc.
+        Calculates main statistics (ANOVA/Welch ANOVA/Kruskal) and Post-hoc.
         Returns:
             - results_summary (dict): 'test_name', 'p_value', 'statistic'
             - posthoc_df (DataFrame or None)
             - error_msg (str or None)
         """
-        # Przygotowanie danych
-        valid_groups = []
-        dane_list = []
-        
+        # Przygotowanie danych (statystyki grup z cache - przeliczane tylko zmienione grupy)
         # Filtrujemy grupy z < 2 pomiarami
-        for g in df_run['Grupa'].unique():
-             data = df_run[df_run['Grupa'] == g]['Srednica_mm'].values
-             if len(data) >= 2:
-                valid_groups.append(g)
-                dane_list.append(data)
+        group_stats = [gs for gs in self._collect_group_stats(df_run).items() if gs[1]["n"] >= 2]
+        valid_groups = [g for g, _ in group_stats]
+        summaries = [gs for _, gs in group_stats]
+        dane_list = [gs["sorted"] for gs in summaries]
 
         if len(dane_list) < 2:
             return None, None, "Za mało ważnych grup do przeprowadzenia testów statystycznych."
 
         # 1. Normalność
-        all_normal = True
         normality_results = []
-        for g in valid_groups:
-            vals = df_run[df_run['Grupa'] == g]['Srednica_mm']
-            p_shapiro = 0
-            is_norm = False
-            if len(vals) >= 3 and vals.std() > 0:
-                s, p_shapiro = stats.shapiro(vals)
-                if p_shapiro >= 0.05: is_norm = True
-            if not is_norm: all_normal = False
-            normality_results.append({"Grupa": g, "Shapiro p-value": p_shapiro, "Rozkład Normalny?": "TAK" if is_norm else "NIE"})
-
-        # 2. Levene
-        try: 
-            stat, p_levene = stats.levene(*dane_list)
-        except Exception as e: 
-            print(f"Warning: Levene error: {e}")
-            p_levene = 0
-        
-        use_parametric = all_normal and p_levene > 0.05
+        for g, gs in group_stats:
+            normality_results.append({"Grupa": g, "Shapiro p-value": gs["shapiro_p"], "Rozkład Normalny?": "TAK" if gs["is_normal"] else "NIE"})
+
+        # 2. Levene (z zapamiętanych odchyleń od mediany) -> wybór ścieżki testów
+        all_normal, p_levene, test_used = self._choose_test(summaries)
         
         stats_main = []
         posthoc_df = None
-        test_used = ""
 
         # 3. Testy Główne + Post-hoc
-        if use_parametric:
-            test_used = "ANOVA"
+        if test_used == "ANOVA":
             try:
-                f, p = stats.f_oneway(*dane_list)
+                f, p = self._anova_from_summaries([gs["n"] for gs in summaries],
+                                                  [gs["mean"] for gs in summaries],
+                                                  [gs["var"] for gs in summaries])
                 stats_main = [{"Test": "ANOVA", "Statistic": f, "p-value": p}]
                 if p < 0.05:
-                    tukey = pairwise_tukeyhsd(df_run['Srednica_mm'], df_run['Grupa'], 0.05)
-                    posthoc_df = pd.DataFrame(data=tukey._results_table.data[1:], columns=tukey._results_table.data[0])
+                    posthoc_df = self._tukey_hsd(valid_groups, summaries)
             except Exception as e: return None, None, f"Błąd ANOVA: {e}"
+        elif test_used == "Welch ANOVA":
+            # Dane normalne, ale wariancje różne (Levene) -> Welch + Games-Howell zamiast Kruskala
+            try:
+                f, p, df2 = self._welch_anova_from_summaries([gs["n"] for gs in summaries],
+                                                             [gs["mean"] for gs in summaries],
+                                                             [gs["var"] for gs in summaries])
+                stats_main = [{"Test": "Welch ANOVA", "Statistic": f, "p-value": p}]
+                if p < 0.05:
+                    posthoc_df = self._games_howell(valid_groups, summaries)
+            except Exception as e: return None, None, f"Błąd Welch ANOVA: {e}"
         else:
-            test_used = "Kruskal-Wallis"
             try:
                 h, p = stats.kruskal(*dane_list)
                 stats_main = [{"Test": "Kruskal-Wallis", "Statistic": h, "p-value": p}]
                 if p < 0.05:
-                    posthoc_df = sp.posthoc_dunn(df_run, 'Srednica_mm', 'Grupa', p_adjust=method)
+                    posthoc_df = self._dunn(valid_groups, summaries, method)
             except Exception as e: return None, None, f"Błąd Kruskal: {e}"
 
         return {
             "normality": normality_results,
             "main_stats": stats_main,
             "test_used": test_used,
-            "is_parametric": use_parametric,
+            "is_parametric": test_used != "Kruskal-Wallis",
             "all_normal": all_normal
         }, posthoc_df, None
 
     def process_detailed_results(self, posthoc_df, df_data, ref_group, test_type):
         """
         Przetwarza wyniki post-hoc na listę detali z Effect Size.
+        Miara efektu zależy od ścieżki testu (effectsize.measure_for_test): Hedges' g, Glass's Δ lub Cliff's δ.
         Zwraca: (detailed_list, significant_set)
         """
-        detailed_results = []
-        sig_set = set()
-        
         if posthoc_df is None: return [], set()
+        group_stats = self._collect_group_stats(df_data)
+        pairs = []
 
-        # TUKEY
-        if test_type == "ANOVA": 
+        # TUKEY / GAMES-HOWELL (ten sam format tabeli)
+        if test_type in ("ANOVA", "Welch ANOVA"): 
             for i, r in posthoc_df.iterrows():
-                g1, g2 = r['group1'], r['group2']
-                is_sig = r['reject']
-                p_adj = r['p-adj']
-                
-                self._add_detail(g1, g2, p_adj, is_sig, df_data, ref_group, detailed_results, sig_set)
+                pairs.append((r['group1'], r['group2'], r['p-adj'], r['reject']))
 
         # DUNN (Kruskal)
         elif test_type == "Kruskal-Wallis":
@@ -114,118 +341,234 @@ class StatsEngine:
                         pair = tuple(sorted((str(r), str(c))))
                         if pair not in seen:
                             pval = posthoc_df.loc[r, c]
-                            is_sig = pval < 0.05
-                            self._add_detail(r, c, pval, is_sig, df_data, ref_group, detailed_results, sig_set)
+                            pairs.append((r, c, pval, pval < 0.05))
                             seen.add(pair)
         
+        return self._build_details(pairs, group_stats, ref_group, test_type)
+
+    def _build_details(self, pairs, group_stats, ref, test_type):
+        """Detale par (p, istotność, wielkość efektu liczona wsadowo dla wszystkich par naraz) i zbiór grup istotnych vs odniesienie."""
+        detailed_results, sig_set = [], set()
+        if not pairs: return detailed_results, sig_set
+        names = list(group_stats)
+        index = {g: k for k, g in enumerate(names)}
+        i = [index[g1] for g1, _, _, _ in pairs]
+        j = [index[g2] for _, g2, _, _ in pairs]
+        values, measures = effectsize.pairwise_effects([group_stats[g] for g in names], i, j, test_type, index.get(ref))
+
+        for (g1, g2, p_val, is_sig), value, measure in zip(pairs, values, measures):
+            detailed_results.append({
+                "Group 1": g1, "Group 2": g2, "P-adj": p_val, "Significant": is_sig,
+                "Effect": value, "Effect Measure": measure,
+                "Effect Size": utils.get_effect_size_interpretation(value, measure)
+            })
+            if is_sig:
+                if g1 == ref: sig_set.add(g2)
+                if g2 == ref: sig_set.add(g1)
         return detailed_results, sig_set
 
-    def _add_detail(self, g1, g2, p_val, is_sig, df_data, ref, results_list, sig_set):
-        data1 = df_data[df_data['Grupa'] == g1]['Srednica_mm'].values
-        data2 = df_data[df_data['Grupa'] == g2]['Srednica_mm'].values
-        
-        d_val = utils.calculate_cohens_d(data1, data2)
-        d_interp = utils.get_effect_size_interpretation(d_val)
-        
-        results_list.append({
-            "Group 1": g1, "Group 2": g2, "P-adj": p_val, 
-            "Significant": is_sig, "Cohen's d": d_val, "Effect Size": d_interp
-        })
+    def _profile_key(self, col_bact, selected_substances, data_key=None):
+        # data_key: identyfikator innego źródła niż wczytany plik (np. MeasurementArchive.version)
+        source = self.data_version if data_key is None else data_key
+        return (source, col_bact, tuple(sorted(selected_substances)))
 
-        if is_sig:
-            if g1 == ref: sig_set.add(g2)
-            if g2 == ref: sig_set.add(g1)
+    def get_profile_matrix(self, df, col_bact, selected_substances, data_key=None):
+        """
+        Macierz profili wrażliwości: Wiersze=Bakterie, Kolumny=Substancje, Wartości=średnia średnica.
+        Wynik zapamiętany per (wersja danych, szczepy-kolumna, wybrane substancje).
+        """
+        key = self._profile_key(col_bact, selected_substances, data_key)
+        df_pivot = self._pivot_cache.get(key)
+        if df_pivot is None:
+            # 1. Filtrujemy dane tylko dla wybranych substancji
+            df_filtered = df[df['Grupa'].isin(selected_substances)]
+            # 2. Pivot Table: Wiersze=Bakterie, Kolumny=Substancje
+            df_pivot = df_filtered.pivot_table(index=col_bact, columns='Grupa', values='Srednica_mm', aggfunc='mean')
+            # 3. Uzupełnianie braków (jeśli jakaś bakteria nie ma pomiaru dla danej substancji -> 0)
+            df_pivot = df_pivot.fillna(0)
+            self._pivot_cache[key] = df_pivot
+        return df_pivot
 
-    def run_pca(self, df, col_bact, selected_substances):
+    def run_pca(self, df, col_bact, selected_substances, randomized_threshold=500, data_key=None):
         """
         Runs PCA on the dataframe to visualize bacterial similarity based on sensitivity.
         Rows: Bacteria, Columns: Substances, Values: Mean Zone Diameter.
+        Zwraca ((pca_df, explained_variance, loadings), error) - wszystkie składowe z jednego SVD.
+        Wynik zależy tylko od danych i wyboru substancji (nie od szczepu), więc jest cache'owany.
         """
-        # 1. Filtrujemy dane tylko dla wybranych substancji
-        df_filtered = df[df['Grupa'].isin(selected_substances)].copy()
-        
-        # 2. Pivot Table: Wiersze=Bakterie, Kolumny=Substancje
-        df_pivot = df_filtered.pivot_table(index=col_bact, columns='Grupa', values='Srednica_mm', aggfunc='mean')
+        key = self._profile_key(col_bact, selected_substances, data_key)
+        if key in self._pca_cache:
+            return self._pca_cache[key]
+
+        df_pivot = self.get_profile_matrix(df, col_bact, selected_substances, data_key)
         
         if df_pivot.empty or len(df_pivot) < 3:
-            return None, "Za mało danych do PCA (wymagane min. 3 szczepy)."
-            
-        # 3. Uzupełnianie braków (jeśli jakaś bakteria nie ma pomiaru dla danej substancji -> 0)
-        df_pivot = df_pivot.fillna(0)
-        
+            result = (None, "Za mało danych do PCA (wymagane min. 3 szczepy).")
         # Wymagane min 2 kolumny (cechy)
-        if df_pivot.shape[1] < 2:
-            return None, "Za mało cech do PCA (wymagane min. 2 substancje)."
+        elif df_pivot.shape[1] < 2:
+            result = (None, "Za mało cech do PCA (wymagane min. 2 substancje).")
+        else:
+            result = (self._pca_svd(df_pivot, randomized_threshold), None)
+        self._pca_cache[key] = result
+        return result
+
+    @staticmethod
+    def _pca_svd(df_pivot, randomized_threshold):
+        # 4. Skalowanie (jak StandardScaler: ddof=0, stałe kolumny bez skalowania)
+        X = df_pivot.values.astype(float)
+        sd = X.std(axis=0)
+        sd[sd == 0] = 1.0
+        X = (X - X.mean(axis=0)) / sd
+        total_var = (X ** 2).sum()
+
+        # 5. SVD: pełne dla typowych paneli, randomizowane dla bardzo szerokich
+        if X.shape[1] >= randomized_threshold:
+            n_comp = min(10, min(X.shape) - 1)
+            U, S, Vt = randomized_svd(X, n_components=n_comp, random_state=0)
+        else:
+            U, S, Vt = np.linalg.svd(X, full_matrices=False)
+            n_comp = min(X.shape[0] - 1, len(S))
+            U, S, Vt = U[:, :n_comp], S[:n_comp], Vt[:n_comp]
+
+        # Deterministyczne znaki składowych (jak svd_flip w sklearn)
+        signs = np.sign(Vt[np.arange(n_comp), np.abs(Vt).argmax(axis=1)])
+        signs[signs == 0] = 1.0
+        U, Vt = U * signs, Vt * signs[:, None]
 
-        # 4. Skalowanie
-        scaler = StandardScaler()
-        scaled_data = scaler.fit_transform(df_pivot)
+        pc_names = [f"PC{i + 1}" for i in range(n_comp)]
+        pca_df = pd.DataFrame(data=U * S, columns=pc_names)
+        pca_df['Bakteria'] = df_pivot.index.values # use values to avoid index issues
         
-        # 5. PCA
-        pca = PCA(n_components=2)
-        pcs = pca.fit_transform(scaled_data)
+        explained_variance = (S ** 2) / total_var if total_var > 0 else np.zeros(n_comp)
+        loadings = pd.DataFrame(Vt.T, index=df_pivot.columns, columns=pc_names)
+        return pca_df, explained_variance, loadings
+
+    def run_clustering(self, df, col_bact, selected_substances, metric="euclidean", method="average", data_key=None):
+        """
+        Klastrowanie hierarchiczne szczepów na tej samej macierzy profili co PCA.
+        Odległości (skondensowane) są zapamiętywane per metryka, więc zmiana metody łączenia ich nie przelicza.
+        """
+        subs_key = self._profile_key(col_bact, selected_substances, data_key)
+        key = subs_key + (metric, method)
+        if key in self._cluster_cache:
+            return self._cluster_cache[key]
+
+        df_pivot = self.get_profile_matrix(df, col_bact, selected_substances, data_key)
+        d_rows = None
+        if len(df_pivot) >= 3 and df_pivot.shape[1] >= 2:
+            dist_key = subs_key + (metric,)
+            d_rows = self._dist_cache.get(dist_key)
+            if d_rows is None:
+                d_rows = clustering.condensed_distances(clustering.standardize_columns(df_pivot.values), metric)
+                self._dist_cache[dist_key] = d_rows
+
+        result = clustering.cluster_profiles(df_pivot, metric, method, row_distances=d_rows)
+        self._cluster_cache[key] = result
+        return result
+
+    def estimate_mic_batch(self, df, col_bact=None, target_diameter=6.0, min_concentrations=3):
+        """
+        Estimates MIC for every (strain, substance) pair in one pass using Log-Linear Regression.
+        Model: Diameter = a + b * ln(Concentration), MIC = exp((Target - a) / b)
+        Dopasowanie z grupowanych sum najmniejszych kwadratów (bez pętli po substancjach).
+        col_bact=None: cały df traktowany jako jeden szczep.
+        Zwraca tabelę: Bakteria, Substancja, MIC, Unit, R2, Slope, Intercept, SE Slope, SE Intercept, N, N Conc.
+        """
+        columns = ['Bakteria', 'Substancja', 'MIC', 'Unit', 'R2', 'Slope', 'Intercept', 'SE Slope', 'SE Intercept', 'N', 'N Conc']
         
-        pca_df = pd.DataFrame(data=pcs, columns=['PC1', 'PC2'])
-        pca_df['Bakteria'] = df_pivot.index.values # use values to avoid index issues
+        # 1. Parsowanie stężeń raz na unikalną nazwę grupy
+        sub, conc, unit = utils.parse_concentrations(df['Grupa'])
+        
+        valid = sub.notna() & (conc > 0) & df['Srednica_mm'].notna()
+        if not valid.any():
+            return pd.DataFrame(columns=columns)
+        
+        x = np.log(conc[valid].values)
+        y = df.loc[valid, 'Srednica_mm'].values.astype(float)
+        d = pd.DataFrame({
+            'Bakteria': df.loc[valid, col_bact].values if col_bact else "",
+            'Substancja': sub[valid].values, 'Unit': unit[valid].values,
+            'x': x, 'y': y, 'xx': x * x, 'xy': x * y, 'yy': y * y,
+        })
+        
+        # 2. Sumy dostateczne per (szczep, substancja)
+        g = d.groupby(['Bakteria', 'Substancja'], sort=False)
+        sums = g[['x', 'y', 'xx', 'xy', 'yy']].sum()
+        n = g.size()
+        n_conc = g['x'].nunique()
+        units = g['Unit'].last()
+        
+        # 3. Regresja liniowa w formie zamkniętej (jak stats.linregress)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sxx = sums['xx'] - sums['x'] ** 2 / n
+            sxy = sums['xy'] - sums['x'] * sums['y'] / n
+            syy = sums['yy'] - sums['y'] ** 2 / n
+            slope = sxy / sxx
+            intercept = (sums['y'] - slope * sums['x']) / n
+            r2 = np.where(syy > 0, sxy ** 2 / (sxx * syy), np.nan)
+            sse = np.maximum(syy - slope * sxy, 0)
+            s2 = sse / (n - 2)
+            se_slope = np.sqrt(s2 / sxx)
+            se_intercept = np.sqrt(s2 * (1 / n + (sums['x'] / n) ** 2 / sxx))
+            # 4. MIC: ln(MIC) = (Target - a) / b; oczekujemy że strefa rośnie ze stężeniem
+            mic = np.where(slope > 0, np.exp((target_diameter - intercept) / slope), np.nan)
         
-        explained_variance = pca.explained_variance_ratio_
-        return (pca_df, explained_variance), None
+        res = pd.DataFrame({
+            'MIC': mic, 'Unit': units, 'R2': r2, 'Slope': slope, 'Intercept': intercept,
+            'SE Slope': se_slope, 'SE Intercept': se_intercept, 'N': n, 'N Conc': n_conc,
+        }, index=sums.index).reset_index()
+        
+        # Za mało punktów stężeń do regresji (min 3)
+        return res[res['N Conc'] >= min_concentrations][columns].reset_index(drop=True)
 
     def estimate_mic(self, df, selected_substances, target_diameter=6.0):
         """
-        Estimates MIC for each substance using Log-Linear Regression.
+        Estimates MIC for each substance using Log-Linear Regression (jeden szczep).
         Model: Diameter = a + b * ln(Concentration)
         MIC = exp((Target - a) / b)
+        Zwraca {substancja: {"MIC", "Unit", "R2", "Slope", "Intercept"}} na bazie estimate_mic_batch.
         """
-        results = {}
+        table = self.estimate_mic_batch(df, None, target_diameter)
+        table = table[table['Substancja'].isin(selected_substances)]
         
-        for sub in selected_substances:
-            # 1. Pobierz dane tylko dla tej substancji
-            # Musimy wyciągnąć stężenia z nazw grup.
-            # Używamy utils.parse_concentration
-            
-            sub_df = df[df['Grupa'].str.contains(sub, regex=False)].copy() # Wstępne filtrowanie, ale dokładne parsowanie niżej
-            
-            x_concs = []
-            y_diams = []
-            valid_unit = ""
-            
-            for g in sub_df['Grupa'].unique():
-                parsed_sub, conc, unit = utils.parse_concentration(g)
-                # Sprawdź czy to ta substancja (bo contains jest luźne)
-                if parsed_sub and sub in parsed_sub and conc is not None:
-                    # Pobierz wszystkie pomiary dla tej grupy
-                    measurements = sub_df[sub_df['Grupa'] == g]['Srednica_mm'].values
-                    for m in measurements:
-                        if conc > 0:
-                            x_concs.append(conc)
-                            y_diams.append(m)
-                            valid_unit = unit
-
-            if len(set(x_concs)) < 3:
-                # Za mało punktów stężeń do regresji (min 3 lepie)
-                continue
-                
-            # 2. Regresja Liniowa na logarytmach
-            try:
-                log_x = np.log(x_concs)
-                slope, intercept, r_value, p_value, std_err = stats.linregress(log_x, y_diams)
-                
-                # 3. Oblicz MIC: 6 = a + b * ln(MIC) => ln(MIC) = (6 - a) / b
-                if slope > 0: # Oczekujemy że strefa rośnie ze stężeniem
-                    ln_mic = (target_diameter - intercept) / slope
-                    mic = np.exp(ln_mic)
-                else:
-                    mic = None # Ujemny lub zerowy współczynnik kierunkowy - brak sensu biol.
-                
-                results[sub] = {
-                    "MIC": mic, 
-                    "Unit": valid_unit, 
-                    "R2": r_value**2,
-                    "Slope": slope,
-                    "Intercept": intercept
-                }
-            except:
-                pass
-                
+        results = {}
+        for _, row in table.iterrows():
+            results[row['Substancja']] = {
+                # Ujemny lub zerowy współczynnik kierunkowy - brak sensu biol.
+                "MIC": row['MIC'] if np.isfinite(row['MIC']) else None,
+                "Unit": row['Unit'],
+                "R2": row['R2'],
+                "Slope": row['Slope'],
+                "Intercept": row['Intercept']
+            }
         return results
+
+    def estimate_mic_4pl(self, df, selected_substances, target_diameter=6.0):
+        """
+        MIC z nieliniowego modelu 4PL (Hill) dla jednego szczepu - stężenie przy średnicy target_diameter z 95% CI.
+        Zwraca (results, curve_params): results w formacie estimate_mic (+ "CI Low", "CI High", "EC50", "Hill"),
+        curve_params {substancja: theta} do nałożenia krzywych na wykres trendu.
+        """
+        table, params = doseresponse.fit_dose_response(df, target_diameter)
+        table = table[table['Substancja'].isin(selected_substances)]
+        
+        results = {}
+        for _, row in table.iterrows():
+            results[row['Substancja']] = {
+                # Średnica docelowa poza zakresem asymptot krzywej -> brak MIC
+                "MIC": row['Conc@Target'] if np.isfinite(row['Conc@Target']) else None,
+                "Unit": row['Unit'],
+                "R2": row['R2'],
+                "CI Low": row['CI Low'],
+                "CI High": row['CI High'],
+                "EC50": row['EC50'],
+                "Hill": row['Hill']
+            }
+        return results, {sub: params[sub] for sub in results}
+
+    def estimate_mic_table(self, df, col_bact, target_diameter=6.0, model="Log-liniowy"):
+        """Tabela MIC dla wszystkich szczepów i substancji wybranym modelem (kolumny: Bakteria, Substancja, MIC, Unit, ...)."""
+        if "4PL" in model:
+            table, _ = doseresponse.fit_dose_response(df, target_diameter, col_bact=col_bact)
+            return table.rename(columns={'Conc@Target': 'MIC'})
+        return self.estimate_mic_batch(df, col_bact, target_diameter)
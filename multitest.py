@@ -0,0 +1,62 @@
+import numpy as np
+
+# Korekty dla wielokrotnych porównań; działają wzdłuż ostatniej osi, NaN są pomijane (zostają NaN)
+METHODS = ["fdr_bh", "fdr_by", "storey", "holm", "bonferroni"]
+
+def _sorted_view(p):
+    p = np.asarray(p, dtype=float)
+    order = np.argsort(p, axis=-1, kind="stable")         # NaN na końcu
+    p_sorted = np.take_along_axis(p, order, axis=-1)
+    m = np.isfinite(p).sum(axis=-1, keepdims=True)          # liczba testów w wierszu
+    rank = np.arange(1, p.shape[-1] + 1)
+    return p, order, p_sorted, m, rank
+
+def _unsort(values, order):
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, values, axis=-1)
+    return out
+
+def _step_up(p_sorted, factor):
+    """q_(i) = min_{j>=i} p_(j) * factor_(j) (monotoniczne, obcięte do 1)."""
+    q = p_sorted * factor
+    q = np.where(np.isfinite(q), q, np.inf)
+    q = np.minimum.accumulate(q[..., ::-1], axis=-1)[..., ::-1]
+    return np.where(np.isfinite(p_sorted), np.minimum(q, 1.0), np.nan)
+
+def storey_pi0(p, lam=0.5):
+    """Oszacowanie odsetka prawdziwych hipotez zerowych (Storey 2002), obcięte do (0, 1]."""
+    p = np.asarray(p, dtype=float)
+    m = np.isfinite(p).sum(axis=-1)
+    above = (p > lam).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pi0 = above / (m * (1 - lam))
+    return np.clip(np.nan_to_num(pi0, nan=1.0), 1e-6, 1.0)
+
+def adjust(p, method="fdr_bh", lam=0.5):
+    """
+    Skorygowane p-value (q-value) w czasie O(m log m):
+      fdr_bh - Benjamini-Hochberg, fdr_by - Benjamini-Yekutieli (dowolna zależność testów),
+      storey - q-value Storeya (BH x pi0), holm - Holm-Bonferroni, bonferroni.
+    """
+    if method is None or method == "None":
+        return np.asarray(p, dtype=float)
+    if method not in METHODS:
+        raise ValueError(f"Nieznana metoda korekty: {method}")
+    p, order, p_sorted, m, rank = _sorted_view(p)
+    if p.shape[-1] == 0:
+        return p.copy()
+
+    if method == "bonferroni":
+        return np.where(np.isfinite(p), np.minimum(p * m, 1.0), np.nan)
+    if method == "holm":
+        q = np.where(np.isfinite(p_sorted), p_sorted * (m - rank + 1), -np.inf)
+        q = np.minimum(np.maximum.accumulate(q, axis=-1), 1.0)
+        return _unsort(np.where(np.isfinite(p_sorted), q, np.nan), order)
+
+    factor = m / rank
+    if method == "fdr_by":
+        harmonic = np.cumsum(1.0 / rank)                     # c(m) = sum_{i<=m} 1/i
+        factor = factor * np.take_along_axis(np.broadcast_to(harmonic, p.shape), np.maximum(m - 1, 0), axis=-1)
+    elif method == "storey":
+        factor = factor * np.expand_dims(storey_pi0(p, lam), -1)
+    return _unsort(_step_up(p_sorted, factor), order)
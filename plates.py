@@ -0,0 +1,314 @@
+import os
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from PIL import Image
+from scipy import ndimage
+import loader
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+DISK_MM = 6.0            # średnica krążka - wzorzec kalibracji mm/px
+WORK_SIZE = 900          # dłuższy bok obrazu roboczego (px)
+MAX_ZONE_MM = 40.0       # maks. mierzona średnica strefy
+N_SECTORS = 24           # sektory kątowe profilu radialnego (mediana odporna na sąsiednie strefy)
+MIN_CONTRAST = 0.04      # min. różnica jasności strefa / murawa (skala 0-1); mniej = brak strefy
+SAME_SIZE_TOL = 0.2      # maks. względna różnica promieni krążków na jednym zdjęciu
+FIELD_MM = (60.0, 300.0) # dopuszczalny dłuższy bok kadru (mm) wynikający z kalibracji: od ciasnego kadru płytki 90 mm
+
+def expand_paths(paths):
+    """Zdjęcia płytek z listy plików i/lub folderów."""
+    found = []
+    for p in ([paths] if isinstance(paths, str) else paths):
+        if os.path.isdir(p):
+            found.extend(os.path.join(p, f) for f in sorted(os.listdir(p)))
+        else:
+            found.append(p)
+    return [f for f in found if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+def load_image(path, work_size=WORK_SIZE):
+    """Obraz w skali szarości (float 0-1), pomniejszony tak, by dłuższy bok miał najwyżej work_size px."""
+    with Image.open(path) as im:
+        im.draft("L", (work_size, work_size))  # JPEG: dekodowanie od razu w zmniejszonej skali
+        im = im.convert("L")
+        scale = min(1.0, work_size / max(im.size))
+        if scale < 1.0:
+            im = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))), Image.BILINEAR)
+        return np.asarray(im, dtype=np.float32) / 255.0
+
+def _disk_blobs(smooth, background, polarity):
+    """
+    Kandydaci na krążki dla jednej polaryzacji: obiekty jaśniejsze od tła po przemnożeniu przez polarity, okrągłe,
+    o średnicy 1.5-20% krótszego boku obrazu; zostaje największa grupa obiektów o zbliżonej wielkości.
+    Zwraca (środki, promienie px, etykiety, numery etykiet, polaryzacja) albo None.
+    """
+    work = (smooth - background) * polarity
+    top = np.percentile(work, 99.9)
+    if top < MIN_CONTRAST:
+        return None
+    mask = ndimage.binary_fill_holes(ndimage.binary_opening(work > 0.6 * top, iterations=2))
+    labels, n = ndimage.label(mask)
+    if n == 0:
+        return None
+    idx = np.arange(1, n + 1)
+    area = ndimage.sum(mask, labels, idx)
+    slices = ndimage.find_objects(labels)
+    h = np.array([s[0].stop - s[0].start for s in slices], dtype=float)
+    w = np.array([s[1].stop - s[1].start for s in slices], dtype=float)
+    side = min(smooth.shape)
+    fill = area / (h * w)
+    # Koło wypełnia ~π/4 prostokąta otaczającego; średnica 1.5-20% krótszego boku obrazu
+    ok = (fill > 0.65) & (fill < 0.92) & (h / w > 0.75) & (h / w < 1.33) & \
+         (np.maximum(h, w) > 0.015 * side) & (np.maximum(h, w) < 0.2 * side)
+    if not ok.any():
+        return None
+    radii = np.sqrt(area[ok] / np.pi)
+    # Wszystkie krążki mają ten sam rozmiar fizyczny - największa grupa obiektów o promieniach w granicach tolerancji
+    close = np.abs(radii[:, None] / radii[None, :] - 1) < SAME_SIZE_TOL
+    same = close[np.argmax(close.sum(axis=1))]
+    centers = np.array(ndimage.center_of_mass(mask, labels, idx[ok][same]))
+    return centers, radii[same], labels, idx[ok][same], polarity
+
+def find_disks(img):
+    """
+    Krążki = obiekty o skrajnej jasności (białe przy świetle odbitym, ciemne przy przechodzącym), okrągłe i o
+    jednakowej wielkości. Sprawdzamy obie polaryzacje: przy złej wykrywane są strefy, które różnią się wielkością,
+    a każda zawiera swój krążek - wygrywa polaryzacja z większą liczbą jednakowych obiektów, przy remisie mniejszych.
+    Zwraca (środki [y, x], promienie px, etykiety, numery etykiet krążków, polaryzacja +1 / -1).
+    """
+    smooth = ndimage.gaussian_filter(img, 1.0)
+    background = np.median(smooth)
+    found = [b for b in (_disk_blobs(smooth, background, p) for p in (1.0, -1.0)) if b is not None]
+    if not found:
+        return np.empty((0, 2)), np.empty(0), None, None, 1.0
+    return min(found, key=lambda b: (-len(b[1]), np.median(b[1])))
+
+def radial_profiles(img, center, r_max, exclude=None, n_sectors=N_SECTORS):
+    """
+    Średnia jasność w pierścieniach 1 px dla n_sectors sektorów kątowych wokół center - jedno wywołanie
+    ndimage.mean z etykietami sektor x pierścień. Zwraca tablicę (n_sectors, r_max); NaN = brak pikseli.
+    exclude: maska pikseli pomijanych (np. inne krążki).
+    """
+    cy, cx = center
+    r_max = int(np.ceil(r_max))
+    y0, y1 = max(0, int(cy) - r_max), min(img.shape[0], int(cy) + r_max + 1)
+    x0, x1 = max(0, int(cx) - r_max), min(img.shape[1], int(cx) + r_max + 1)
+    yy, xx = np.mgrid[y0:y1, x0:x1]
+    rbin = np.hypot(yy - cy, xx - cx).astype(int)
+    sector = ((np.arctan2(yy - cy, xx - cx) + np.pi) / (2 * np.pi) * n_sectors).astype(int) % n_sectors
+    labels = sector * r_max + rbin + 1
+    labels[rbin >= r_max] = 0
+    if exclude is not None:
+        labels[exclude[y0:y1, x0:x1]] = 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        prof = ndimage.mean(img[y0:y1, x0:x1], labels, np.arange(1, n_sectors * r_max + 1))
+    return np.asarray(prof, dtype=float).reshape(n_sectors, r_max)
+
+def _crossing(rel, half, offset):
+    """Pierwsze przejście rel >= half w każdym wierszu (interpolacja liniowa między środkami pierścieni); NaN gdy brak."""
+    crossed = rel >= half[:, None]
+    k = np.argmax(crossed, axis=1)
+    rows = np.arange(len(rel))
+    prev, cur = rel[rows, np.maximum(k - 1, 0)], rel[rows, k]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where((k > 0) & (cur != prev), (half - prev) / (cur - prev), 0.5)
+    # Pierścień k obejmuje promienie [k, k + 1) - jego środek to k + 0.5
+    edge = offset + k - 0.5 + np.clip(np.nan_to_num(frac), 0, 1)
+    return np.where(crossed.any(axis=1), edge, np.nan)
+
+def disk_radius(img, center, r_rough, polarity):
+    """Promień krążka (px) z profilu radialnego: przejście w połowie między środkiem krążka a otoczeniem."""
+    prof = radial_profiles(img, center, r_rough * 1.8) * polarity
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        plateau = np.nanmedian(prof[:, :max(1, int(r_rough * 0.6))], axis=1)
+        outside = np.nanmedian(prof[:, int(r_rough * 1.35):], axis=1)
+    # Od środka na zewnątrz jasność spada: szukamy przejścia (plateau - p) >= połowa kontrastu
+    edges = _crossing(plateau[:, None] - prof, (plateau - outside) / 2, 0)
+    r = np.nanmedian(edges) if np.isfinite(edges).any() else np.nan
+    return float(r) if np.isfinite(r) and 0.7 * r_rough < r < 1.4 * r_rough else float(r_rough)
+
+def zone_radius(img, center, r_disk, r_max, polarity, exclude=None):
+    """
+    Promień strefy zahamowania (px). W każdym sektorze granica = pierwsze przejście w połowie między jasnością
+    tuż za krążkiem a jasnością murawy (zewnętrzne 30% zakresu); wynik = mediana sektorów (odporna na sąsiednie
+    strefy i krążki). Strefa leży po przeciwnej stronie tła niż krążek (ciemniejsza od murawy przy białym krążku) -
+    sektory bez takiego kontrastu (tylko rozmyty brzeg krążka) = brak strefy, promień krążka.
+    """
+    prof = radial_profiles(img, center, r_max, exclude) * polarity
+    start = int(np.ceil(r_disk * 1.15 + 2))
+    p = prof[:, start:]
+    if p.shape[1] < 6:
+        return r_disk
+    # Wygładzenie wzdłuż promienia z pominięciem NaN (brzeg obrazu, wykluczone piksele)
+    finite = np.isfinite(p)
+    p = ndimage.uniform_filter1d(np.where(finite, p, 0.0), 3, axis=1) / \
+        np.maximum(ndimage.uniform_filter1d(finite.astype(float), 3, axis=1), 1e-9)
+    p[~finite] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        inner = np.nanmedian(p[:, :3], axis=1)
+        outer = np.nanmedian(p[:, int(p.shape[1] * 0.7):], axis=1)
+    valid = np.isfinite(inner) & np.isfinite(outer)
+    if not valid.any():
+        return np.nan
+    # Po polaryzacji krążek jest "jasny": strefa ciemniejsza od murawy -> kontrast outer - inner > 0
+    contrast = outer - inner
+    edges = _crossing(p - inner[:, None], contrast / 2, start)
+    has_zone = valid & (contrast >= MIN_CONTRAST) & np.isfinite(edges)
+    edges = np.where(has_zone, edges, r_disk)
+    return float(max(np.median(edges[valid]), r_disk))
+
+def measure_plate(path, work_size=WORK_SIZE):
+    """
+    Pomiar jednej płytki: wykrycie krążków, kalibracja mm/px z mediany ich promieni, średnica strefy przy każdym
+    krążku. Krążki numerowane w kolejności czytania (wiersze z góry, w wierszu od lewej).
+    Zwraca (DataFrame wierszy, lista komunikatów).
+    """
+    name = os.path.basename(path)
+    img = load_image(path, work_size)
+    centers, radii, labels, disk_ids, polarity = find_disks(img)
+    if len(radii) == 0:
+        return pd.DataFrame(), [f"{name}: nie wykryto krążków"]
+    radii = np.array([disk_radius(img, c, r, polarity) for c, r in zip(centers, radii)])
+    r_disk = float(np.median(radii))
+    mm_per_px = DISK_MM / (2 * r_disk)
+    field_mm = mm_per_px * max(img.shape)
+    if not FIELD_MM[0] <= field_mm <= FIELD_MM[1]:
+        return pd.DataFrame(), [f"{name}: nieprawdopodobna kalibracja ({mm_per_px:.3f} mm/px, kadr {field_mm:.0f} mm) - "
+                                f"krążki {DISK_MM:g} mm nie zostały rozpoznane, pomiar pominięty"]
+    # Piksele krążków (z marginesem) pomijane w profilach; własny krążek leży wewnątrz promienia startowego profilu
+    disk_mask = ndimage.binary_dilation(np.isin(labels, disk_ids), iterations=2)
+
+    # Kolejność czytania: nowy wiersz, gdy kolejny (wg y) krążek jest niżej o więcej niż średnicę krążka
+    by_y = np.argsort(centers[:, 0])
+    row_key = np.empty(len(centers))
+    row_key[by_y] = np.cumsum(np.r_[0, np.diff(centers[by_y, 0]) > 2 * r_disk])
+    order = np.lexsort((centers[:, 1], row_key))
+    r_max = (MAX_ZONE_MM / 2) / mm_per_px
+    rows, messages = [], []
+    for k, i in enumerate(order, start=1):
+        r_zone = zone_radius(img, centers[i], radii[i], r_max, polarity, exclude=disk_mask)
+        if not np.isfinite(r_zone):
+            messages.append(f"{name}: krążek {k} - brak profilu strefy")
+        rows.append({"Krążek": k, "Srednica_mm": round(2 * r_zone * mm_per_px, 1) if np.isfinite(r_zone) else np.nan,
+                     "x_px": round(centers[i][1], 1), "y_px": round(centers[i][0], 1), "mm/px": mm_per_px})
+    df = pd.DataFrame(rows)
+    stem = os.path.splitext(name)[0]
+    df.insert(0, "Plytka", stem)
+    df.insert(0, "Arkusz", "zdjęcie")
+    df.insert(0, "Plik", name)
+    return df, messages
+
+def _normalize_manifest(manifest):
+    """Ujednolicone kolumny opisu płytek (Plik = sama nazwa pliku, Krążek liczbowo); None, gdy brak wymaganych kolumn."""
+    if manifest is None:
+        return None
+    man = loader.normalize_columns(manifest.copy())
+    man = man.rename(columns={c: "Krążek" for c in man.columns if loader._norm_name(c) in ("krazek", "disk", "pozycja", "position")})
+    man = man.rename(columns={c: "Plik" for c in man.columns if loader._norm_name(c) in ("plik", "file", "zdjecie", "image")})
+    if not {"Plik", "Krążek", "Grupa"} <= set(man.columns):
+        return None
+    man["Plik"] = man["Plik"].astype(str).map(os.path.basename)
+    man["Krążek"] = pd.to_numeric(man["Krążek"], errors="coerce")
+    return man
+
+def apply_manifest(df, manifest):
+    """
+    Opis płytek (Plik, Krążek, Grupa, opcjonalnie Bakterie) -> kolumny Bakterie / Grupa.
+    Bez opisu: Bakterie = nazwa zdjęcia, Grupa = "Krążek k".
+    """
+    df = df.copy()
+    df["Bakterie"] = df["Plytka"]
+    df["Grupa"] = "Krążek " + df["Krążek"].astype(str)
+    man = _normalize_manifest(manifest)
+    if man is None or man.empty:
+        return df
+    key = pd.MultiIndex.from_arrays([df["Plik"], df["Krążek"]])
+    man_idx = pd.MultiIndex.from_arrays([man["Plik"], man["Krążek"]])
+    pos = man_idx.get_indexer(key) if man_idx.is_unique else np.full(len(df), -1)
+    hit = pos >= 0
+    df.loc[hit, "Grupa"] = man["Grupa"].to_numpy()[pos[hit]]
+    if "Bakterie" in man.columns:
+        df.loc[hit, "Bakterie"] = man["Bakterie"].to_numpy()[pos[hit]]
+    return df
+
+def load_manifest(path):
+    """Opis płytek (CSV / Excel, pierwszy arkusz): Plik, Krążek, Grupa, opcjonalnie Bakterie. Zwraca (df, error_msg)."""
+    try:
+        if os.path.splitext(path)[1].lower() in loader.EXCEL_EXTENSIONS:
+            man = pd.read_excel(path)
+        else:
+            man = pd.read_csv(path, sep=None, engine="python")
+    except Exception as e:
+        return None, f"Nie udało się wczytać opisu płytek: {e}"
+    if _normalize_manifest(man) is None:
+        return None, "Brak kolumn w opisie płytek: wymagane Plik, Krążek, Grupa."
+    return man, None
+
+def measure_plates(paths, manifest=None, max_workers=None, work_size=WORK_SIZE):
+    """
+    Pomiar wielu zdjęć płytek w puli procesów (jak loader.load_workbooks). Zwraca (df, komunikaty) w schemacie
+    Bakterie / Grupa / Srednica_mm (+ Plik, Arkusz, Plytka, Krążek, kalibracja); df = None, gdy nic nie zmierzono.
+    """
+    files = expand_paths(paths)
+    if not files:
+        return None, ["Nie znaleziono zdjęć płytek (PNG / JPEG / TIFF)."]
+
+    results, messages = {}, []
+    workers = min(len(files), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(measure_plate, f, work_size): f for f in files}
+                for fut in as_completed(futures):
+                    try:
+                        results[futures[fut]] = fut.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        messages.append(f"{os.path.basename(futures[fut])}: {e}")
+        except (BrokenProcessPool, OSError) as e:
+            print(f"Warning: Pula procesów niedostępna ({e}), pomiar sekwencyjny.")
+            results, messages = {}, []
+            workers = 1
+    if workers <= 1:
+        for f in files:
+            try:
+                results[f] = measure_plate(f, work_size)
+            except Exception as e:
+                messages.append(f"{os.path.basename(f)}: {e}")
+
+    frames = []
+    for f in files:
+        if f in results:
+            if not results[f][0].empty: frames.append(results[f][0])
+            messages.extend(results[f][1])
+    if not frames:
+        return None, messages or ["Nie zmierzono żadnej strefy."]
+    df = apply_manifest(pd.concat(frames, ignore_index=True), manifest)
+    cols = ["Plik", "Arkusz", "Plytka", "Bakterie", "Grupa", "Srednica_mm", "Krążek", "x_px", "y_px", "mm/px"]
+    return df[cols], messages
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BioStat Master - pomiar średnic stref zahamowania ze zdjęć płytek.")
+    parser.add_argument("paths", nargs="+", help="zdjęcia płytek lub foldery ze zdjęciami")
+    parser.add_argument("--manifest", help="opis płytek (CSV / Excel): Plik, Krążek, Grupa[, Bakterie]")
+    parser.add_argument("--out", default="pomiary_plytek.xlsx", help="plik wynikowy (xlsx) do wczytania w BioStat Master")
+    parser.add_argument("--workers", type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    args = parser.parse_args()
+
+    manifest = None
+    if args.manifest:
+        manifest, err = load_manifest(args.manifest)
+        if err: raise SystemExit(err)
+    df, messages = measure_plates(args.paths, manifest, args.workers)
+    for msg in messages: print(msg)
+    if df is None: raise SystemExit(1)
+    if manifest is None:
+        print("Uwaga: bez opisu płytek (--manifest) każde zdjęcie to osobny szczep z jednym pomiarem na krążek.")
+    df.drop(columns=["Plik", "Arkusz"]).to_excel(args.out, index=False)
+    print(f"Zapisano {len(df)} pomiarów z {df['Plik'].nunique()} zdjęć -> {args.out}")
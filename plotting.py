@@ -1,23 +1,85 @@
 import matplotlib.pyplot as plt
+from matplotlib.patches import Patch
+from matplotlib.colors import LogNorm, TwoSlopeNorm
 import seaborn as sns
 import pandas as pd
 import numpy as np
 from scipy import stats
+from scipy.cluster.hierarchy import dendrogram
+from scipy.spatial.distance import squareform
 import utils
+import doseresponse
+import effectsize
+import clustering
+import rendercache
+import breakpoints
+
+# Domyślne ustawienia wykresów (GUI i tryb bez okna)
+DEFAULT_CONFIG = {
+    "font_labels": 10, "font_title": 12, "axis_max": 0, "star_offset": 0.03, "bar_width": 0.8,
+    "show_disk_line": True, "palette": "viridis", "transparent_background": True,
+    "plot_type": "Barplot (Słupkowy)", "error_bar": "SD (Odchylenie Std.)", "show_points": False,
+    "ci_method": "Analityczny (t)", "pca_view": "Punkty (PC1 vs PC2)",
+    "cluster_metric": "euclidean", "cluster_method": "average",
+    "mic_model": "Log-liniowy", "mic_target": 6.0, "orientation": "Pozioma",
+    "study_correction": "Brak", "pvalue_order": "Alfabetycznie"
+}
+
+# Mapa p-value: limity dla dużych macierzy (setki grup)
+PVALUE_MAX_INCHES = 14      # maks. bok figury
+PVALUE_ANNOT_ALL_MAX = 25   # do tylu grup opisujemy każdą komórkę
+PVALUE_ANNOT_SIG_MAX = 300  # powyżej - tylko pary istotne, o ile jest ich nie więcej niż tyle
+PVALUE_MAX_TICKS = 60       # maks. liczba etykiet na osi
+PVALUE_MIN_CELL_INCHES = 0.3  # mniejszych komórek nie opisujemy
+
+# Renderowanie progresywne: szybki podgląd, potem pełna jakość w tle
+SCREEN_DPI = 100            # pełny render do wyświetlenia w zakładce
+PREVIEW_DPI = 40            # podgląd (szkic)
+PREVIEW_MAX_POINTS = 400    # maks. liczba punktów pomiarowych w podglądzie
 
 class Plotter:
-    def __init__(self, config):
+    def __init__(self, config, preview=False):
         """
         Inicjalizacja z konfiguracją wykresów.
         config: dict z ustawieniami (font_labels, palette, etc.)
+        preview: tryb szkicu - bez KDE (violin -> box), bez opisów komórek / wartości, z przerzedzonymi punktami
         """
         self.config = config
+        self.preview = preview
     
     def update_config(self, new_config):
         self.config = new_config
 
-    def draw_bar_plot(self, df, bact, ref, sig_set):
-        plt.close('all') 
+    def draft(self):
+        """Plotter szkicu (ta sama konfiguracja) do szybkiego podglądu."""
+        return Plotter(self.config, preview=True)
+
+    def snapshot(self):
+        """Plotter z kopią bieżącej konfiguracji - render w tle nie widzi zmian wprowadzanych w oknie ustawień."""
+        return Plotter(dict(self.config), preview=self.preview)
+
+    @staticmethod
+    def render_png(fig, dpi=SCREEN_DPI):
+        """Rasteryzacja figury do PNG przez Agg (bez Tk - można wywołać w wątku roboczym), przez wspólny cache."""
+        return rendercache.render(fig, "png", dpi)
+
+    @staticmethod
+    def _palette_colors(pal, n):
+        try:
+            return sns.color_palette(pal, n_colors=n)
+        except ValueError as e:
+            print(f"Warning: Palette '{pal}' error: {e}. Using magma.")
+            return sns.color_palette("magma", n_colors=n)
+
+    @staticmethod
+    def _category_handles(categories):
+        """Legenda kategorii S / I / R obecnych na wykresie."""
+        present = set(categories)
+        return [Patch(facecolor=c, edgecolor='black', label=breakpoints.CATEGORY_LABELS[k])
+                for k, c in breakpoints.CATEGORY_COLORS.items() if k in present]
+
+    def draw_bar_plot(self, df, bact, ref, sig_set, categories=None):
+        """categories: opcjonalnie {grupa: 'S' / 'I' / 'R'} - kolor słupka / pudełka wg kategorii klinicznej."""
         is_horiz = False 
         
         is_horiz = (self.config.get("orientation", "Pozioma") == "Pozioma")
@@ -36,11 +98,8 @@ class Plotter:
         plot_type = self.config["plot_type"]
         error_bar_choice = self.config["error_bar"]
         show_points = self.config["show_points"]
-
-        if "SD" in error_bar_choice: sb_error = "sd"
-        elif "SEM" in error_bar_choice: sb_error = "se"
-        elif "95% CI" in error_bar_choice: sb_error = ("ci", 95)
-        else: sb_error = "sd"
+        if self.preview and "Violinplot" in plot_type:
+            plot_type = "Boxplot (Pudełkowy)"  # szkic bez estymacji KDE
 
         h = max(6, len(order)*0.4) if is_horiz else 6
         w = 8 if is_horiz else max(8, len(order)*0.3)
@@ -48,45 +107,68 @@ class Plotter:
         fig = plt.Figure(figsize=(w, h), dpi=100)
         ax = fig.add_subplot(111)
         
-        means = df.groupby('Grupa')['Srednica_mm'].mean()
-        sds = df.groupby('Grupa')['Srednica_mm'].std().fillna(0)
-        sems = df.groupby('Grupa')['Srednica_mm'].sem().fillna(0)
-        maxs = df.groupby('Grupa')['Srednica_mm'].max()
+        # Jedna tabela podsumowań zamiast wielokrotnej agregacji (groupby + seaborn)
+        summary = utils.summarize_groups(df).reindex(order)
+        means = summary['mean']
+        maxs = summary['max']
+        pos = np.arange(len(order))
+        colors = self._palette_colors(pal, len(order))
+        categories = {g: c for g, c in (categories or {}).items() if c in breakpoints.CATEGORY_COLORS and g in order}
+        if categories:
+            colors = [breakpoints.CATEGORY_COLORS[categories[g]] if g in categories else colors[i] for i, g in enumerate(order)]
         
         if "Barplot" in plot_type:
-            if is_horiz:
-                sns.barplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, capsize=0.2, errorbar=sb_error, palette=pal, orient='h', edgecolor='black', hue='Grupa', legend=False)
-                if show_points: sns.stripplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, color='black', alpha=0.6, jitter=True, size=4)
-            else:
-                sns.barplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, capsize=0.2, errorbar=sb_error, palette=pal, orient='v', edgecolor='black', hue='Grupa', legend=False)
-                if show_points: sns.stripplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, color='black', alpha=0.6, jitter=True, size=4)
+            summary = utils.add_error_bounds(summary, error_bar_choice, self.config.get("ci_method", "Analityczny (t)"), df=df)
+            err = np.vstack([means - summary['err_lo'], summary['err_hi'] - means])
+            
+            bar_w = self.config.get("bar_width", 0.8)
+            err_kw = dict(ecolor='.26', elinewidth=1.5, capsize=4)
+            if is_horiz: ax.barh(pos, means, height=bar_w, xerr=err, color=colors, edgecolor='black', error_kw=err_kw)
+            else: ax.bar(pos, means, width=bar_w, yerr=err, color=colors, edgecolor='black', error_kw=err_kw)
             
-            if "SD" in error_bar_choice: ref_points = means + sds
-            elif "SEM" in error_bar_choice: ref_points = means + sems
-            elif "95% CI" in error_bar_choice: ref_points = means + (1.96 * sems) 
-            else: ref_points = means + sds
+            ref_points = summary['err_hi']
             max_val_data = ref_points.max()
 
         elif "Boxplot" in plot_type:
-            if is_horiz:
-                sns.boxplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, palette=pal, orient='h', hue='Grupa', legend=False)
-                if show_points: sns.stripplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, color='black', alpha=0.6, jitter=True, size=4)
-            else:
-                sns.boxplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, palette=pal, orient='v', hue='Grupa', legend=False)
-                if show_points: sns.stripplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, color='black', alpha=0.6, jitter=True, size=4)
+            box_stats = [{"med": r['median'], "q1": r['q1'], "q3": r['q3'], "whislo": r['whislo'], "whishi": r['whishi'], "fliers": r['fliers']}
+                         for _, r in summary.iterrows()]
+            bp = ax.bxp(box_stats, positions=pos, widths=0.8, patch_artist=True, 
+                        orientation='horizontal' if is_horiz else 'vertical',
+                        medianprops=dict(color='.26'), flierprops=dict(marker='d', markerfacecolor='.26', markersize=4))
+            for patch, c in zip(bp['boxes'], colors): patch.set_facecolor(c)
             max_val_data = maxs.max()
             ref_points = maxs 
 
         elif "Violinplot" in plot_type:
+            # KDE wymaga surowych pomiarów - tu zostajemy przy seaborn
+            violin_pal = dict(zip(order, colors)) if categories else pal
             if is_horiz:
-                sns.violinplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, palette=pal, orient='h', inner="stick", hue='Grupa', legend=False)
-                if show_points: sns.stripplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, color='black', alpha=0.6, jitter=True, size=4)
+                sns.violinplot(x='Srednica_mm', y='Grupa', data=df, order=order, ax=ax, palette=violin_pal, orient='h', inner="stick", hue='Grupa', legend=False)
             else:
-                sns.violinplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, palette=pal, orient='v', inner="stick", hue='Grupa', legend=False)
-                if show_points: sns.stripplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, color='black', alpha=0.6, jitter=True, size=4)
+                sns.violinplot(x='Grupa', y='Srednica_mm', data=df, order=order, ax=ax, palette=violin_pal, orient='v', inner="stick", hue='Grupa', legend=False)
             max_val_data = maxs.max()
             ref_points = maxs
 
+        if show_points:
+            # Punkty pomiarowe (surowe wiersze) z deterministycznym rozrzutem
+            codes = pd.Categorical(df['Grupa'], categories=order).codes
+            keep = codes >= 0
+            jitter = np.random.default_rng(0).uniform(-0.2, 0.2, keep.sum())
+            cat_pos = codes[keep] + jitter
+            vals = df['Srednica_mm'].values[keep]
+            if self.preview and len(vals) > PREVIEW_MAX_POINTS:
+                thin = np.random.default_rng(0).choice(len(vals), PREVIEW_MAX_POINTS, replace=False)
+                cat_pos, vals = cat_pos[thin], vals[thin]
+            if is_horiz: ax.scatter(vals, cat_pos, color='black', alpha=0.6, s=16, zorder=3)
+            else: ax.scatter(cat_pos, vals, color='black', alpha=0.6, s=16, zorder=3)
+
+        if is_horiz:
+            ax.set_yticks(pos, labels=order)
+            ax.set_ylim(len(order) - 0.5, -0.5)
+        else:
+            ax.set_xticks(pos, labels=order)
+            ax.set_xlim(-0.5, len(order) - 0.5)
+
         if ax_max > 0: final_limit = ax_max
         else: final_limit = max_val_data * 1.15
 
@@ -105,9 +187,12 @@ class Plotter:
             ax.set_ylabel("Średnica strefy (mm)", fontsize=f_ttl)
             ax.set_xlabel("", fontsize=f_ttl)
 
-        if show_line: ax.legend(loc='upper right')
+        if categories:
+            handles = ax.get_legend_handles_labels()[0] + self._category_handles(categories.values())
+            ax.legend(handles=handles, loc='upper right', fontsize=max(f_lbl - 1, 6))
+        elif show_line: ax.legend(loc='upper right')
 
-        offset_val = df['Srednica_mm'].max() * s_off
+        offset_val = maxs.max() * s_off
         for i, g in enumerate(order):
             if g in sig_set:
                 try:
@@ -122,7 +207,7 @@ class Plotter:
         return fig
 
     def draw_heatmap(self, df, bact):
-        df_mean = df.groupby('Grupa')['Srednica_mm'].mean().sort_values(ascending=False)
+        df_mean = utils.summarize_groups(df)['mean'].sort_values(ascending=False)
         data = df_mean.to_frame(name="Średnica (mm)")
         h = max(6, len(data) * 0.4) 
         fig = plt.Figure(figsize=(8, h), dpi=100) 
@@ -130,10 +215,10 @@ class Plotter:
         
         pal = self.config["palette"]
         try: 
-            sns.heatmap(data, annot=True, fmt=".1f", cmap=pal, ax=ax, linewidths=1, linecolor='white')
+            sns.heatmap(data, annot=not self.preview, fmt=".1f", cmap=pal, ax=ax, linewidths=1, linecolor='white')
         except ValueError as e: 
             print(f"Warning: Palette '{pal}' error: {e}. Using magma.")
-            sns.heatmap(data, annot=True, fmt=".1f", cmap="magma", ax=ax, linewidths=1, linecolor='white')
+            sns.heatmap(data, annot=not self.preview, fmt=".1f", cmap="magma", ax=ax, linewidths=1, linecolor='white')
         
         ax.set_title(f"Mapa aktywności: {bact}", fontsize=self.config["font_title"]+2)
         ax.tick_params(axis='both', labelsize=self.config["font_labels"])
@@ -141,45 +226,94 @@ class Plotter:
         fig.tight_layout()
         return fig
 
+    @staticmethod
+    def pvalue_matrix(export_stats_posthoc):
+        """
+        Kwadratowa macierz p-value (nazwy grup, ndarray G x G, 1 na przekątnej) z tabeli post-hoc:
+        format Tukeya / Games-Howella (group1, group2, p-adj) budowany wektorowo przez indeksy grup, albo macierz Dunna.
+        """
+        if 'group1' in export_stats_posthoc.columns: # Tukey / Games-Howell
+            df_res = export_stats_posthoc
+            groups = sorted(set(df_res['group1']) | set(df_res['group2']))
+            index = pd.Index(groups)
+            i, j = index.get_indexer(df_res['group1']), index.get_indexer(df_res['group2'])
+            p = np.ones((len(groups), len(groups)))
+            p[i, j] = p[j, i] = df_res['p-adj'].to_numpy(dtype=float)
+        else: # Dunn
+            groups = list(export_stats_posthoc.index)
+            p = export_stats_posthoc.to_numpy(dtype=float, copy=True)
+        np.fill_diagonal(p, 1.0)
+        return groups, p
+
+    @staticmethod
+    def pvalue_order(groups, p, mode):
+        """Kolejność grup na mapie: alfabetyczna, wg substancji i stężenia, albo klastrowanie (odległość 1 - p)."""
+        if mode == "Klastrowanie" and len(groups) > 2:
+            d = squareform(np.clip(1.0 - np.nan_to_num(p, nan=1.0), 0, 1), checks=False)
+            return clustering.cluster_rows(d, "average")[1]
+        if mode == "Substancja":
+            return np.array(sorted(range(len(groups)), key=lambda k: utils.smart_sort_key(str(groups[k]))))
+        return np.array(sorted(range(len(groups)), key=lambda k: str(groups[k])))
+
     def draw_pvalue_heatmap(self, export_stats_posthoc, bact):
+        """
+        Mapa istotności par (dolny trójkąt). Jeden obiekt graficzny (imshow) niezależnie od liczby grup;
+        wartości opisane wszystkie tylko dla małych macierzy, przy dużych - tylko pary istotne (o ile jest ich niewiele).
+        """
         if export_stats_posthoc is None:
             return None
 
-        p_matrix = None
-        if 'group1' in export_stats_posthoc.columns: # Tukey
-            df_res = export_stats_posthoc
-            groups = sorted(list(set(df_res['group1']) | set(df_res['group2'])))
-            p_matrix = pd.DataFrame(index=groups, columns=groups, dtype=float)
-            np.fill_diagonal(p_matrix.values, 1.0) 
-            for _, row in df_res.iterrows():
-                g1, g2 = row['group1'], row['group2']
-                pval = row['p-adj']
-                p_matrix.at[g1, g2] = pval
-                p_matrix.at[g2, g1] = pval
-        else: # Dunn
-            p_matrix = export_stats_posthoc.copy()
-            np.fill_diagonal(p_matrix.values, 1.0)
-
-        if p_matrix is None: return None
+        groups, p = self.pvalue_matrix(export_stats_posthoc)
+        order = self.pvalue_order(groups, p, self.config.get("pvalue_order", "Alfabetycznie"))
+        groups = [groups[k] for k in order]
+        p = p[np.ix_(order, order)]
+        G = len(groups)
 
-        h = max(6, len(p_matrix) * 0.5)
-        w = max(8, len(p_matrix) * 0.5)
-        fig = plt.Figure(figsize=(w, h), dpi=100)
+        side = min(max(6, G * 0.5), PVALUE_MAX_INCHES)
+        fig = plt.Figure(figsize=(side + 2, side), dpi=100)
         ax = fig.add_subplot(111)
-        
-        mask = np.triu(np.ones_like(p_matrix, dtype=bool))
-        sns.heatmap(p_matrix, mask=mask, annot=True, fmt=".3f", 
-                    cmap="RdBu_r", center=0.05, vmin=0, vmax=1,
-                    ax=ax, linewidths=1, linecolor='white',
-                    cbar_kws={'label': 'P-value (Istotność)'})
+
+        lower = np.tril(np.ones((G, G), dtype=bool), k=-1)
+        img = ax.imshow(np.ma.masked_where(~lower | np.isnan(p), p), cmap="RdBu_r",
+                        norm=TwoSlopeNorm(vmin=0, vcenter=0.05, vmax=1), interpolation="nearest", aspect="auto")
+        fig.colorbar(img, ax=ax, label='P-value (Istotność)')
+        for spine in ax.spines.values(): spine.set_visible(False)
+
+        # Opisy komórek: wszystkie (mała macierz) albo tylko istotne - o ile jest ich niewiele i komórki są czytelne
+        rows, cols = np.nonzero(lower & np.isfinite(p))
+        if G > PVALUE_ANNOT_ALL_MAX:
+            sig = p[rows, cols] < 0.05
+            readable = sig.sum() <= PVALUE_ANNOT_SIG_MAX and side / G >= PVALUE_MIN_CELL_INCHES
+            rows, cols = (rows[sig], cols[sig]) if readable else (rows[:0], cols[:0])
+        if self.preview:
+            rows, cols = rows[:0], cols[:0]
+        if G <= PVALUE_ANNOT_ALL_MAX:
+            # Siatka komórek jako dwie kolekcje linii (nie osobne ticki na każdą komórkę)
+            edges = np.arange(G + 1) - 0.5
+            ax.hlines(edges, -0.5, G - 0.5, color="white", linewidth=1)
+            ax.vlines(edges, -0.5, G - 0.5, color="white", linewidth=1)
+        if len(rows):
+            fs = int(np.clip(side * 0.75 / G * 72 / 3.5, 5, 10))  # ~5 znaków na szerokość komórki
+            for r, c in zip(rows, cols):
+                v = p[r, c]
+                ax.text(c, r, f"{v:.3f}", ha="center", va="center", fontsize=fs,
+                        color="white" if (v < 0.01 or v > 0.6) else "black")
+
+        # Etykiety osi: przy setkach grup co k-ta, żeby pozostały czytelne
+        step = max(1, int(np.ceil(G / PVALUE_MAX_TICKS)))
+        ticks = np.arange(0, G, step)
+        labels = [str(groups[k]) for k in ticks]
+        tick_fs = min(self.config["font_labels"], max(5, int(600 / max(len(ticks), 1))))
+        ax.set_xticks(ticks)
+        ax.set_xticklabels(labels, fontsize=tick_fs, rotation=45 if len(ticks) <= 30 else 90, ha="right" if len(ticks) <= 30 else "center")
+        ax.set_yticks(ticks)
+        ax.set_yticklabels(labels, fontsize=tick_fs)
 
         ax.set_title(f"Mapa Istotności (P-value): {bact}", fontsize=self.config["font_title"]+2)
-        ax.tick_params(axis='both', labelsize=self.config["font_labels"])
-        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
         fig.tight_layout()
         return fig
 
-    def draw_trend(self, df, bact, mic_data=None):
+    def draw_trend(self, df, bact, mic_data=None, curve_fits=None):
         f_lbl = self.config["font_labels"]
         f_ttl = self.config["font_title"]
         pal = self.config["palette"]
@@ -199,7 +333,24 @@ class Plotter:
         fig = plt.Figure(figsize=(8, 6), dpi=100)
         ax = fig.add_subplot(111)
         
-        sns.lineplot(data=df_trend, x="Stężenie", y="Średnica", hue="Substancja", style="Substancja", markers=True, dashes=False, ax=ax, err_style="band", palette=pal)
+        # Średnie + pasmo 95% CI z tego samego dostawcy CI co słupki błędów (bez bootstrapu przy każdym odświeżeniu)
+        keys = ['Substancja', 'Stężenie']
+        summary = utils.summarize_groups(df_trend, keys, value='Średnica')
+        summary = utils.add_error_bounds(summary, "95% CI", self.config.get("ci_method", "Analityczny (t)"), df=df_trend, by=keys, value='Średnica')
+        summary = summary.reset_index().sort_values(keys)
+        
+        substances = list(pd.unique(df_trend['Substancja']))
+        colors = self._palette_colors(pal, len(substances))
+        markers = ['o', 'X', 's', 'P', 'D', '^', 'v', '<', '>', 'p', '*', 'h']
+        for i, sub in enumerate(substances):
+            s_sum = summary[summary['Substancja'] == sub]
+            ax.plot(s_sum['Stężenie'], s_sum['mean'], color=colors[i], marker=markers[i % len(markers)], label=sub)
+            ax.fill_between(s_sum['Stężenie'], s_sum['err_lo'], s_sum['err_hi'], color=colors[i], alpha=0.2, linewidth=0)
+            # Dopasowana krzywa 4PL (jeśli wybrano model nieliniowy)
+            if curve_fits and sub in curve_fits:
+                x_grid = np.geomspace(s_sum['Stężenie'].min(), s_sum['Stężenie'].max(), 200)
+                ax.plot(x_grid, doseresponse.predict_4pl(curve_fits[sub], np.log(x_grid)), color=colors[i], linestyle='--', alpha=0.9)
+        ax.legend(title="Substancja")
         ax.set_title(f"Zależność Dawka-Odpowiedź: {bact}", fontsize=f_ttl+2)
         ax.set_ylabel("Średnica strefy (mm)", fontsize=f_ttl)
         unit_label = df_trend['Jednostka'].iloc[0] if not df_trend.empty else ""
@@ -223,9 +374,13 @@ class Plotter:
         if correlations:
             # Dodaj MIC do boxa
             if mic_data:
-                correlations.append("\n[MIC Estimates (D=6mm)]")
+                target = self.config.get("mic_target", 6.0)
+                model = "4PL" if curve_fits else "log-lin"
+                correlations.append(f"\n[MIC Estimates ({model}, D={target:g}mm)]")
                 for sub, res in mic_data.items():
-                    if res and res['MIC']:
+                    if res and res['MIC'] and np.isfinite(res.get('CI Low', np.nan)):
+                        correlations.append(f"{sub}: {res['MIC']:.2f} {res['Unit']} (95% CI {res['CI Low']:.2f}-{res['CI High']:.2f})")
+                    elif res and res['MIC']:
                         correlations.append(f"{sub}: {res['MIC']:.2f} {res['Unit']}")
                     else:
                         correlations.append(f"{sub}: > max conc?")
@@ -234,17 +389,55 @@ class Plotter:
         fig.tight_layout()
         return fig, None
 
+    def draw_mic_heatmap(self, mic_table):
+        """Mapa MIC: Wiersze=Szczepy, Kolumny=Substancje, skala logarytmiczna (szare = brak MIC)."""
+        mic_matrix = mic_table.pivot_table(index='Bakteria', columns='Substancja', values='MIC', aggfunc='first', dropna=False)
+        n_rows, n_cols = mic_matrix.shape
+        data = np.ma.masked_invalid(mic_matrix.values.astype(float))
+        
+        h = min(max(6, n_rows * 0.4), 20)
+        w = min(max(8, n_cols * 0.8 + 3), 20)
+        fig = plt.Figure(figsize=(w, h), dpi=100)
+        ax = fig.add_subplot(111)
+        ax.set_facecolor('#dddddd')
+        
+        norm = LogNorm(vmin=data.min(), vmax=data.max()) if data.count() and data.min() > 0 and data.max() > data.min() else None
+        pal = self.config["palette"]
+        try:
+            im = ax.imshow(data, aspect='auto', cmap=pal, norm=norm, interpolation='nearest')
+        except ValueError as e:
+            print(f"Warning: Palette '{pal}' error: {e}. Using magma.")
+            im = ax.imshow(data, aspect='auto', cmap="magma", norm=norm, interpolation='nearest')
+        units = mic_table['Unit'].dropna().unique()
+        fig.colorbar(im, ax=ax, label=f"MIC ({units[0]})" if len(units) == 1 else "MIC")
+        
+        if n_rows * n_cols <= 400 and not self.preview:
+            for (i, j), v in np.ndenumerate(mic_matrix.values):
+                if np.isfinite(v): ax.text(j, i, f"{v:.2g}", ha='center', va='center', fontsize=self.config["font_labels"] - 1, color='white')
+        
+        ax.set_xticks(np.arange(n_cols), labels=mic_matrix.columns)
+        ax.set_yticks(np.arange(n_rows), labels=mic_matrix.index)
+        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+        ax.tick_params(axis='both', labelsize=self.config["font_labels"])
+        model = "4PL (Hill)" if "4PL" in self.config.get("mic_model", "") else "log-liniowy"
+        ax.set_title(f"Oszacowane MIC (model {model}, D={self.config.get('mic_target', 6.0):g}mm)", fontsize=self.config["font_title"]+2)
+        fig.tight_layout()
+        return fig
+
     def draw_effect_plot(self, posthoc_detailed_results):
         if not posthoc_detailed_results: return None
         
-        sig_results = [r for r in posthoc_detailed_results if r['Significant']]
+        # Miara efektu zależy od testu (Hedges' g / Glass's Δ / Cliff's δ); pary z nieokreślonym efektem pomijamy
+        sig_results = [r for r in posthoc_detailed_results if r['Significant'] and np.isfinite(r['Effect'])]
         
         if not sig_results: return None
 
-        sig_results.sort(key=lambda x: abs(x["Cohen's d"]), reverse=False)
+        sig_results.sort(key=lambda x: abs(x["Effect"]), reverse=False)
 
         labels = [f"{r['Group 1']}\nvs {r['Group 2']}" for r in sig_results]
-        values = [r["Cohen's d"] for r in sig_results]
+        values = [r["Effect"] for r in sig_results]
+        measures = list(dict.fromkeys(r["Effect Measure"] for r in sig_results))
+        bounded = measures == [effectsize.CLIFFS_DELTA]  # Cliff's δ w przedziale [-1, 1]
         colors_list = ['red' if v < 0 else 'green' for v in values]
 
         h = max(6, len(sig_results) * 0.45)
@@ -259,18 +452,21 @@ class Plotter:
 
         ax.set_yticks(y_pos)
         ax.set_yticklabels(labels, fontsize=self.config["font_labels"])
-        ax.set_xlabel("Wielkość Efektu (Cohen's d)", fontsize=self.config["font_title"])
+        ax.set_xlabel(f"Wielkość Efektu ({' / '.join(measures)})", fontsize=self.config["font_title"])
         ax.set_title("Siła różnic między grupami (Istotne statystycznie)", fontsize=self.config["font_title"]+2)
         
-        for i, v in enumerate(values):
-            offset = max(1, abs(v)*0.05) if v >= 0 else -max(1, abs(v)*0.05)
+        step = 0.05 if bounded else max(1, max(abs(v) for v in values) * 0.05)
+        for i, v in enumerate([] if self.preview else values):
+            offset = step if v >= 0 else -step
             ha_align = 'left' if v >= 0 else 'right'
-            ax.text(v + offset, i, f"{v:.1f}", va='center', ha=ha_align, fontsize=9, fontweight='bold')
+            ax.text(v + offset, i, f"{v:.2f}" if bounded else f"{v:.1f}", va='center', ha=ha_align, fontsize=9, fontweight='bold')
+        if bounded: ax.set_xlim(-1.3, 1.3)
 
         fig.tight_layout()
         return fig
 
-    def draw_cross_species(self, df, col_bact_name, selected_substances):
+    def draw_cross_species(self, df, col_bact_name, selected_substances, categories=None):
+        """categories: opcjonalnie {(szczep, grupa): 'S' / 'I' / 'R'} - obramowanie słupka w kolorze kategorii (wypełnienie = grupa)."""
         # Walidacja
         if not selected_substances: return None
 
@@ -291,19 +487,29 @@ class Plotter:
         fig = plt.Figure(figsize=(calc_width, calc_height), dpi=100) 
         ax = fig.add_subplot(111)
         
-        sns.barplot(
-            data=df_cross, 
-            x=col_bact_name, 
-            y='Srednica_mm', 
-            hue='Grupa', 
-            ax=ax, 
-            palette=pal, 
-            capsize=0.04, 
-            errorbar='sd', 
-            edgecolor='black', 
-            linewidth=0.8,
-            width=0.85
-        )
+        # Słupki grupowane rysowane bezpośrednio z tabeli podsumowań (szczep x grupa)
+        summary = utils.summarize_groups(df_cross, [col_bact_name, 'Grupa']).reset_index()
+        bact_order = list(pd.unique(df_cross[col_bact_name]))
+        hue_order = list(pd.unique(df_cross['Grupa']))
+        colors = self._palette_colors(pal, len(hue_order))
+        
+        total_w = 0.85
+        bar_w = total_w / len(hue_order)
+        b_codes = pd.Categorical(summary[col_bact_name], categories=bact_order).codes
+        h_codes = pd.Categorical(summary['Grupa'], categories=hue_order).codes
+        x_pos = b_codes - total_w / 2 + bar_w * (h_codes + 0.5)
+        
+        cats = [(categories or {}).get(k, "") for k in zip(summary[col_bact_name], summary['Grupa'])]
+        edges = [breakpoints.CATEGORY_COLORS.get(c, 'black') for c in cats]
+        ax.bar(x_pos, summary['mean'], width=bar_w, yerr=None if self.preview else summary['sd'], 
+               color=[colors[c] for c in h_codes], edgecolor=edges,
+               linewidth=[2.2 if c in breakpoints.CATEGORY_COLORS else 0.8 for c in cats],
+               error_kw=dict(ecolor='.26', elinewidth=1.2, capsize=2))
+        ax.set_xticks(np.arange(len(bact_order)), labels=bact_order)
+        ax.set_xlim(-0.5, len(bact_order) - 0.5)
+        legend_handles = [Patch(facecolor=colors[i], edgecolor='black', linewidth=0.8, label=g) for i, g in enumerate(hue_order)]
+        legend_handles += [Patch(facecolor='white', edgecolor=h.get_facecolor(), linewidth=2.2, label=h.get_label())
+                           for h in self._category_handles(cats)]
         
         ax.set_title("Porównanie Międzygatunkowe", fontsize=f_ttl+6, fontweight='bold', pad=25)
         ax.set_xlabel("Szczep bakterii", fontsize=f_ttl+2, labelpad=15)
@@ -319,6 +525,7 @@ class Plotter:
         leg_cols = 4 if num_substances > 15 else (3 if num_substances > 6 else 2)
         
         ax.legend(
+            handles=legend_handles,
             loc='upper center', 
             bbox_to_anchor=(0.5, -0.12),
             ncol=leg_cols, 
@@ -337,11 +544,15 @@ class Plotter:
         return fig
 
     def draw_pca(self, pca_data):
-        (pca_df, explained_variance) = pca_data
+        (pca_df, explained_variance, loadings) = pca_data
+        view = self.config.get("pca_view", "Punkty (PC1 vs PC2)")
         
         fig = plt.Figure(figsize=(8, 6), dpi=100)
         ax = fig.add_subplot(111)
         
+        if "Scree" in view:
+            return self._draw_pca_scree(fig, ax, explained_variance)
+        
         # Scatter plot
         sns.scatterplot(
             data=pca_df, x='PC1', y='PC2', 
@@ -352,11 +563,24 @@ class Plotter:
         # Labels
         for i, row in pca_df.iterrows():
             ax.text(row['PC1']+0.05, row['PC2']+0.05, row['Bakteria'], fontsize=9, alpha=0.8)
+        
+        if "Biplot" in view:
+            # Wektory ładunków (najsilniejsze substancje), przeskalowane do zakresu wyników
+            load2 = loadings[['PC1', 'PC2']]
+            top = load2.pow(2).sum(axis=1).nlargest(min(10, len(load2))).index
+            score_span = np.abs(pca_df[['PC1', 'PC2']].values).max(axis=0)
+            load_span = np.maximum(np.abs(load2.loc[top].values).max(axis=0), 1e-12)
+            scale = 0.9 * (score_span / load_span).min()
+            for sub in top:
+                lx, ly = load2.loc[sub, 'PC1'] * scale, load2.loc[sub, 'PC2'] * scale
+                ax.annotate("", xy=(lx, ly), xytext=(0, 0), arrowprops=dict(arrowstyle="->", color='firebrick', alpha=0.7))
+                ax.text(lx * 1.05, ly * 1.05, sub, color='firebrick', fontsize=8, ha='center', va='center')
             
         # Axes
         ax.set_xlabel(f"PC1 ({explained_variance[0]:.1%})", fontsize=self.config["font_title"])
         ax.set_ylabel(f"PC2 ({explained_variance[1]:.1%})", fontsize=self.config["font_title"])
-        ax.set_title("PCA: Podobieństwo profili wrażliwości", fontsize=self.config["font_title"]+2)
+        title = "PCA (Biplot): Podobieństwo profili wrażliwości" if "Biplot" in view else "PCA: Podobieństwo profili wrażliwości"
+        ax.set_title(title, fontsize=self.config["font_title"]+2)
         
         ax.grid(True, linestyle='--', alpha=0.5)
         # Add zero lines
@@ -366,3 +590,61 @@ class Plotter:
         fig.tight_layout()
         return fig
 
+    def _draw_pca_scree(self, fig, ax, explained_variance):
+        pcs = np.arange(1, len(explained_variance) + 1)
+        ax.bar(pcs, explained_variance * 100, color=self._palette_colors(self.config["palette"], 1)[0], edgecolor='black')
+        ax.plot(pcs, np.cumsum(explained_variance) * 100, color='black', marker='o', label='Skumulowana')
+        ax.set_xticks(pcs, labels=[f"PC{i}" for i in pcs])
+        ax.set_ylim(0, 105)
+        ax.set_xlabel("Składowa główna", fontsize=self.config["font_title"])
+        ax.set_ylabel("Wyjaśniona wariancja (%)", fontsize=self.config["font_title"])
+        ax.set_title("PCA: Wykres osypiska (Scree)", fontsize=self.config["font_title"]+2)
+        ax.tick_params(axis='both', labelsize=self.config["font_labels"])
+        ax.legend(loc='center right')
+        ax.yaxis.grid(True, linestyle='--', alpha=0.5)
+        fig.tight_layout()
+        return fig
+
+    def draw_cluster_heatmap(self, cluster_res):
+        """Dendrogram szczepów + mapa ciepła profili (wiersze i kolumny w kolejności klastrowania)."""
+        n_rows, n_cols = len(cluster_res["strains"]), len(cluster_res["substances"])
+        show_row_labels = n_rows <= 80
+        show_col_labels = n_cols <= 60
+        
+        h = min(max(6, n_rows * 0.25), 20)
+        w = min(max(9, n_cols * 0.35 + 4), 20)
+        fig = plt.Figure(figsize=(w, h), dpi=100)
+        # Kolumna odstępu na etykiety szczepów między mapą a paskiem kolorów
+        gs = fig.add_gridspec(1, 4, width_ratios=[1.2, 4, 1.1 if show_row_labels else 0.05, 0.15], wspace=0.02)
+        ax_dend = fig.add_subplot(gs[0, 0])
+        ax_heat = fig.add_subplot(gs[0, 1])
+        ax_cbar = fig.add_subplot(gs[0, 3])
+        
+        # Dendrogram (liście od dołu do góry -> ta sama kolejność co wiersze mapy z origin='lower')
+        dendrogram(cluster_res["linkage"], orientation='left', ax=ax_dend, no_labels=True,
+                   color_threshold=None, above_threshold_color='#444444')
+        ax_dend.set_axis_off()
+        
+        data = cluster_res["values"][np.ix_(cluster_res["row_order"], cluster_res["col_order"])]
+        pal = self.config["palette"]
+        try:
+            im = ax_heat.imshow(data, aspect='auto', origin='lower', cmap=pal, interpolation='nearest')
+        except ValueError as e:
+            print(f"Warning: Palette '{pal}' error: {e}. Using magma.")
+            im = ax_heat.imshow(data, aspect='auto', origin='lower', cmap="magma", interpolation='nearest')
+        fig.colorbar(im, cax=ax_cbar, label="Średnica (mm)")
+        
+        ax_heat.yaxis.tick_right()
+        if show_row_labels:
+            ax_heat.set_yticks(np.arange(n_rows), labels=cluster_res["strains"][cluster_res["row_order"]])
+        else: ax_heat.set_yticks([])
+        if show_col_labels:
+            ax_heat.set_xticks(np.arange(n_cols), labels=cluster_res["substances"][cluster_res["col_order"]])
+            plt.setp(ax_heat.get_xticklabels(), rotation=45, ha="right")
+        else: ax_heat.set_xticks([])
+        ax_heat.tick_params(axis='both', labelsize=self.config["font_labels"])
+        
+        fig.suptitle(f"Klastrowanie profili wrażliwości ({cluster_res['method']}, {cluster_res['metric']}; "
+                     f"r kofenetyczne = {cluster_res['cophenetic']:.2f})", fontsize=self.config["font_title"]+2)
+        fig.subplots_adjust(left=0.03, right=0.92, bottom=0.25 if show_col_labels else 0.05, top=0.92)
+        return fig
@@ -0,0 +1,259 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.special import ndtr, ndtri
+from statsmodels.stats.libqsturng import qsturng
+import multitest
+
+# ======================================================
+# WEKTOROWE WERSJE TESTÓW Z StatsEngine.run_statistics
+# Każda funkcja liczy naraz wszystkie symulowane zbiory (oś 0 = symulacja).
+# ======================================================
+
+def shapiro_coefficients(n):
+    """Współczynniki a_i testu Shapiro-Wilka (algorytm Roystona 1992, jak w scipy)."""
+    if n == 3:
+        return np.array([-np.sqrt(0.5), 0.0, np.sqrt(0.5)])
+    m = ndtri((np.arange(1, n + 1) - 0.375) / (n + 0.25))
+    mm = np.dot(m, m)
+    u = 1 / np.sqrt(n)
+    a = m / np.sqrt(mm)
+    a_n = a[-1] + 0.221157 * u - 0.147981 * u**2 - 2.071190 * u**3 + 4.434685 * u**4 - 2.706056 * u**5
+    if n > 5:
+        a_n1 = a[-2] + 0.042981 * u - 0.293762 * u**2 - 1.752461 * u**3 + 5.682633 * u**4 - 3.582633 * u**5
+        phi = (mm - 2 * m[-1]**2 - 2 * m[-2]**2) / (1 - 2 * a_n**2 - 2 * a_n1**2)
+        a = m / np.sqrt(phi)
+        a[-1], a[-2] = a_n, a_n1
+        a[0], a[1] = -a_n, -a_n1
+    else:
+        phi = (mm - 2 * m[-1]**2) / (1 - 2 * a_n**2)
+        a = m / np.sqrt(phi)
+        a[-1], a[0] = a_n, -a_n
+    return a
+
+def shapiro_batch(x):
+    """Test Shapiro-Wilka dla każdego wiersza x (S x n, n >= 3). Zwraca p-value (S,)."""
+    n = x.shape[1]
+    xs = np.sort(x, axis=1)
+    ss = ((xs - xs.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.clip((xs @ shapiro_coefficients(n)) ** 2 / ss, 0.0, 1.0)
+    if n == 3:
+        p = 6 / np.pi * (np.arcsin(np.sqrt(w)) - np.arcsin(np.sqrt(0.75)))
+        return np.clip(p, 0.0, 1.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if n <= 11:
+            gamma = -2.273 + 0.459 * n
+            mu = 0.5440 - 0.39978 * n + 0.025054 * n**2 - 0.0006714 * n**3
+            sigma = np.exp(1.3822 - 0.77857 * n + 0.062767 * n**2 - 0.0020322 * n**3)
+            y = -np.log(gamma - np.log1p(-w))
+        else:
+            ln_n = np.log(n)
+            mu = -1.5861 - 0.31082 * ln_n - 0.083751 * ln_n**2 + 0.0038915 * ln_n**3
+            sigma = np.exp(-0.4803 - 0.082676 * ln_n + 0.0030302 * ln_n**2)
+            y = np.log1p(-w)
+        p = 1 - ndtr((y - mu) / sigma)
+    return np.where(np.isfinite(p), p, 0.0)
+
+def anova_batch(ns, means, variances):
+    """Jednoczynnikowa ANOVA dla S zbiorów naraz: means/variances (S x k). Zwraca (F, p, MSE, df_within)."""
+    n_total, k = ns.sum(), len(ns)
+    grand = (means * ns).sum(axis=1, keepdims=True) / n_total
+    ss_between = (ns * (means - grand) ** 2).sum(axis=1)
+    ss_within = ((ns - 1) * variances).sum(axis=1)
+    df_b, df_w = k - 1, n_total - k
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = (ss_between / df_b) / (ss_within / df_w)
+    return f, stats.f.sf(f, df_b, df_w), ss_within / df_w, df_w
+
+def welch_anova_batch(ns, means, variances):
+    """ANOVA Welcha dla S zbiorów naraz (means/variances: S x k). Zwraca p (S,)."""
+    k = len(ns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = ns / variances
+        sw = w.sum(axis=1, keepdims=True)
+        mean_w = (w * means).sum(axis=1, keepdims=True) / sw
+        a = (w * (means - mean_w) ** 2).sum(axis=1) / (k - 1)
+        tmp = ((1 - w / sw) ** 2 / (ns - 1)).sum(axis=1)
+        f = a / (1 + 2 * (k - 2) / (k ** 2 - 1) * tmp)
+        return stats.f.sf(f, k - 1, (k ** 2 - 1) / (3 * tmp))
+
+def studentized_range_crit(alpha, k, df, nodes=48):
+    """Wartość krytyczna rozstępu studentyzowanego dla tablicy df (interpolacja w 1/df z siatki qsturng)."""
+    df = np.asarray(df, dtype=float)
+    finite = df[np.isfinite(df)]
+    if finite.size == 0:
+        return np.full(df.shape, np.nan)
+    grid = np.unique(np.geomspace(max(finite.min(), 1.0), max(finite.max(), 2.0), nodes))
+    crit = np.array([qsturng(1 - alpha, k, v) for v in grid])
+    return np.interp(1 / df, (1 / grid)[::-1], crit[::-1])
+
+def tie_sums(x_sorted):
+    """Suma (t^3 - t) po grupach wartości równych w każdym wierszu posortowanej macierzy (korekta na remisy)."""
+    s_rows, n = x_sorted.shape
+    new_run = np.ones_like(x_sorted, dtype=bool)
+    new_run[:, 1:] = x_sorted[:, 1:] != x_sorted[:, :-1]
+    starts = np.flatnonzero(new_run.ravel())
+    lengths = np.diff(np.r_[starts, s_rows * n]).astype(float)
+    return np.bincount(starts // n, weights=lengths ** 3 - lengths, minlength=s_rows)
+
+def kruskal_dunn_batch(groups, method="holm"):
+    """
+    Kruskal-Wallis i test Dunna (wszystkie pary, korekta jak sp.posthoc_dunn) dla S zbiorów naraz.
+    groups: lista macierzy (S x n_g). Zwraca (p Kruskala (S,), skorygowane p par (S x liczba par), (i, j)).
+    """
+    ns = np.array([g.shape[1] for g in groups], dtype=float)
+    x = np.concatenate(groups, axis=1)
+    n_total = x.shape[1]
+    ranks = stats.rankdata(x, axis=1)
+    bounds = np.r_[0, np.cumsum(ns)].astype(int)
+    mean_ranks = np.stack([ranks[:, a:b].mean(axis=1) for a, b in zip(bounds[:-1], bounds[1:])], axis=1)
+
+    ties = tie_sums(np.sort(x, axis=1))
+    h = 12 / (n_total * (n_total + 1)) * (ns * mean_ranks ** 2).sum(axis=1) - 3 * (n_total + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = h / (1 - ties / (n_total ** 3 - n_total))
+    p_kw = stats.chi2.sf(h, len(groups) - 1)
+
+    i, j = np.triu_indices(len(groups), 1)
+    sigma2 = n_total * (n_total + 1) / 12 - ties / (12 * (n_total - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.abs(mean_ranks[:, i] - mean_ranks[:, j]) / np.sqrt(sigma2[:, None] * (1 / ns[i] + 1 / ns[j]))
+    p_pairs = multitest.adjust(2 * stats.norm.sf(z), method)
+    return p_kw, p_pairs, (i, j)
+
+# ======================================================
+# SYMULACJA DRZEWA DECYZYJNEGO
+# ======================================================
+def simulate_pipeline(means, sds, ns, ref_index=0, n_sim=2000, alpha=0.05, method="holm", resolution=None, seed=0):
+    """
+    Symuluje n_sim zbiorów (rozkład normalny z podanych średnich, SD i liczebności) i przepuszcza je przez
+    to samo drzewo decyzyjne co run_statistics: Shapiro w grupach -> Levene -> ANOVA+Tukey,
+    Welch ANOVA+Games-Howell (normalne, różne wariancje) lub Kruskal+Dunn.
+    resolution: zaokrąglenie pomiarów (np. 0.1 mm jak przy odczycie linijką) - daje remisy jak w danych.
+    Zwraca słownik tablic z decyzjami (do zsumowania między procesami).
+    """
+    rng = np.random.default_rng(seed)
+    means, sds, ns = (np.asarray(a, dtype=float) for a in (means, sds, ns))
+    ns_int = ns.astype(int)
+    k = len(ns)
+    groups = [means[g] + sds[g] * rng.standard_normal((n_sim, ns_int[g])) for g in range(k)]
+    if resolution:
+        groups = [np.round(x / resolution) * resolution for x in groups]
+
+    g_means = np.stack([x.mean(axis=1) for x in groups], axis=1)
+    g_vars = np.stack([x.var(axis=1, ddof=1) for x in groups], axis=1)
+
+    # 1. Normalność (jak w StatsEngine: n >= 3 i wariancja > 0, p >= 0.05)
+    normal = np.ones(n_sim, dtype=bool)
+    for g, x in enumerate(groups):
+        if ns_int[g] < 3:
+            normal[:] = False
+            break
+        normal &= (g_vars[:, g] > 0) & (shapiro_batch(x) >= 0.05)
+
+    # 2. Levene (mediana)
+    z = [np.abs(x - np.median(x, axis=1, keepdims=True)) for x in groups]
+    _, p_levene, _, _ = anova_batch(ns, np.stack([a.mean(axis=1) for a in z], axis=1), np.stack([a.var(axis=1, ddof=1) for a in z], axis=1))
+    parametric = normal & (p_levene > 0.05)
+    welch = normal & ~(p_levene > 0.05) & ~np.isnan(p_levene)
+
+    # 3a. ANOVA + Tukey (porównania z grupą odniesienia: q > q_krytyczne)
+    _, p_anova, mse, df_w = anova_batch(ns, g_means, g_vars)
+    q_crit = stats.studentized_range.ppf(1 - alpha, k, df_w)
+    others = np.array([g for g in range(k) if g != ref_index])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = np.abs(g_means[:, others] - g_means[:, [ref_index]]) / np.sqrt(mse[:, None] / 2 * (1 / ns[others] + 1 / ns[ref_index]))
+    tukey_sig = (q > q_crit) & (p_anova < alpha)[:, None]
+
+    # 3b. Welch ANOVA + Games-Howell (df Welcha-Satterthwaite'a dla każdej pary)
+    p_welch = welch_anova_batch(ns, g_means, g_vars)
+    v = g_vars / ns
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se2 = v[:, others] + v[:, [ref_index]]
+        df_pairs = se2 ** 2 / (v[:, others] ** 2 / (ns[others] - 1) + v[:, [ref_index]] ** 2 / (ns[ref_index] - 1))
+        q_gh = np.abs(g_means[:, others] - g_means[:, [ref_index]]) / np.sqrt(se2) * np.sqrt(2)
+    gh_sig = (q_gh > studentized_range_crit(alpha, k, df_pairs)) & (p_welch < alpha)[:, None]
+
+    # 3c. Kruskal-Wallis + Dunn
+    p_kw, p_dunn, (pi, pj) = kruskal_dunn_batch(groups, method)
+    pair_col = {frozenset((a, b)): c for c, (a, b) in enumerate(zip(pi, pj))}
+    ref_cols = [pair_col[frozenset((ref_index, g))] for g in others]
+    dunn_sig = (p_dunn[:, ref_cols] < alpha) & (p_kw < alpha)[:, None]
+
+    detected = np.where(parametric[:, None], tukey_sig, np.where(welch[:, None], gh_sig, dunn_sig))
+    omnibus = np.where(parametric, p_anova < alpha, np.where(welch, p_welch < alpha, p_kw < alpha))
+    return {"n_sim": n_sim, "parametric": parametric.sum(), "welch": welch.sum(), "omnibus": omnibus.sum(),
+            "detected": detected.sum(axis=0), "any_detected": detected.any(axis=1).sum()}
+
+def _merge(parts):
+    return {key: sum(p[key] for p in parts) for key in parts[0]}
+
+def run_simulation(means, sds, ns, ref_index=0, n_sim=2000, alpha=0.05, method="holm", resolution=None, seed=0, workers=None):
+    """Symulacja podzielona na porcje liczone w osobnych procesach (niezależne strumienie losowe)."""
+    workers = workers or os.cpu_count() or 1
+    chunks = [len(c) for c in np.array_split(np.arange(n_sim), min(workers, max(1, n_sim // 500))) if len(c)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [(means, sds, ns, ref_index, c, alpha, method, resolution, s) for c, s in zip(chunks, seeds)]
+    if len(chunks) == 1:
+        return simulate_pipeline(*args[0])
+    try:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            return _merge(list(pool.map(simulate_pipeline, *zip(*args))))
+    except (OSError, RuntimeError):
+        return _merge([simulate_pipeline(*a) for a in args])
+
+def estimate_power(groups, means, sds, ns, ref_group, n_sim=2000, alpha=0.05, method="holm", resolution=None, seed=0, workers=None):
+    """
+    Moc wykrycia różnicy każdej grupy względem grupy odniesienia oraz błąd I rodzaju
+    (te same SD i n, wszystkie średnie równe średniej grupy odniesienia).
+    Zwraca ((tabela mocy, podsumowanie), error).
+    """
+    if len(groups) < 2:
+        return None, "Wymagane min. 2 grupy."
+    if min(ns) < 2:
+        return None, "Każda grupa musi mieć n >= 2."
+    ref_index = list(groups).index(ref_group)
+    res = run_simulation(means, sds, ns, ref_index, n_sim, alpha, method, resolution, seed, workers)
+    null = run_simulation(np.full(len(means), means[ref_index]), sds, ns, ref_index, n_sim, alpha, method, resolution, seed + 1, workers)
+
+    others = [g for g in range(len(groups)) if g != ref_index]
+    table = pd.DataFrame({
+        "Grupa": [groups[g] for g in others],
+        "Różnica średnich": [means[g] - means[ref_index] for g in others],
+        "SD": [sds[g] for g in others],
+        "n": [ns[g] for g in others],
+        "Moc": res["detected"] / n_sim,
+        "Fałszywie istotne (H0)": null["detected"] / n_sim,
+    })
+    summary = {
+        "Symulacje": n_sim,
+        "Ścieżka ANOVA": res["parametric"] / n_sim,
+        "Ścieżka Welch ANOVA": res["welch"] / n_sim,
+        "Istotny test główny": res["omnibus"] / n_sim,
+        "Min. 1 wykryta różnica": res["any_detected"] / n_sim,
+        "Błąd I rodzaju (FWER vs odniesienie)": null["any_detected"] / n_sim,
+        "Ścieżka ANOVA (H0)": null["parametric"] / n_sim,
+    }
+    return (table, summary), None
+
+def sample_size_curve(groups, means, sds, ref_group, n_values=range(3, 11), target_power=0.8, **kwargs):
+    """
+    Moc w funkcji liczby powtórzeń (to samo n we wszystkich grupach).
+    Zwraca ((tabela: n x grupy + 'Min. moc', najmniejsze n z mocą >= target dla wszystkich grup lub None), error).
+    """
+    rows = []
+    for n in n_values:
+        res, err = estimate_power(groups, means, sds, [n] * len(groups), ref_group, **kwargs)
+        if err:
+            return None, err
+        table, _ = res
+        row = {"n": n}
+        row.update(dict(zip(table["Grupa"], table["Moc"])))
+        row["Min. moc"] = table["Moc"].min()
+        rows.append(row)
+    curve = pd.DataFrame(rows)
+    enough = curve.loc[curve["Min. moc"] >= target_power, "n"]
+    return (curve, int(enough.iloc[0]) if len(enough) else None), None
@@ -0,0 +1,90 @@
+import io
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Margines wokół ciasnej ramki (jak domyślne savefig.pad_inches)
+TIGHT_PAD_INCHES = 0.1
+
+class RenderCache:
+    """
+    LRU zakodowanych obrazów figur (PNG / SVG / PDF) ograniczony łącznym rozmiarem w bajtach.
+    Klucz = (tożsamość figury lub klucz podany przez wywołującego, format, dpi, ciasna ramka, przezroczystość).
+    Ciasna ramka (bbox_inches='tight') liczona raz na figurę i wspólna dla wszystkich formatów i rozdzielczości -
+    kolejne zapisy pomijają dodatkowy przebieg układu, który savefig robi dla 'tight'.
+    """
+    def __init__(self, max_bytes=128 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._bboxes = {}
+        self._serials = weakref.WeakKeyDictionary()
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+
+    def figure_key(self, fig):
+        """Numer figury w cache; wpisy znikają razem z obiektem Figure."""
+        with self._lock:
+            serial = self._serials.get(fig)
+            if serial is None:
+                serial = self._serials[fig] = next(self._counter)
+                weakref.finalize(fig, self.forget, serial)
+            return serial
+
+    def forget(self, fig_key):
+        with self._lock:
+            for k in [k for k in self._data if k[0] == fig_key]:
+                self.size -= len(self._data.pop(k))
+            self._bboxes.pop(fig_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bboxes.clear()
+            self.size = 0
+
+    def render(self, fig, fmt="png", dpi=100, tight=False, transparent=False, key=None):
+        """Bajty obrazu figury w danym formacie; z cache, jeśli ta sama figura była już tak zapisana."""
+        fig_key = self.figure_key(fig) if key is None else key
+        k = (fig_key, fmt.lower(), dpi, tight, transparent)
+        with self._lock:
+            data = self._data.get(k)
+            if data is not None:
+                self._data.move_to_end(k)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        buf = io.BytesIO()
+        bbox = self._tight_bbox(fig, fig_key) if tight else None
+        fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches=bbox, transparent=transparent)
+        data = buf.getvalue()
+
+        with self._lock:
+            if k not in self._data and len(data) <= self.max_bytes:
+                self._data[k] = data
+                self.size += len(data)
+                while self.size > self.max_bytes:
+                    self.size -= len(self._data.popitem(last=False)[1])
+        return data
+
+    def _tight_bbox(self, fig, fig_key):
+        with self._lock:
+            bbox = self._bboxes.get(fig_key)
+        if bbox is None:
+            canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+            fig.draw_without_rendering()
+            bbox = fig.get_tightbbox(canvas.get_renderer()).padded(TIGHT_PAD_INCHES)
+            with self._lock:
+                self._bboxes[fig_key] = bbox
+        return bbox
+
+# Wspólny cache aplikacji: ekran, eksport obrazu, raport PDF i podglądy sesji
+CACHE = RenderCache()
+
+def render(fig, fmt="png", dpi=100, tight=False, transparent=False, key=None):
+    return CACHE.render(fig, fmt, dpi, tight, transparent, key)
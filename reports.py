@@ -6,6 +6,7 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import rendercache
 
 def generate_pdf(file_path, metadata, stats_summary, figures, detailed_results):
     """
@@ -72,10 +73,8 @@ def generate_pdf(file_path, metadata, stats_summary, figures, detailed_results):
                 elements.append(Paragraph(title, styles['Heading2']))
                 elements.append(Spacer(1, 6))
                 
-                img_buf = io.BytesIO()
-                # Zapisujemy wykres do bufora pamięci
-                fig.savefig(img_buf, format='png', dpi=150, bbox_inches='tight')
-                img_buf.seek(0)
+                # Bajty wykresu z cache renderów (ponowny raport nie rasteryzuje figur od nowa)
+                img_buf = io.BytesIO(rendercache.render(fig, "png", 150, tight=True))
                 
                 img = Image(img_buf)
                 # Skalowanie obrazka, aby mieścił się na stronie A4 (szerokość ok. 6 cali)
@@ -100,7 +99,7 @@ def generate_pdf(file_path, metadata, stats_summary, figures, detailed_results):
             add_plot_to_pdf(figures['bar'], "Wykres Porównawczy (Główny)")
             
         if figures.get('effect'): 
-            add_plot_to_pdf(figures['effect'], "Analiza Wielkości Efektu (Cohen's d)")
+            add_plot_to_pdf(figures['effect'], "Analiza Wielkości Efektu")
             
         if figures.get('heat'): 
             add_plot_to_pdf(figures['heat'], "Mapa Ciepła (Aktywność)")
@@ -111,9 +110,15 @@ def generate_pdf(file_path, metadata, stats_summary, figures, detailed_results):
         if figures.get('trend'): 
             add_plot_to_pdf(figures['trend'], "Trend Zależności od Dawki")
             
+        if figures.get('mic'): 
+            add_plot_to_pdf(figures['mic'], "Oszacowane MIC (Wszystkie Szczepy)")
+            
         if figures.get('cross'): 
             add_plot_to_pdf(figures['cross'], "Porównanie Międzygatunkowe")
 
+        if figures.get('cluster'): 
+            add_plot_to_pdf(figures['cluster'], "Klastrowanie Hierarchiczne Szczepów")
+
         # 4. Werdykt
         elements.append(Paragraph("Werdykt Statystyczny (Istotne różnice)", styles['Heading2']))
         verdicts = []
@@ -121,9 +126,9 @@ def generate_pdf(file_path, metadata, stats_summary, figures, detailed_results):
         if detailed_results:
             for row in detailed_results:
                 if row['Significant']:
-                    d_val = row["Cohen's d"]
+                    d_val = row["Effect"]
                     interp = row["Effect Size"]
-                    v_text = f"• Istotna różnica: <b>{row['Group 1']}</b> vs <b>{row['Group 2']}</b> (p={row['P-adj']:.4f}). Wielkość efektu d={d_val:.2f} ({interp})."
+                    v_text = f"• Istotna różnica: <b>{row['Group 1']}</b> vs <b>{row['Group 2']}</b> (p={row['P-adj']:.4f}). Wielkość efektu {row['Effect Measure']}={d_val:.2f} ({interp})."
                     verdicts.append(v_text)
 
         if not verdicts: 
@@ -0,0 +1,402 @@
+import io
+import json
+import math
+import time
+import urllib.request
+import urllib.error
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import matplotlib
+matplotlib.use("Agg")  # serwis działa bez okna
+import numpy as np
+import pandas as pd
+import utils
+from logic import StatsEngine
+from plotting import Plotter, DEFAULT_CONFIG
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FIGURE_KINDS = ("bar", "heat", "pvalue", "trend", "effect", "cross", "pca", "cluster", "mic")
+
+# ======================================================
+# PRACA W PROCESIE ROBOCZYM
+# Każdy proces ma własny StatsEngine (cache grup działa między zapytaniami).
+# ======================================================
+_engine = None
+
+def _get_engine():
+    global _engine
+    if _engine is None:
+        _engine = StatsEngine()
+    return _engine
+
+def _to_jsonable(obj):
+    """Wyniki StatsEngine (numpy, pandas, NaN) -> typy JSON."""
+    if isinstance(obj, dict):
+        return {str(k): _to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [_to_jsonable(v) for v in obj]
+    if isinstance(obj, pd.DataFrame):
+        return _to_jsonable(obj.reset_index().to_dict(orient="records") if not isinstance(obj.index, pd.RangeIndex) else obj.to_dict(orient="records"))
+    if isinstance(obj, (np.bool_, bool)):
+        return bool(obj)
+    if isinstance(obj, (np.integer,)):
+        return int(obj)
+    if isinstance(obj, (np.floating, float)):
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, np.ndarray):
+        return _to_jsonable(obj.tolist())
+    return obj
+
+def _frame(payload):
+    """Dane z zapytania: lista rekordów lub słownik kolumn z kolumnami Bakterie (opcjonalnie), Grupa, Srednica_mm."""
+    data = payload.get("data")
+    if not data:
+        raise ValueError("Brak pola 'data'.")
+    df = pd.DataFrame(data)
+    missing = [c for c in ("Grupa", "Srednica_mm") if c not in df.columns]
+    if missing:
+        raise ValueError(f"Brak kolumn: {missing}")
+    df['Srednica_mm'] = pd.to_numeric(df['Srednica_mm'], errors='coerce')
+    return df
+
+def _strain_slice(df, payload):
+    col_bact = payload.get("col_bact", "Bakterie")
+    bact = payload.get("bact")
+    if bact is not None and col_bact in df.columns:
+        df = df[df[col_bact] == bact]
+    if payload.get("groups"):
+        df = df[df['Grupa'].isin(payload["groups"])]
+    groups = sorted(df['Grupa'].unique(), key=utils.smart_sort_key)
+    ref = payload.get("ref") if payload.get("ref") in groups else utils.default_reference_group(groups)
+    return df, bact or "", ref
+
+def _statistics(engine, df, payload):
+    df_run, bact, ref = _strain_slice(df, payload)
+    method = payload.get("method", "holm")
+    summary, posthoc_df, error = engine.run_statistics(df_run, None if method == "None" else method, ref)
+    if error:
+        raise ValueError(error)
+    detailed, sig_set = engine.process_detailed_results(posthoc_df, df_run, ref, summary['test_used'])
+    return df_run, bact, ref, summary, posthoc_df, detailed, sig_set
+
+def _render(fig, fmt, dpi):
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
+def _figure(engine, df, payload):
+    kind = payload.get("kind", "bar")
+    if kind not in FIGURE_KINDS:
+        raise ValueError(f"Nieznany typ wykresu: {kind} (dostępne: {', '.join(FIGURE_KINDS)})")
+    plotter = Plotter(dict(DEFAULT_CONFIG, **payload.get("config", {})))
+    col_bact = payload.get("col_bact", "Bakterie")
+    groups = payload.get("groups") or sorted(df['Grupa'].unique(), key=utils.smart_sort_key)
+
+    if kind in ("cross", "pca", "cluster", "mic"):
+        if col_bact not in df.columns:
+            raise ValueError(f"Wykres '{kind}' wymaga kolumny {col_bact}.")
+        if kind == "cross":
+            fig = plotter.draw_cross_species(df, col_bact, groups)
+        elif kind == "pca":
+            res, err = engine.run_pca(df, col_bact, groups)
+            fig = plotter.draw_pca(res) if res else None
+        elif kind == "cluster":
+            res, err = engine.run_clustering(df, col_bact, groups, plotter.config["cluster_metric"], plotter.config["cluster_method"])
+            fig = plotter.draw_cluster_heatmap(res) if res else None
+        else:
+            table = engine.estimate_mic_table(df[df['Grupa'].isin(groups)], col_bact, plotter.config["mic_target"], plotter.config["mic_model"])
+            fig = plotter.draw_mic_heatmap(table) if not table.empty else None
+    else:
+        df_run, bact, ref, summary, posthoc_df, detailed, sig_set = _statistics(engine, df, payload)
+        if kind == "bar": fig = plotter.draw_bar_plot(df_run, bact, ref, sig_set)
+        elif kind == "heat": fig = plotter.draw_heatmap(df_run, bact)
+        elif kind == "pvalue": fig = plotter.draw_pvalue_heatmap(posthoc_df, bact)
+        elif kind == "effect": fig = plotter.draw_effect_plot(detailed)
+        else: fig, err = plotter.draw_trend(df_run, bact)
+    if fig is None:
+        raise ValueError(f"Brak danych do wykresu '{kind}'.")
+    return _render(fig, payload.get("format", "png"), payload.get("dpi", 150))
+
+def handle_request(endpoint, payload):
+    """Wykonywane w procesie roboczym. Zwraca (typ treści, bajty odpowiedzi)."""
+    engine = _get_engine()
+    df = _frame(payload)
+    if endpoint == "statistics":
+        df_run, bact, ref, summary, posthoc_df, detailed, _ = _statistics(engine, df, payload)
+        result = {"bact": bact, "ref": ref, "summary": summary, "posthoc": posthoc_df, "detailed": detailed}
+    elif endpoint == "mic":
+        df_run, bact, ref = _strain_slice(df, payload)
+        subs = payload.get("substances") or list(utils.parse_concentrations(df_run['Grupa'])[0].dropna().unique())
+        target = float(payload.get("target", 6.0))
+        if payload.get("model") == "4PL (Hill)":
+            result, _ = engine.estimate_mic_4pl(df_run, subs, target)
+        else:
+            result = engine.estimate_mic(df_run, subs, target)
+    elif endpoint == "pca":
+        res, err = engine.run_pca(df, payload.get("col_bact", "Bakterie"), payload.get("groups") or list(df['Grupa'].unique()))
+        if err:
+            raise ValueError(err)
+        pca_df, explained, loadings = res
+        result = {"scores": pca_df, "explained_variance": explained, "loadings": loadings}
+    elif endpoint == "figure":
+        fmt = payload.get("format", "png")
+        if fmt not in ("png", "svg"):
+            raise ValueError("format: png lub svg")
+        return ("image/svg+xml" if fmt == "svg" else "image/png"), _figure(engine, df, payload)
+    else:
+        raise KeyError(endpoint)
+    return "application/json", json.dumps(_to_jsonable(result), ensure_ascii=False).encode("utf-8")
+
+# ======================================================
+# SERWER
+# ======================================================
+class Metrics:
+    """Liczniki i histogramy czasu odpowiedzi per endpoint (format tekstowy zgodny z Prometheus)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hist = {}
+        self.counters = {}
+
+    def observe(self, endpoint, seconds, status):
+        with self._lock:
+            h = self.hist.setdefault(endpoint, {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0})
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if seconds <= le: h["buckets"][i] += 1
+            h["count"] += 1
+            h["sum"] += seconds
+            key = (endpoint, status)
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def inc(self, name):
+        with self._lock:
+            self.counters[(name, None)] = self.counters.get((name, None), 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for ep, h in sorted(self.hist.items()):
+                for le, n in zip(LATENCY_BUCKETS, h["buckets"]):
+                    lines.append(f'biostat_request_seconds_bucket{{endpoint="{ep}",le="{le}"}} {n}')
+                lines.append(f'biostat_request_seconds_bucket{{endpoint="{ep}",le="+Inf"}} {h["count"]}')
+                lines.append(f'biostat_request_seconds_sum{{endpoint="{ep}"}} {h["sum"]:.6f}')
+                lines.append(f'biostat_request_seconds_count{{endpoint="{ep}"}} {h["count"]}')
+            for (name, status), n in sorted(self.counters.items(), key=str):
+                if status is None:
+                    lines.append(f"biostat_{name}_total {n}")
+                else:
+                    lines.append(f'biostat_responses_total{{endpoint="{name}",status="{status}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+class ResultCache:
+    """LRU wyników (klucz = endpoint + kanoniczny JSON zapytania)."""
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint, payload):
+        return hashlib.sha1((endpoint + json.dumps(payload, sort_keys=True, default=str)).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+class AnalysisService(ThreadingHTTPServer):
+    """
+    Lokalny serwis HTTP/JSON: POST /statistics, /mic, /pca, /figure; GET /metrics, /health.
+    Obliczenia w ograniczonej puli procesów; gdy wszystkie miejsca są zajęte -> 503, po przekroczeniu czasu -> 504.
+    Zadanie, które przekroczyło czas w trakcie obliczeń, nie da się anulować - pula jest wtedy wymieniana,
+    a jej procesy kończone, żeby zawieszone obliczenia nie blokowały kolejnych zapytań.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8765), workers=2, timeout=60.0, max_pending=None, cache_size=256):
+        super().__init__(address, _Handler)
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self._pool_lock = threading.Lock()
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 4)
+        self.cache = ResultCache(cache_size)
+        self.metrics = Metrics()
+
+    def run_job(self, endpoint, payload):
+        """Zwraca (status HTTP, typ treści, bajty)."""
+        key = ResultCache.key(endpoint, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.metrics.inc("cache_hits")
+            return (200,) + cached
+        if not self.slots.acquire(blocking=False):
+            return 503, "application/json", _error_body("Serwis przeciążony, spróbuj ponownie.")
+        try:
+            deadline = time.monotonic() + self.timeout
+            for attempt in range(2):
+                pool = self.pool
+                future = pool.submit(handle_request, endpoint, payload)
+                try:
+                    result = future.result(timeout=max(deadline - time.monotonic(), 0.0))
+                    break
+                except FutureTimeout:
+                    if not future.cancel():
+                        self._restart_pool(pool)  # zadanie już liczone - anulowanie nic nie da
+                    return 504, "application/json", _error_body(f"Przekroczono limit czasu ({self.timeout:g} s).")
+                except BrokenProcessPool:
+                    # Pula wymieniona przez inne zapytanie (przekroczony czas) - jedno ponowienie w nowej puli
+                    if attempt or pool is self.pool:
+                        raise
+                except (ValueError, KeyError) as e:
+                    return 400, "application/json", _error_body(str(e))
+            self.cache.put(key, result)
+            return (200,) + result
+        finally:
+            self.slots.release()
+
+    def _restart_pool(self, stuck):
+        """Nowa pula dla kolejnych zapytań; procesy starej (z zawieszonym zadaniem) są kończone."""
+        with self._pool_lock:
+            if self.pool is not stuck:
+                return  # już wymieniona przez inne zapytanie
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.metrics.inc("pool_restarts")
+        processes = list((getattr(stuck, "_processes", None) or {}).values())
+        stuck.shutdown(wait=False, cancel_futures=True)
+        for proc in processes:
+            proc.terminate()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def _error_body(msg):
+    return json.dumps({"error": msg}, ensure_ascii=False).encode("utf-8")
+
+class _Handler(BaseHTTPRequestHandler):
+    ENDPOINTS = ("statistics", "mic", "pca", "figure")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", self.server.metrics.render().encode("utf-8"))
+        elif self.path == "/health":
+            self._send(200, "application/json", b'{"status": "ok"}')
+        else:
+            self._send(404, "application/json", _error_body("Nie ma takiego zasobu."))
+
+    def do_POST(self):
+        endpoint = self.path.strip("/")
+        start = time.perf_counter()
+        if endpoint not in self.ENDPOINTS:
+            self._send(404, "application/json", _error_body("Nie ma takiego zasobu."))
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            status, content_type, body = self.server.run_job(endpoint, payload)
+        except json.JSONDecodeError:
+            status, content_type, body = 400, "application/json", _error_body("Niepoprawny JSON.")
+        except Exception as e:
+            status, content_type, body = 500, "application/json", _error_body(str(e))
+        self._send(status, content_type, body)
+        self.server.metrics.observe(endpoint, time.perf_counter() - start, status)
+
+    def log_message(self, format, *args):
+        pass  # bez logu każdego zapytania na konsoli
+
+def _post(url, endpoint, payload, timeout=120):
+    req = urllib.request.Request(f"{url}/{endpoint}", data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def smoke_test(workers=1):
+    """
+    Test serwisu na localhost (losowy port, tylko biblioteka standardowa): /health, /statistics, /figure, pamięć wyników,
+    przekroczenie czasu (504) z wymianą puli i poprawna odpowiedź po niej, /metrics. Zwraca listę błędów (pusta = OK).
+    """
+    rng = np.random.default_rng(0)
+    data = [{"Bakterie": "S. aureus", "Grupa": g, "Srednica_mm": round(float(m + rng.normal(0, 0.5)), 1)}
+            for g, m in (("Kontrola", 6.0), ("Ekstrakt (10 mg/ml)", 9.0), ("Ekstrakt (50 mg/ml)", 13.0)) for _ in range(5)]
+    payload = {"data": data, "bact": "S. aureus", "ref": "Kontrola"}
+    failures = []
+
+    def check(label, ok):
+        print(f"{'OK ' if ok else 'BŁĄD'} {label}")
+        if not ok: failures.append(label)
+
+    server = AnalysisService(("127.0.0.1", 0), workers=workers, timeout=60.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=10) as resp:
+            check("GET /health", resp.status == 200)
+        status, body = _post(url, "statistics", payload)
+        check("POST /statistics", status == 200 and json.loads(body)["summary"]["test_used"] in ("ANOVA", "Welch ANOVA", "Kruskal-Wallis"))
+        status, body = _post(url, "figure", dict(payload, kind="bar"))
+        check("POST /figure (PNG)", status == 200 and body[:8] == b"\x89PNG\r\n\x1a\n")
+        status, _ = _post(url, "statistics", payload)
+        check("pamięć wyników (cache)", status == 200 and server.cache.get(ResultCache.key("statistics", payload)) is not None)
+        status, _ = _post(url, "statistics", {"data": [{"Grupa": "A"}]})
+        check("błędne dane -> 400", status == 400)
+
+        # Limit czasu w trakcie obliczeń: klastrowanie 30 szczepów w 300 dpi (~1 s) przy limicie 0,3 s
+        heavy = [{"Bakterie": f"Szczep {b}", "Grupa": f"Ekstrakt {g} ({c} mg/ml)", "Srednica_mm": round(float(rng.normal(10, 2)), 1)}
+                 for b in range(30) for g in range(10) for c in (5, 10, 25) for _ in range(3)]
+        server.timeout = 0.3
+        status, _ = _post(url, "figure", {"data": heavy, "kind": "cluster", "dpi": 300})
+        check("przekroczony czas -> 504", status == 504)
+        server.timeout = 60.0
+        status, _ = _post(url, "statistics", dict(payload, method="bonferroni"))
+        check("zapytanie po wymianie puli", status == 200)
+        with urllib.request.urlopen(f"{url}/metrics", timeout=10) as resp:
+            metrics = resp.read().decode("utf-8")
+        check("GET /metrics", 'biostat_request_seconds_count{endpoint="statistics"}' in metrics and "biostat_cache_hits_total 1" in metrics)
+        check("wymiana puli po przekroczeniu czasu", "biostat_pool_restarts_total 1" in metrics)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BioStat Master - lokalny serwis analiz HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="liczba procesów obliczeniowych")
+    parser.add_argument("--timeout", type=float, default=60.0, help="limit czasu zapytania [s]")
+    parser.add_argument("--smoke-test", action="store_true", help="uruchamia serwis na losowym porcie, sprawdza endpointy i kończy")
+    args = parser.parse_args()
+    if args.smoke_test:
+        raise SystemExit(1 if smoke_test(args.workers) else 0)
+    server = AnalysisService((args.host, args.port), args.workers, args.timeout)
+    print(f"BioStat Master: serwis na http://{args.host}:{args.port} (Ctrl+C kończy)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,125 @@
+import json
+import zipfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import rendercache
+
+SESSION_VERSION = 3
+SESSION_EXTENSION = ".biostat"
+
+def _png_bytes(fig, dpi):
+    # Te same bajty co podgląd na ekranie (Plotter.render_png) - zwykle bez ponownego renderowania
+    return rendercache.render(fig, "png", dpi)
+
+def _json_default(value):
+    """Typy numpy / pandas w wynikach statystyk -> typy JSON."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Nieobsługiwany typ w stanie sesji: {type(value).__name__}")
+
+def _table_to_json(df):
+    """Tabela -> JSON kolumnami (liczby zmiennoprzecinkowe zapisywane dokładnie, typy kolumn zachowane)."""
+    return json.dumps({
+        "columns": [str(c) for c in df.columns], "dtypes": [str(t) for t in df.dtypes],
+        "index": df.index.tolist(), "index_name": df.index.name,
+        "data": [df[c].tolist() for c in df.columns],
+    }, ensure_ascii=False, default=_json_default)
+
+def _table_from_json(text):
+    return _table_from_payload(json.loads(text))
+
+def _table_from_payload(payload):
+    columns = {c: pd.Series(values, dtype=object).astype(dtype)
+               for c, dtype, values in zip(payload["columns"], payload["dtypes"], payload["data"])}
+    df = pd.DataFrame(columns, columns=payload["columns"])
+    df.index = pd.Index(payload["index"], name=payload["index_name"])
+    return df
+
+def _encode(value):
+    """
+    Zagnieżdżone wyniki (PCA, klastrowanie, krzywe MIC) -> struktura JSON z oznaczonymi typami:
+    tabele, tablice numpy (z typem), krotki i słowniki o kluczach innych niż tekst (np. (szczep, grupa)).
+    """
+    if isinstance(value, pd.DataFrame):
+        return {"__table__": json.loads(_table_to_json(value))}
+    if isinstance(value, np.ndarray):
+        return {"__array__": value.tolist(), "dtype": str(value.dtype)}
+    if isinstance(value, pd.api.extensions.ExtensionArray):
+        # np. tekstowe etykiety szczepów z indeksu tabeli (pandas StringArray) - odtwarzane jako tablica object
+        return {"__array__": np.asarray(value, dtype=object).tolist(), "dtype": "object"}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: _encode(v) for k, v in value.items()}
+        return {"__items__": [[_encode(k), _encode(v)] for k, v in value.items()]}
+    return value
+
+def _decode(obj):
+    """object_hook dla json.loads - odwrotność _encode."""
+    if "__table__" in obj:
+        return _table_from_payload(obj["__table__"])
+    if "__array__" in obj:
+        return np.array(obj["__array__"], dtype=obj["dtype"])
+    if "__tuple__" in obj:
+        return tuple(obj["__tuple__"])
+    if "__items__" in obj:
+        return {k: v for k, v in obj["__items__"]}
+    return obj
+
+def save_session(path, state, figures, preview_dpi=100):
+    """
+    Zapisuje sesję do jednego archiwum zip (bez pickle - plik można bezpiecznie otworzyć z dowolnego źródła):
+      meta.json             - wersja formatu, data, lista tabel i wykresów
+      state.json            - ustawienia, wybór, wyniki statystyk, dane wykresów (PCA, klastrowanie, MIC, kategorie), log
+      tables/<klucz>.json   - tabele (oczyszczony zbiór, dane analizy, post-hoc, MIC): kolumny z typami
+      figures/<klucz>.png   - gotowy podgląd do natychmiastowego wyświetlenia po wczytaniu
+    Figury do eksportu są odtwarzane po wczytaniu funkcjami rysującymi z zapisanych wyników (bez ponownego liczenia).
+    Zwraca (sukces, komunikat) - jak reports.generate_pdf.
+    """
+    try:
+        saved = [k for k, fig in figures.items() if fig is not None]
+        tables = {k: v for k, v in state.items() if isinstance(v, pd.DataFrame)}
+        plain = {k: v for k, v in state.items() if k not in tables}
+        meta = {"version": SESSION_VERSION, "created": datetime.now().isoformat(timespec='seconds'),
+                "figures": saved, "tables": list(tables)}
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.writestr("meta.json", json.dumps(meta, ensure_ascii=False))
+            z.writestr("state.json", json.dumps(_encode(plain), ensure_ascii=False, default=_json_default))
+            for key, table in tables.items():
+                z.writestr(f"tables/{key}.json", _table_to_json(table))
+            for key in saved:
+                # PNG jest już skompresowany - bez ponownej kompresji
+                z.writestr(f"figures/{key}.png", _png_bytes(figures[key], preview_dpi), compress_type=zipfile.ZIP_STORED)
+        return True, f"Zapisano sesję: {path}"
+    except Exception as e:
+        return False, f"Błąd zapisu sesji: {e}"
+
+def load_session(path):
+    """Wczytuje sesję zapisaną przez save_session. Zwraca ({'meta', 'state', 'previews'}, error)."""
+    try:
+        with zipfile.ZipFile(path) as z:
+            meta = json.loads(z.read("meta.json"))
+            version = meta.get("version", 0)
+            if version > SESSION_VERSION:
+                return None, "Plik sesji pochodzi z nowszej wersji programu."
+            if version < 2:
+                return None, "Starszy format sesji (pickle) nie jest obsługiwany ze względów bezpieczeństwa - zapisz sesję ponownie."
+            if version < 3:
+                return None, "Sesja bez zapisanych danych wykresów (PCA, klastrowanie, MIC) - otwórz dane i zapisz sesję ponownie."
+            state = json.loads(z.read("state.json"), object_hook=_decode)
+            for key in meta.get("tables", []):
+                state[key] = _table_from_json(z.read(f"tables/{key}.json").decode("utf-8"))
+            previews = {k: z.read(f"figures/{k}.png") for k in meta["figures"]}
+        return {"meta": meta, "state": state, "previews": previews}, None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        return None, f"Nie udało się wczytać sesji: {e}"
@@ -0,0 +1,189 @@
+import os
+import json
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~"), ".biostat_master", "history.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    dataset_hash TEXT NOT NULL,
+    strain TEXT NOT NULL,
+    ref_group TEXT,
+    method TEXT,
+    settings TEXT,
+    test_used TEXT,
+    statistic REAL,
+    p_value REAL,
+    is_parametric INTEGER
+);
+CREATE TABLE IF NOT EXISTS pairwise (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    group1 TEXT NOT NULL,
+    group2 TEXT NOT NULL,
+    p_adj REAL,
+    significant INTEGER,
+    effect REAL,
+    effect_size TEXT,
+    p_raw REAL,
+    p_study REAL,
+    effect_measure TEXT
+);
+CREATE TABLE IF NOT EXISTS mic (
+    run_id INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    created_at TEXT NOT NULL,
+    dataset_hash TEXT NOT NULL,
+    strain TEXT NOT NULL,
+    substance TEXT NOT NULL,
+    mic REAL,
+    unit TEXT,
+    r2 REAL,
+    model TEXT,
+    target REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_strain_date ON runs(strain, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_date ON runs(created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_dataset ON runs(dataset_hash);
+CREATE INDEX IF NOT EXISTS idx_pairwise_run ON pairwise(run_id);
+CREATE INDEX IF NOT EXISTS idx_mic_substance_strain_date ON mic(substance, strain, created_at);
+CREATE INDEX IF NOT EXISTS idx_mic_strain_date ON mic(strain, created_at);
+CREATE INDEX IF NOT EXISTS idx_mic_date ON mic(created_at);
+"""
+
+def _num(v):
+    """Liczby numpy / None / NaN -> typy akceptowane przez sqlite."""
+    if v is None: return None
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return v if np.isfinite(v) else None
+
+class ResultsStore:
+    """
+    Lokalna historia analiz (SQLite, tryb WAL).
+    Zapisy trafiają do kolejki i są wykonywane w osobnym wątku, w transakcjach - analiza na nie nie czeka.
+    Odczyty (query_*) zwracają tabele pandas.
+    """
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Bazy z wcześniejszych wersji: dopisanie nowych kolumn
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(pairwise)")}
+            for col, col_type in (("p_raw", "REAL"), ("p_study", "REAL"), ("effect_measure", "TEXT")):
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE pairwise ADD COLUMN {col} {col_type}")
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ==================== ZAPIS (wątek w tle) ====================
+    def _writer_loop(self):
+        conn = self._connect()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                break
+            try:
+                with conn:  # jedna transakcja na zadanie
+                    job(conn)
+            except Exception as e:
+                print(f"Warning: ResultsStore write error: {e}")
+            finally:
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self):
+        """Czeka na zapisanie wszystkich zleconych zapisów."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    def save_run(self, dataset_hash, strain, settings, summary, detailed_results, mic_results=None,
+                 mic_model="Log-liniowy", mic_target=6.0, created_at=None):
+        """
+        Zleca zapis jednej analizy: ustawienia, wynik testu głównego, tabela post-hoc i dopasowania MIC.
+        summary: słownik z StatsEngine.run_statistics; mic_results: {substancja: {"MIC", "Unit", "R2", ...}}.
+        """
+        created_at = created_at or datetime.now().isoformat(timespec='seconds')
+        main = summary['main_stats'][0] if summary and summary.get('main_stats') else {}
+        run_row = (created_at, dataset_hash, strain, settings.get('ref'), settings.get('method'),
+                   json.dumps(settings, default=str, ensure_ascii=False), summary.get('test_used') if summary else None,
+                   _num(main.get('Statistic')), _num(main.get('p-value')), int(bool(summary and summary.get('is_parametric'))))
+        pair_rows = [(str(r['Group 1']), str(r['Group 2']), _num(r['P-adj']), int(bool(r['Significant'])),
+                      _num(r.get("Effect")), r.get('Effect Size'), _num(r.get('P-raw')), _num(r.get('P-adj (study)')), r.get('Effect Measure'))
+                     for r in (detailed_results or [])]
+        mic_rows = [(created_at, dataset_hash, strain, sub, _num(res.get('MIC')), res.get('Unit'), _num(res.get('R2')), mic_model, _num(mic_target))
+                    for sub, res in (mic_results or {}).items()]
+
+        def job(conn):
+            cur = conn.execute("INSERT INTO runs (created_at, dataset_hash, strain, ref_group, method, settings, test_used, "
+                               "statistic, p_value, is_parametric) VALUES (?,?,?,?,?,?,?,?,?,?)", run_row)
+            run_id = cur.lastrowid
+            conn.executemany("INSERT INTO pairwise (run_id, group1, group2, p_adj, significant, effect, effect_size, p_raw, p_study, effect_measure) "
+                             "VALUES (?,?,?,?,?,?,?,?,?,?)", [(run_id,) + r for r in pair_rows])
+            conn.executemany("INSERT INTO mic VALUES (?,?,?,?,?,?,?,?,?,?)", [(run_id,) + r for r in mic_rows])
+        self._queue.put(job)
+
+    def save_mic_table(self, mic_table, dataset_hash, mic_model="Log-liniowy", mic_target=6.0, created_at=None):
+        """Zapis wsadowy tabeli MIC całego badania (kolumny Bakteria, Substancja, MIC, Unit, R2) w jednej transakcji."""
+        created_at = created_at or datetime.now().isoformat(timespec='seconds')
+        rows = [(None, created_at, dataset_hash, str(b), str(s), _num(m), u, _num(r2), mic_model, _num(mic_target))
+                for b, s, m, u, r2 in mic_table[['Bakteria', 'Substancja', 'MIC', 'Unit', 'R2']].itertuples(index=False)]
+        self._queue.put(lambda conn: conn.executemany("INSERT INTO mic VALUES (?,?,?,?,?,?,?,?,?,?)", rows))
+
+    # ==================== ODCZYT ====================
+    def _query(self, sql, params):
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    @staticmethod
+    def _filters(alias, strain=None, since=None, until=None, **equals):
+        clauses, params = [], []
+        if strain is not None:
+            clauses.append(f"{alias}.strain = ?"); params.append(strain)
+        for col, val in equals.items():
+            if val is not None:
+                clauses.append(f"{alias}.{col} = ?"); params.append(val)
+        if since is not None:
+            clauses.append(f"{alias}.created_at >= ?"); params.append(str(since))
+        if until is not None:
+            clauses.append(f"{alias}.created_at <= ?"); params.append(str(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_runs(self, strain=None, since=None, until=None, dataset_hash=None):
+        where, params = self._filters("r", strain, since, until, dataset_hash=dataset_hash)
+        return self._query(f"SELECT r.* FROM runs r{where} ORDER BY r.created_at", params)
+
+    def query_pairwise(self, strain=None, since=None, until=None, significant_only=False):
+        where, params = self._filters("r", strain, since, until)
+        if significant_only:
+            where += (" AND" if where else " WHERE") + " p.significant = 1"
+        sql = ("SELECT r.created_at, r.strain, r.test_used, p.group1, p.group2, p.p_adj, p.significant, p.effect, p.effect_measure, p.effect_size, p.p_raw, p.p_study "
+               f"FROM pairwise p JOIN runs r ON r.id = p.run_id{where} ORDER BY r.created_at")
+        return self._query(sql, params)
+
+    def query_mic(self, strain=None, substance=None, since=None, until=None):
+        """Historia MIC, np. query_mic(strain="S. aureus", substance="Cipro", since="2025-10-01")."""
+        where, params = self._filters("m", strain, since, until, substance=substance)
+        return self._query(f"SELECT m.created_at, m.strain, m.substance, m.mic, m.unit, m.r2, m.model, m.target, m.dataset_hash "
+                           f"FROM mic m{where} ORDER BY m.created_at", params)
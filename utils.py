@@ -1,6 +1,10 @@
 import re
+import hashlib
+from functools import lru_cache
 import numpy as np
+import pandas as pd
 from scipy import stats
+import effectsize
 
 # --- SORTOWANIE I PARSOWANIE ---
 def smart_sort_key(group_name):
@@ -27,31 +31,118 @@ def parse_concentration(group_name):
         except ValueError: return None, None, None
     return None, None, None
 
-# --- STATYSTYKA: EFFECT SIZE ---
-def calculate_cohens_d(group1_data, group2_data):
-    n1, n2 = len(group1_data), len(group2_data)
-    if n1 < 2 or n2 < 2: return 0.0
-    
-    var1 = np.var(group1_data, ddof=1)
-    var2 = np.var(group2_data, ddof=1)
-    
-    s_pooled = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
-    
-    mean1 = np.mean(group1_data)
-    mean2 = np.mean(group2_data)
+def parse_concentrations(groups):
+    """Wersja kolumnowa parse_concentration: parsuje każdą unikalną nazwę raz. Zwraca (substancja, stężenie, jednostka) jako Series."""
+    parsed = {g: parse_concentration(g) for g in pd.unique(groups)}
+    sub = groups.map({g: p[0] for g, p in parsed.items()})
+    conc = groups.map({g: p[1] for g, p in parsed.items()}).astype(float)
+    unit = groups.map({g: p[2] for g, p in parsed.items()})
+    return sub, conc, unit
 
-    if s_pooled == 0:
-         return 0.0 
-    
-    return (mean1 - mean2) / s_pooled
+def dataset_fingerprint(df):
+    """Skrót zawartości tabeli (do identyfikacji zbioru danych w historii wyników)."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:16]
+
+def default_reference_group(groups):
+    """Domyślna grupa odniesienia: kontrola (woda/kontrola), a jeśli jej brak - pierwsza grupa."""
+    ref = next((g for g in groups if "woda" in g.lower() or "kontrol" in g.lower()), None)
+    return ref if ref is not None else (groups[0] if len(groups) else None)
 
-def get_effect_size_interpretation(d):
+# --- STATYSTYKA: EFFECT SIZE ---
+def get_effect_size_interpretation(d, measure=None):
+    """Słowna ocena wielkości efektu; progi zależne od miary (effectsize.interpretation_thresholds)."""
+    if d is None or np.isnan(d): return "nieokreślony"
+    small, medium, large = effectsize.interpretation_thresholds(measure)
     d = abs(d)
-    if d < 0.2: return "znikomy"
-    elif d < 0.5: return "mały"
-    elif d < 0.8: return "średni"
+    if d < small: return "znikomy"
+    elif d < medium: return "mały"
+    elif d < large: return "średni"
     else: return "DUŻY"
 
+# --- STATYSTYKA: PODSUMOWANIE GRUP (dla wykresów) ---
+def summarize_groups(df, by='Grupa', value='Srednica_mm'):
+    """
+    Jedna tabela podsumowań na grupę (lub parę szczep x grupa), z której rysowane są wykresy:
+    n, mean, sd, sem, min, max, kwartyle (q1, median, q3), wąsy 1.5 IQR (whislo, whishi) i fliers.
+    by: nazwa kolumny albo lista kolumn, np. [col_bact, 'Grupa'].
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    df = df.dropna(subset=[value])
+    grp = df.groupby(keys, sort=False)[value]
+
+    summary = grp.agg(n='count', mean='mean', sd='std', min='min', max='max')
+    summary['sd'] = summary['sd'].fillna(0)
+    summary['sem'] = summary['sd'] / np.sqrt(summary['n'])
+    q = grp.quantile([0.25, 0.5, 0.75]).unstack()
+    summary['q1'], summary['median'], summary['q3'] = q[0.25], q[0.5], q[0.75]
+
+    # Wąsy: skrajne pomiary w granicach 1.5 IQR (jak w boxplocie matplotlib/seaborn)
+    iqr = summary['q3'] - summary['q1']
+    row_idx = pd.MultiIndex.from_frame(df[keys]) if len(keys) > 1 else pd.Index(df[keys[0]])
+    lo = (summary['q1'] - 1.5 * iqr).reindex(row_idx).values
+    hi = (summary['q3'] + 1.5 * iqr).reindex(row_idx).values
+    vals = df[value].values
+    inside = (vals >= lo) & (vals <= hi)
+    in_vals = pd.Series(np.where(inside, vals, np.nan), index=df.index)
+    by_cols = [df[k] for k in keys]
+    summary['whislo'] = in_vals.groupby(by_cols, sort=False).min()
+    summary['whishi'] = in_vals.groupby(by_cols, sort=False).max()
+
+    fliers = df.loc[~inside].groupby(keys, sort=False)[value].agg(list).reindex(summary.index)
+    summary['fliers'] = [f if isinstance(f, list) else [] for f in fliers]
+    return summary
+
+# --- STATYSTYKA: PRZEDZIAŁY UFNOŚCI (słupki błędów, pasma, gwiazdki) ---
+def t_ci_halfwidth(sd, n, level=0.95):
+    """Analityczny półprzedział ufności dla średniej: t(1-alfa/2, n-1) * SD / sqrt(n). Dla n < 2 zwraca 0."""
+    sd = np.asarray(sd, dtype=float)
+    n = np.asarray(n, dtype=float)
+    t_crit = stats.t.ppf(0.5 + level / 2, np.maximum(n - 1, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hw = t_crit * sd / np.sqrt(n)
+    return np.where(n >= 2, hw, 0.0)
+
+@lru_cache(maxsize=4096)
+def _bootstrap_ci_cached(values, level, n_boot, seed):
+    vals = np.asarray(values)
+    rng = np.random.default_rng(seed)
+    boot_means = vals[rng.integers(0, len(vals), size=(n_boot, len(vals)))].mean(axis=1)
+    alpha = (1 - level) / 2
+    lo, hi = np.quantile(boot_means, [alpha, 1 - alpha])
+    return float(lo), float(hi)
+
+def bootstrap_ci(values, level=0.95, n_boot=1000, seed=0):
+    """Percentylowy bootstrap CI dla średniej. Ziarno stałe, wynik zapamiętany per zestaw pomiarów."""
+    vals = tuple(sorted(float(v) for v in values))
+    if len(vals) < 2:
+        m = vals[0] if vals else np.nan
+        return m, m
+    return _bootstrap_ci_cached(vals, level, n_boot, seed)
+
+def add_error_bounds(summary, error_bar_choice, ci_method="Analityczny (t)", df=None, by='Grupa', value='Srednica_mm'):
+    """
+    Dodaje do tabeli z summarize_groups kolumny err_lo / err_hi (końce słupka błędu / pasma).
+    Z tych samych liczb korzystają słupki błędów, pasma trendu i pozycje gwiazdek.
+    Bootstrap wymaga surowych pomiarów (df, by, value).
+    """
+    summary = summary.copy()
+    mean = summary['mean']
+    if "SEM" in error_bar_choice:
+        lo, hi = mean - summary['sem'], mean + summary['sem']
+    elif "CI" in error_bar_choice:
+        if "Bootstrap" in ci_method and df is not None:
+            raw = df.dropna(subset=[value]).groupby(by, sort=False)[value].agg(bootstrap_ci).reindex(summary.index)
+            lo = pd.Series([b[0] if isinstance(b, tuple) else np.nan for b in raw], index=summary.index)
+            hi = pd.Series([b[1] if isinstance(b, tuple) else np.nan for b in raw], index=summary.index)
+        else:
+            hw = t_ci_halfwidth(summary['sd'], summary['n'])
+            lo, hi = mean - hw, mean + hw
+    else:
+        lo, hi = mean - summary['sd'], mean + summary['sd']
+    summary['err_lo'], summary['err_hi'] = lo, hi
+    return summary
+
 # --- STATYSTYKA: OUTLIERS (DIXON LOGIC) ---
 def find_outliers_dixon(df):
     """Zwraca listę wykrytych outlierów (logika bez GUI)."""
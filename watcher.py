@@ -0,0 +1,214 @@
+import os
+import re
+import time
+import hashlib
+import argparse
+import threading
+import pandas as pd
+import utils
+import loader
+from logic import StatsEngine
+from plotting import Plotter, DEFAULT_CONFIG
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class FolderWatcher:
+    """
+    Obserwacja folderu ze skoroszytami (odpytywanie co `interval` s).
+    Zmiana pliku = inny czas modyfikacji/rozmiar ORAZ inna suma SHA-1 (samo dotknięcie pliku jest ignorowane).
+    Seria zapisów jest łączona: on_change(changed, removed) wywoływane dopiero po `debounce` s bez nowych zmian.
+    """
+    def __init__(self, folder, on_change, interval=2.0, debounce=3.0):
+        self.folder = folder
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self._files = {}    # ścieżka -> (mtime, rozmiar, hash)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def scan(self):
+        """Jedno przejście: zwraca (zmienione, usunięte) pliki względem poprzedniego stanu."""
+        changed = []
+        current = set(loader.expand_paths([self.folder]))
+        for path in current:
+            try:
+                st = os.stat(path)
+                old = self._files.get(path)
+                if old and (old[0], old[1]) == (st.st_mtime, st.st_size):
+                    continue
+                digest = file_hash(path)
+            except OSError:
+                continue  # plik w trakcie zapisu / zablokowany - sprawdzimy w kolejnym przejściu
+            self._files[path] = (st.st_mtime, st.st_size, digest)
+            if old is None or old[2] != digest:
+                changed.append(path)
+        removed = [p for p in self._files if p not in current]
+        for p in removed: del self._files[p]
+        return sorted(changed), sorted(removed)
+
+    def start(self):
+        """Zapamiętuje stan początkowy i uruchamia wątek obserwacji. Zwraca listę plików startowych."""
+        initial, _ = self.scan()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return initial
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _loop(self):
+        pending_changed, pending_removed, last_change = set(), set(), None
+        while not self._stop.wait(self.interval):
+            changed, removed = self.scan()
+            if changed or removed:
+                pending_changed.update(changed); pending_changed.difference_update(removed)
+                pending_removed.update(removed); pending_removed.difference_update(changed)
+                last_change = time.monotonic()
+            if last_change is not None and time.monotonic() - last_change >= self.debounce:
+                batch = (sorted(pending_changed), sorted(pending_removed))
+                pending_changed, pending_removed, last_change = set(), set(), None
+                try:
+                    self.on_change(*batch)
+                except Exception as e:
+                    print(f"Warning: Błąd obsługi zmian w folderze: {e}")
+
+class WorkbookSet:
+    """
+    Zbiór wczytanych skoroszytów aktualizowany przyrostowo: ponownie czytane są tylko zmienione arkusze zmienionych plików
+    (.xlsx - wg podpisów arkuszy z loader.sheet_signatures; .xls - cały plik), a zmienione szczepy wykrywane są po skrótach ich pomiarów.
+    """
+    def __init__(self, col_bact='Bakterie'):
+        self.col_bact = col_bact
+        self.frames = {}          # plik -> {arkusz: DataFrame}
+        self.signatures = {}      # plik -> {arkusz: podpis}
+        self.strain_hashes = {}   # szczep -> skrót pomiarów
+        self.df = None
+        self._lock = threading.Lock()
+
+    def update(self, changed, removed=()):
+        """Zwraca (df, zmienione szczepy, komunikaty)."""
+        with self._lock:
+            return self._update(changed, removed)
+
+    def _update(self, changed, removed):
+        messages = []
+        for path in removed:
+            self.frames.pop(path, None)
+            self.signatures.pop(path, None)
+        for path in changed:
+            try:
+                self._read_changed_sheets(path, messages)
+            except Exception as e:
+                # np. plik zapisywany właśnie przez Excela - zostaje poprzednia wersja
+                messages.append(f"{os.path.basename(path)}: {e}")
+
+        frames = [f for path in sorted(self.frames) for f in self.frames[path].values()]
+        self.df = pd.concat(frames, ignore_index=True, sort=False) if frames else None
+
+        new_hashes = {}
+        if self.df is not None:
+            for bact, sub in self.df.groupby(self.col_bact, sort=False):
+                new_hashes[bact] = utils.dataset_fingerprint(sub[['Grupa', 'Srednica_mm']])
+        changed_strains = [b for b in set(self.strain_hashes) | set(new_hashes) if self.strain_hashes.get(b) != new_hashes.get(b)]
+        self.strain_hashes = new_hashes
+        return self.df, sorted(changed_strains, key=utils.smart_sort_key), messages
+
+    def _read_changed_sheets(self, path, messages):
+        signatures = loader.sheet_signatures(path)
+        old_signatures, old_frames = self.signatures.get(path), self.frames.get(path)
+        if signatures is None or old_signatures is None or old_frames is None:
+            frames, skipped = loader.read_workbook(path)
+            stale = None
+        else:
+            stale = [sheet for sheet, sig in signatures.items() if old_signatures.get(sheet) != sig]
+            frames, skipped = loader.read_workbook(path, stale) if stale else ([], [])
+        messages.extend(skipped)
+        fresh = {df['Arkusz'].iloc[0]: df for df in frames}
+        if stale is None:
+            self.frames[path] = fresh
+        else:
+            # Kolejność arkuszy jak w skoroszycie; niezmienione arkusze z poprzedniego odczytu
+            self.frames[path] = {sheet: fresh[sheet] if sheet in stale else old_frames[sheet]
+                                 for sheet in signatures if sheet in fresh or (sheet not in stale and sheet in old_frames)}
+        self.signatures[path] = signatures
+
+# ==================== TRYB BEZ OKNA ====================
+def analyze_strain(engine, plotter, df, bact, method="holm", ref_group=None, col_bact='Bakterie'):
+    """Analiza jednego szczepu bez interakcji (bez okna usuwania outlierów). Zwraca (wynik, error)."""
+    df_run = df[df[col_bact] == bact]
+    groups = sorted(df_run['Grupa'].unique(), key=utils.smart_sort_key)
+    ref_group = ref_group if ref_group in groups else utils.default_reference_group(groups)
+    summary, posthoc_df, error = engine.run_statistics(df_run, method, ref_group)
+    if error:
+        return None, error
+    detailed, sig_set = engine.process_detailed_results(posthoc_df, df_run, ref_group, summary['test_used'])
+    fig = plotter.draw_bar_plot(df_run, bact, ref_group, sig_set)
+    return {"bact": bact, "ref": ref_group, "data": df_run, "summary": summary, "detailed": detailed, "figure": fig}, None
+
+def write_strain_outputs(result, out_dir):
+    """Zapisuje wyniki szczepu do out_dir: <szczep>.xlsx (arkusze jak w eksporcie z GUI) i <szczep>.png."""
+    os.makedirs(out_dir, exist_ok=True)
+    stem = re.sub(r'[^\w.-]+', '_', str(result["bact"])).strip('_') or "szczep"
+    with pd.ExcelWriter(os.path.join(out_dir, f"{stem}.xlsx"), engine='openpyxl') as writer:
+        result["data"].to_excel(writer, sheet_name="Dane Surowe", index=False)
+        summary = result["summary"]
+        if summary['normality']: pd.DataFrame(summary['normality']).to_excel(writer, sheet_name="Normalnosc", index=False)
+        if summary['main_stats']: pd.DataFrame(summary['main_stats']).to_excel(writer, sheet_name="Test Glowny", index=False)
+        if result["detailed"]: pd.DataFrame(result["detailed"]).to_excel(writer, sheet_name="Post-hoc (Details)", index=False)
+    if result["figure"] is not None:
+        result["figure"].savefig(os.path.join(out_dir, f"{stem}.png"), dpi=300, bbox_inches='tight')
+
+def run_headless(folder, out_dir, method="holm", interval=2.0, debounce=3.0, once=False):
+    """Obserwuje folder i po każdej serii zapisów przelicza tylko szczepy, których pomiary się zmieniły."""
+    engine, plotter = StatsEngine(), Plotter(dict(DEFAULT_CONFIG))
+    workbooks = WorkbookSet()
+    lock = threading.Lock()
+
+    def refresh(changed, removed):
+        with lock:
+            df, strains, messages = workbooks.update(changed, removed)
+            for msg in messages: print(f"Pominięto: {msg}")
+            if df is None or not strains: return
+            engine.invalidate_data()
+            present = set(df['Bakterie'])
+            for bact in strains:
+                if bact not in present:
+                    print(f"[{time.strftime('%H:%M:%S')}] {bact}: brak pomiarów (usunięty)")
+                    continue
+                result, error = analyze_strain(engine, plotter, df, bact, method)
+                if error:
+                    print(f"[{time.strftime('%H:%M:%S')}] {bact}: {error}")
+                    continue
+                write_strain_outputs(result, out_dir)
+                print(f"[{time.strftime('%H:%M:%S')}] {bact}: {result['summary']['test_used']} -> {out_dir}")
+
+    watcher = FolderWatcher(folder, refresh, interval, debounce)
+    refresh(watcher.start(), [])
+    if once:
+        watcher.stop()
+        return
+    print(f"Obserwuję folder {folder} (Ctrl+C kończy)...")
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BioStat Master - automatyczna analiza skoroszytów z obserwowanego folderu.")
+    parser.add_argument("folder", help="folder ze skoroszytami Excel")
+    parser.add_argument("--out", default="wyniki", help="folder wyników (xlsx + png na szczep)")
+    parser.add_argument("--method", default="holm", help="korekta post-hoc: holm, fdr_bh, bonferroni, None")
+    parser.add_argument("--interval", type=float, default=2.0, help="co ile sekund sprawdzać folder")
+    parser.add_argument("--debounce", type=float, default=3.0, help="ile sekund ciszy przed przeliczeniem")
+    parser.add_argument("--once", action="store_true", help="jedna analiza bez obserwacji")
+    args = parser.parse_args()
+    run_headless(args.folder, args.out, None if args.method == "None" else args.method, args.interval, args.debounce, args.once)
@@ -0,0 +1,432 @@
+import re
+import numpy as np
+import pandas as pd
+import customtkinter as ctk
+from tkinter import ttk
+import utils
+
+# ======================================================
+# MODEL ZAZNACZENIA GRUP (bez Tk - tablice numpy)
+# ======================================================
+class SelectionModel:
+    """
+    Stan listy grup: nazwy, zaznaczenie (tablica bool) i bieżący filtr (indeksy widocznych wierszy).
+    Substancja i stężenie parsowane z nazw raz, przy ustawianiu listy - do zaznaczania grupami.
+    """
+    def __init__(self):
+        self.set_groups([])
+
+    def set_groups(self, names, selected=True):
+        self.names = np.array(list(names), dtype=object)
+        self.selected = np.full(len(self.names), bool(selected))
+        self.visible = np.arange(len(self.names))
+        self.pattern = ""
+        sub, conc, unit = utils.parse_concentrations(pd.Series(self.names, dtype=object))
+        self.substances = sub.fillna(pd.Series(self.names, dtype=object)).to_numpy(dtype=object)
+        self.concentrations = np.array([f"{c:g} {u}" if isinstance(u, str) else "" for c, u in zip(conc, unit)], dtype=object)
+        self._index = {g: k for k, g in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def apply_filter(self, pattern="", regex=False):
+        """Filtr nazw (podciąg lub wyrażenie regularne, bez rozróżniania wielkości liter). Zwraca błąd regex lub None."""
+        self.pattern = pattern
+        if not pattern:
+            self.visible = np.arange(len(self.names))
+            return None
+        if regex:
+            try: re.compile(pattern)
+            except re.error as e: return f"Błędne wyrażenie: {e}"
+        mask = pd.Series(self.names, dtype=object).str.contains(pattern, case=False, regex=regex).to_numpy(dtype=bool)
+        self.visible = np.flatnonzero(mask)
+        return None
+
+    def set_visible(self, value):
+        """Zaznacza / odznacza wszystkie wiersze pasujące do bieżącego filtra (bez filtra - wszystkie)."""
+        self.selected[self.visible] = value
+
+    def set_where(self, substance=None, concentration=None, value=True):
+        """Zaznaczanie zbiorcze wg substancji lub stężenia sparsowanego z nazwy grupy."""
+        mask = np.ones(len(self.names), dtype=bool)
+        if substance is not None: mask &= self.substances == substance
+        if concentration is not None: mask &= self.concentrations == concentration
+        self.selected[mask] = value
+
+    def toggle(self, row, value):
+        self.selected[self.visible[row]] = value
+
+    def get_selected(self):
+        return list(self.names[self.selected])
+
+    def set_selected(self, groups):
+        wanted = set(groups)
+        self.selected = np.array([g in wanted for g in self.names], dtype=bool)
+
+    def selection_map(self):
+        return dict(zip(self.names, self.selected))
+
+    def restore(self, selection):
+        """Przywraca zaznaczenie z selection_map() dla grup, które nadal istnieją."""
+        for g, val in selection.items():
+            k = self._index.get(g)
+            if k is not None: self.selected[k] = bool(val)
+
+    def substance_values(self):
+        return sorted(set(self.substances), key=lambda s: utils.smart_sort_key(str(s)))
+
+    def concentration_values(self):
+        values = {c for c in self.concentrations if c}
+        return sorted(values, key=lambda c: (c.split(" ", 1)[1], float(c.split(" ", 1)[0])))
+
+# ======================================================
+# WIRTUALIZOWANA LISTA GRUP Z WYSZUKIWANIEM
+# ======================================================
+class GroupSelector(ctk.CTkFrame):
+    """
+    Lista grup z polami wyboru, tworząca widżety tylko dla widocznych wierszy (stała pula `rows` checkboxów
+    przewijana po modelu). Zaznaczenie trzymane w SelectionModel, nie w zmiennych Tk.
+    """
+    def __init__(self, master, rows=24, on_change=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = SelectionModel()
+        self.n_rows = rows
+        self.offset = 0
+        self.on_change = on_change
+        self._filter_job = None
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        # Wyszukiwanie (podciąg / regex)
+        search = ctk.CTkFrame(self, fg_color="transparent")
+        search.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=(5, 2))
+        search.grid_columnconfigure(0, weight=1)
+        self.entry_filter = ctk.CTkEntry(search, placeholder_text="Szukaj grupy...")
+        self.entry_filter.grid(row=0, column=0, sticky="ew")
+        self.entry_filter.bind("<KeyRelease>", self._schedule_filter)
+        self.var_regex = ctk.IntVar(value=0)
+        ctk.CTkCheckBox(search, text="regex", width=20, variable=self.var_regex, command=self._apply_filter).grid(row=0, column=1, padx=(5, 0))
+
+        # Zaznaczanie zbiorcze wg substancji / stężenia
+        bulk = ctk.CTkFrame(self, fg_color="transparent")
+        bulk.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        bulk.grid_columnconfigure(0, weight=1)
+        self.combo_bulk = ctk.CTkOptionMenu(bulk, values=["(substancja / stężenie)"], width=120, dynamic_resizing=False)
+        self.combo_bulk.grid(row=0, column=0, sticky="ew")
+        ctk.CTkButton(bulk, text="+", width=28, command=lambda: self._bulk(True)).grid(row=0, column=1, padx=(4, 0))
+        ctk.CTkButton(bulk, text="−", width=28, fg_color="gray", command=lambda: self._bulk(False)).grid(row=0, column=2, padx=(4, 0))
+
+        # Pula wierszy + pasek przewijania
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.rows_frame.grid(row=2, column=0, sticky="nsew", padx=(5, 0))
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=2, column=1, sticky="ns")
+        self.row_widgets = []
+        for r in range(self.n_rows):
+            cb = ctk.CTkCheckBox(self.rows_frame, text="", command=lambda r=r: self._on_toggle(r))
+            cb.pack(anchor="w", padx=5, pady=2)
+            self.row_widgets.append(cb)
+        for w in [self.rows_frame] + self.row_widgets:
+            w.bind("<MouseWheel>", self._on_wheel)
+            w.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))
+            w.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))
+
+        self.lbl_count = ctk.CTkLabel(self, text="", font=("Arial", 10), text_color="gray")
+        self.lbl_count.grid(row=3, column=0, columnspan=2, sticky="w", padx=8)
+
+    # --- API używane przez App ---
+    def set_groups(self, names):
+        self.model.set_groups(names)
+        bulk_values = [f"Substancja: {s}" for s in self.model.substance_values()] + \
+                      [f"Stężenie: {c}" for c in self.model.concentration_values()]
+        self.combo_bulk.configure(values=bulk_values or ["(substancja / stężenie)"])
+        self.combo_bulk.set(bulk_values[0] if bulk_values else "(substancja / stężenie)")
+        self._apply_filter()
+
+    def get_selected(self):
+        return self.model.get_selected()
+
+    def set_selected(self, groups):
+        self.model.set_selected(groups)
+        self.refresh()
+
+    def selection_map(self):
+        return self.model.selection_map()
+
+    def restore_selection(self, selection):
+        self.model.restore(selection)
+        self.refresh()
+
+    def select_all(self):
+        self.model.set_visible(True)
+        self._changed()
+
+    def deselect_all(self):
+        self.model.set_visible(False)
+        self._changed()
+
+    # --- Wirtualizacja ---
+    def scroll_to(self, offset):
+        max_offset = max(0, len(self.model.visible) - self.n_rows)
+        self.offset = int(min(max(0, offset), max_offset))
+        self.refresh()
+
+    def refresh(self):
+        """Przepisuje pulę checkboxów na wiersze [offset, offset + n_rows) przefiltrowanej listy."""
+        visible = self.model.visible
+        for r, cb in enumerate(self.row_widgets):
+            k = self.offset + r
+            if k < len(visible):
+                idx = visible[k]
+                cb.configure(text=str(self.model.names[idx]), state="normal")
+                if self.model.selected[idx]: cb.select()
+                else: cb.deselect()
+            else:
+                cb.configure(text="", state="disabled")
+                cb.deselect()
+        n = max(len(visible), 1)
+        self.scrollbar.set(self.offset / n, min(1.0, (self.offset + self.n_rows) / n))
+        self.lbl_count.configure(text=f"Zaznaczono {int(self.model.selected.sum())} / {len(self.model)}"
+                                      f" (widoczne: {len(visible)})")
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(value) * len(self.model.visible)))
+        elif action == "scroll":
+            step = self.n_rows if unit == "pages" else 1
+            self.scroll_to(self.offset + int(value) * step)
+
+    def _on_wheel(self, event):
+        self.scroll_to(self.offset - int(np.sign(event.delta)) * 3)
+
+    def _on_toggle(self, row):
+        if self.offset + row < len(self.model.visible):
+            self.model.toggle(self.offset + row, bool(self.row_widgets[row].get()))
+            self._changed()
+
+    def _schedule_filter(self, _event=None):
+        # Filtrowanie po chwili bezczynności (szybkie pisanie = jedno przeliczenie)
+        if self._filter_job is not None: self.after_cancel(self._filter_job)
+        self._filter_job = self.after(150, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_job = None
+        err = self.model.apply_filter(self.entry_filter.get(), bool(self.var_regex.get()))
+        self.entry_filter.configure(border_color="red" if err else ("#979DA2", "#565B5E"))
+        if err: self.model.visible = np.arange(0)
+        self.offset = 0
+        self.refresh()
+
+    def _bulk(self, value):
+        choice = self.combo_bulk.get()
+        if choice.startswith("Substancja: "):
+            self.model.set_where(substance=choice[len("Substancja: "):], value=value)
+        elif choice.startswith("Stężenie: "):
+            self.model.set_where(concentration=choice[len("Stężenie: "):], value=value)
+        self._changed()
+
+    def _changed(self):
+        self.refresh()
+        if self.on_change: self.on_change()
+
+# ======================================================
+# MODEL TABELI WYNIKÓW POST-HOC (bez Tk)
+# ======================================================
+class ResultsTableModel:
+    """
+    Kolumnowa tabela porównań (DataFrame z process_detailed_results) z sortowaniem i filtrowaniem
+    na tablicach indeksów - formatowane są tylko wiersze aktualnie wyświetlane lub kopiowane.
+    """
+    COLUMNS = [("Group 1", "Grupa 1"), ("Group 2", "Grupa 2"), ("P-adj", "p-adj"), ("P-adj (study)", "p (badanie)"),
+               ("Effect Measure", "Miara"), ("Effect", "Efekt"), ("Effect Size", "Interpretacja"), ("Significant", "Istotne")]
+
+    def __init__(self):
+        self.set_rows(pd.DataFrame(columns=[c for c, _ in self.COLUMNS]))
+
+    def set_rows(self, df, ref_group=None):
+        self.df = df.reset_index(drop=True)
+        self.columns = [(c, h) for c, h in self.COLUMNS if c in self.df.columns]
+        self.ref_group = ref_group
+        self.sort_column, self.descending = "P-adj", False
+        self.significant_only, self.reference_only = False, False
+        self.selected = np.zeros(len(self.df), dtype=bool)
+        self._sorted = np.arange(len(self.df))
+        self.order = self._sorted
+        if len(self.df): self.sort_by("P-adj", descending=False)
+
+    def __len__(self):
+        return len(self.order)
+
+    def sort_by(self, column, descending=None):
+        """Sortowanie stabilne; Effect wg |wartości| (domyślnie malejąco), grupy wg (Grupa 1, Grupa 2)."""
+        if descending is None:
+            descending = not self.descending if column == self.sort_column else column == "Effect"
+        self.sort_column, self.descending = column, descending
+        if column in ("Group 1", "Group 2"):
+            # Porządek naturalny (utils.smart_sort_key) liczony raz dla unikalnych nazw, sortowanie po kodach
+            keys = ["Group 1", "Group 2"] if column == "Group 1" else ["Group 2", "Group 1"]
+            names = pd.unique(self.df[keys].astype(str).to_numpy().ravel())
+            rank = {g: k for k, g in enumerate(sorted(names, key=utils.smart_sort_key))}
+            codes = pd.DataFrame({k: self.df[k].astype(str).map(rank) for k in keys})
+            ordered = codes.sort_values(keys, ascending=not descending, kind="stable")
+        else:
+            key = self.df[column].abs() if column == "Effect" else self.df[column]
+            ordered = key.sort_values(ascending=not descending, kind="stable", na_position="last")
+        self._sorted = ordered.index.to_numpy()
+        self._apply()
+
+    def set_filter(self, significant_only=None, reference_only=None):
+        if significant_only is not None: self.significant_only = significant_only
+        if reference_only is not None: self.reference_only = reference_only
+        self._apply()
+
+    def _apply(self):
+        mask = np.ones(len(self.df), dtype=bool)
+        if self.significant_only and "Significant" in self.df:
+            mask &= self.df["Significant"].to_numpy(dtype=bool)
+        if self.reference_only and self.ref_group is not None:
+            mask &= ((self.df["Group 1"] == self.ref_group) | (self.df["Group 2"] == self.ref_group)).to_numpy()
+        self.order = self._sorted[mask[self._sorted]]
+
+    @staticmethod
+    def _format(column, value):
+        if column == "Significant": return "TAK" if value else "-"
+        if isinstance(value, (float, np.floating)):
+            if np.isnan(value): return ""
+            return f"{value:.4g}" if column.startswith("P-adj") else f"{value:.2f}"
+        return str(value)
+
+    def rows(self, start, stop):
+        """Sformatowane wiersze [start, stop) widoku (po filtrze i sortowaniu)."""
+        cols = [c for c, _ in self.columns]
+        block = self.df.iloc[self.order[start:stop]][cols]
+        return [tuple(self._format(c, v) for c, v in zip(cols, row)) for row in block.itertuples(index=False)]
+
+    def set_selected(self, positions, value=True):
+        self.selected[self.order[np.asarray(positions, dtype=int)]] = value
+
+    def select_all(self):
+        self.selected[self.order] = True
+
+    def clear_selection(self):
+        self.selected[:] = False
+
+    def to_tsv(self):
+        """
+        Zaznaczone wiersze (w kolejności widoku) jako TSV z nagłówkiem; bez zaznaczenia - cały widok.
+        Istotność jak na ekranie (TAK / -), liczby z pełniejszą precyzją (%.6g) do dalszych obliczeń.
+        """
+        rows = self.order[self.selected[self.order]]
+        if not len(rows): rows = self.order
+        cols = [c for c, _ in self.columns]
+        block = self.df.iloc[rows][cols]
+        if "Significant" in block:
+            block = block.assign(Significant=[self._format("Significant", v) for v in block["Significant"]])
+        return block.rename(columns=dict(self.columns)).to_csv(sep="\t", index=False, float_format="%.6g")
+
+# ======================================================
+# WIRTUALIZOWANA TABELA WYNIKÓW
+# ======================================================
+class ResultsTable(ctk.CTkFrame):
+    """
+    Tabela porównań post-hoc: ttk.Treeview ze stałą pulą `rows` wierszy przepisywaną przy przewijaniu,
+    sortowanie kliknięciem nagłówka, filtry istotności / grupy odniesienia, kopiowanie zaznaczenia jako TSV.
+    """
+    def __init__(self, master, rows=30, **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = ResultsTableModel()
+        self.n_rows = rows
+        self.offset = 0
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        bar = ctk.CTkFrame(self, fg_color="transparent")
+        bar.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        self.switch_sig = ctk.CTkSwitch(bar, text="Tylko istotne", command=self._on_filter)
+        self.switch_sig.pack(side="left", padx=5)
+        self.switch_ref = ctk.CTkSwitch(bar, text="Tylko vs grupa odniesienia", command=self._on_filter)
+        self.switch_ref.pack(side="left", padx=5)
+        ctk.CTkButton(bar, text="📋 Kopiuj (TSV)", width=110, command=self.copy_selection).pack(side="right", padx=5)
+        self.lbl_count = ctk.CTkLabel(bar, text="", text_color="gray")
+        self.lbl_count.pack(side="right", padx=10)
+
+        self.tree = ttk.Treeview(self, show="headings", height=self.n_rows, selectmode="extended")
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self._wheel(-int(np.sign(e.delta)) * 3))
+        self.tree.bind("<Button-4>", lambda e: self._wheel(-3))
+        self.tree.bind("<Button-5>", lambda e: self._wheel(3))
+        self.tree.bind("<Control-c>", lambda e: self.copy_selection())
+        self.tree.bind("<Control-a>", lambda e: self._select_all())
+        self._setup_columns()
+
+    # --- API używane przez App ---
+    def set_results(self, detailed, ref_group=None):
+        self.model.set_rows(pd.DataFrame(detailed), ref_group)
+        self.model.set_filter(bool(self.switch_sig.get()), bool(self.switch_ref.get()))
+        self._setup_columns()
+        self.scroll_to(0)
+
+    def copy_selection(self):
+        if not len(self.model): return "break"
+        self.clipboard_clear()
+        self.clipboard_append(self.model.to_tsv())
+        return "break"
+
+    # --- Wirtualizacja ---
+    def _setup_columns(self):
+        cols = [c for c, _ in self.model.columns]
+        self.tree.delete(*self.tree.get_children())
+        self.tree.configure(columns=cols)
+        for c, header in self.model.columns:
+            arrow = (" ▼" if self.model.descending else " ▲") if c == self.model.sort_column else ""
+            self.tree.heading(c, text=header + arrow, command=lambda c=c: self._on_sort(c))
+            self.tree.column(c, width=220 if c.startswith("Group") else 90, anchor="w" if c.startswith("Group") else "center")
+        self.pool = [self.tree.insert("", "end", values=()) for _ in range(self.n_rows)]
+
+    def scroll_to(self, offset):
+        self.offset = int(min(max(0, offset), max(0, len(self.model) - self.n_rows)))
+        self.refresh()
+
+    def refresh(self):
+        rows = self.model.rows(self.offset, self.offset + self.n_rows)
+        for r, iid in enumerate(self.pool):
+            self.tree.item(iid, values=rows[r] if r < len(rows) else ())
+        positions = np.arange(self.offset, self.offset + len(rows))
+        self.tree.selection_set([self.pool[r] for r, p in enumerate(positions) if self.model.selected[self.model.order[p]]])
+        n = max(len(self.model), 1)
+        self.scrollbar.set(self.offset / n, min(1.0, (self.offset + self.n_rows) / n))
+        self.lbl_count.configure(text=f"{len(self.model)} z {len(self.model.df)} porównań")
+
+    def _wheel(self, step):
+        self.scroll_to(self.offset + step)
+        return "break"
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(value) * len(self.model)))
+        elif action == "scroll":
+            self.scroll_to(self.offset + int(value) * (self.n_rows if unit == "pages" else 1))
+
+    def _on_select(self, _event=None):
+        # Zaznaczenie w puli -> tablica zaznaczenia modelu (tylko wiersze aktualnie wyświetlane)
+        selected = set(self.tree.selection())
+        n_shown = min(self.n_rows, len(self.model) - self.offset)
+        for r in range(n_shown):
+            self.model.set_selected([self.offset + r], self.pool[r] in selected)
+
+    def _select_all(self):
+        self.model.select_all()
+        self.refresh()
+        return "break"
+
+    def _on_sort(self, column):
+        self.model.sort_by(column)
+        self._setup_columns()
+        self.scroll_to(0)
+
+    def _on_filter(self):
+        self.model.set_filter(bool(self.switch_sig.get()), bool(self.switch_ref.get()))
+        self.scroll_to(0)